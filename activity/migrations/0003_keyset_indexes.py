@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['user', '-started_at', '-id'], name='activitylog_user_keyset_idx'),
+        ),
+    ]
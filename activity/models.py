@@ -22,6 +22,9 @@ class ActivityLog(models.Model):
 
     class Meta:
         ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['user', '-started_at', '-id'], name='activitylog_user_keyset_idx'),
+        ]
 
     def __str__(self) -> str:
         return f"{self.user} {self.activity_type} {self.duration_minutes}m"
@@ -1,8 +1,9 @@
 from rest_framework import serializers
+from common.serializers import SparseFieldsetMixin
 from .models import ActivityLog
 
 
-class ActivityLogSerializer(serializers.ModelSerializer):
+class ActivityLogSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = ActivityLog
         fields = '__all__'
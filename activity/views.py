@@ -1,12 +1,15 @@
 from rest_framework import viewsets, permissions
 from django_filters.rest_framework import DjangoFilterBackend
+from common.pagination import HybridPagination
+from common.views import SparseFieldsetViewMixin
 from .models import ActivityLog
 from .serializers import ActivityLogSerializer
 
 
-class ActivityLogViewSet(viewsets.ModelViewSet):
+class ActivityLogViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     serializer_class = ActivityLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = HybridPagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['activity_type']
 
@@ -2,7 +2,13 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils import timezone
-from .models import Booking, BookingAvailability, BookingCancellation, BookingReminder, BookingPayment
+from django.db import transaction
+from .models import (
+    Booking, BookingAvailability, BookingCancellation, BookingReminder, BookingPayment,
+    ProviderAvailabilitySchedule
+)
+from .notifications import ReminderDispatcher, ReminderPlanner
+from .services import AvailabilityCache, AvailabilityEngine, BookingService
 
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
@@ -55,26 +61,53 @@ class BookingAdmin(admin.ModelAdmin):
     booking_actions.short_description = "Quick Actions"
     
     def confirm_bookings(self, request, queryset):
-        updated = queryset.filter(status='pending').update(
+        pending = list(queryset.filter(status='pending').select_related('provider', 'service', 'user'))
+        now = timezone.now()
+        # update() skips auto_now, and updated_at drives the provider bookings ETag
+        updated = Booking.objects.filter(id__in=[booking.id for booking in pending], status='pending').update(
             status='confirmed',
-            confirmed_at=timezone.now()
+            confirmed_at=now,
+            updated_at=now
         )
+        # Bookings made through the API already have their reminders; fill in the rest
+        ReminderPlanner().schedule(pending, skip_existing=True)
         self.message_user(request, f"Successfully confirmed {updated} bookings.")
     confirm_bookings.short_description = "Confirm selected bookings"
     
     def cancel_bookings(self, request, queryset):
-        updated = queryset.exclude(status__in=['cancelled', 'completed']).update(
-            status='cancelled',
-            cancelled_at=timezone.now(),
-            cancelled_by=request.user
-        )
+        booking_service = BookingService()
+        with transaction.atomic():
+            for booking in queryset.filter(status__in=AvailabilityEngine.active_statuses).select_for_update():
+                booking_service.release_slot(booking)
+            cancelled = list(queryset.exclude(status__in=['cancelled', 'completed']).select_related(
+                'provider', 'service', 'user'
+            ))
+            now = timezone.now()
+            updated = Booking.objects.filter(id__in=[booking.id for booking in cancelled]).update(
+                status='cancelled',
+                cancelled_at=now,
+                cancelled_by=request.user,
+                updated_at=now
+            )
+            planner = ReminderPlanner()
+            planner.cancel_pending(cancelled)
+            planner.notify(cancelled, 'cancellation')
+            AvailabilityCache.invalidate_bookings(queryset)
         self.message_user(request, f"Successfully cancelled {updated} bookings.")
     cancel_bookings.short_description = "Cancel selected bookings"
     
     def mark_completed(self, request, queryset):
-        updated = queryset.filter(status='confirmed').update(status='completed')
+        updated = queryset.filter(status='confirmed').update(status='completed', updated_at=timezone.now())
         self.message_user(request, f"Successfully marked {updated} bookings as completed.")
     mark_completed.short_description = "Mark as completed"
+    
+    def send_reminders(self, request, queryset):
+        reminders = BookingReminder.objects.filter(booking__in=queryset)
+        # Bring pending reminders forward so the dispatcher treats them as due
+        reminders.filter(status='pending', scheduled_for__gt=timezone.now()).update(scheduled_for=timezone.now())
+        sent, failed = ReminderDispatcher().run(reminders)
+        self.message_user(request, f"Sent {sent} reminders; {failed} failed.")
+    send_reminders.short_description = "Send pending reminders now"
 
 @admin.register(BookingAvailability)
 class BookingAvailabilityAdmin(admin.ModelAdmin):
@@ -94,6 +127,12 @@ class BookingAvailabilityAdmin(admin.ModelAdmin):
             return format_html('<span style="color: green;">Available</span>')
     availability_status.short_description = "Status"
 
+@admin.register(ProviderAvailabilitySchedule)
+class ProviderAvailabilityScheduleAdmin(admin.ModelAdmin):
+    list_display = ('provider', 'service', 'weekday', 'start_time', 'end_time', 'max_bookings', 'is_active')
+    list_filter = ('weekday', 'is_active', 'provider__category')
+    search_fields = ('provider__business_name', 'service__name')
+
 @admin.register(BookingCancellation)
 class BookingCancellationAdmin(admin.ModelAdmin):
     list_display = ('booking', 'cancellation_type', 'refund_status', 'refund_amount', 'cancelled_by', 'created_at')
@@ -142,11 +181,12 @@ class BookingPaymentAdmin(admin.ModelAdmin):
     list_display = ('booking', 'payment_method', 'amount', 'status', 'gateway_transaction_id', 'processed_at')
     list_filter = ('payment_method', 'status', 'processed_at', 'created_at')
     search_fields = ('booking__booking_id', 'gateway_transaction_id', 'booking__customer_name')
-    readonly_fields = ('created_at', 'updated_at', 'platform_commission', 'provider_amount')
+    readonly_fields = ('user', 'created_at', 'updated_at', 'platform_commission', 'provider_amount',
+                       'idempotency_key', 'attempts', 'claimed_at')
     
     fieldsets = (
         ('Payment Details', {
-            'fields': ('booking', 'payment_method', 'amount', 'currency', 'status')
+            'fields': ('booking', 'user', 'payment_method', 'amount', 'currency', 'status')
         }),
         ('Gateway Information', {
             'fields': ('gateway_transaction_id', 'gateway_response', 'gateway_fee')
@@ -156,7 +196,7 @@ class BookingPaymentAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Processing', {
-            'fields': ('processed_at', 'failed_reason')
+            'fields': ('idempotency_key', 'attempts', 'next_attempt_at', 'claimed_at', 'processed_at', 'failed_reason')
         }),
         ('Metadata', {
             'fields': ('created_at', 'updated_at'),
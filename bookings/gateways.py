@@ -0,0 +1,237 @@
+import hashlib
+import hmac
+import http.client
+import json
+import socket
+import threading
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+DEFAULT_GATEWAYS = {
+    'payhere': 'bookings.gateways.SimulatedGateway',
+    'frimi': 'bookings.gateways.SimulatedGateway',
+}
+
+
+class GatewayError(Exception):
+    """A transient gateway failure (timeout, connection error, 5xx); the charge may be retried"""
+
+
+class GatewayResult:
+    """Outcome of a charge or a webhook notification"""
+
+    # completed and failed are final; pending means the gateway will confirm through a webhook
+    def __init__(self, status, transaction_id='', response=None, reason=''):
+        self.status = status
+        self.transaction_id = transaction_id
+        self.response = response or {}
+        self.reason = reason
+
+
+class BaseGateway:
+    """Client for one payment gateway.
+
+    charge() must be safe to repeat for the same payment: implementations send
+    the payment's order id so the gateway deduplicates retried requests.
+    """
+
+    name = ''
+
+    def __init__(self, **options):
+        self.options = options
+
+    def order_id(self, payment):
+        return f'GRACE-{payment.pk}'
+
+    def charge(self, payment):
+        raise NotImplementedError
+
+    def parse_webhook(self, data, headers):
+        """Verify a callback and return (payment id, GatewayResult); raises ValueError if it is not authentic"""
+        raise NotImplementedError
+
+
+class SimulatedGateway(BaseGateway):
+    """Approves every charge without a network call; the default until real credentials are configured"""
+
+    prefixes = {'payhere': 'PH', 'frimi': 'FR'}
+
+    def charge(self, payment):
+        prefix = self.prefixes.get(payment.payment_method, payment.payment_method.upper()[:2])
+        return GatewayResult('completed', f"{prefix}_{timezone.now().strftime('%Y%m%d%H%M%S')}_{payment.pk}")
+
+    def parse_webhook(self, data, headers):
+        raise ValueError('The simulated gateway does not send webhooks')
+
+
+class LocmemGateway(BaseGateway):
+    """Records charges in LocmemGateway.charges and answers from LocmemGateway.results, for tests.
+
+    Queue GatewayResult objects or exceptions in results; an empty queue approves.
+    """
+
+    charges = []
+    results = []
+
+    def charge(self, payment):
+        LocmemGateway.charges.append(self.order_id(payment))
+        outcome = LocmemGateway.results.pop(0) if LocmemGateway.results else None
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome or GatewayResult('completed', f'LM_{payment.pk}')
+
+    def parse_webhook(self, data, headers):
+        return int(data['payment_id']), GatewayResult(data['status'], data.get('transaction_id', ''), data)
+
+
+class HTTPGateway(BaseGateway):
+    """JSON-over-HTTPS gateway client with one keep-alive connection per worker thread.
+
+    Options: base_url, timeout (seconds), plus gateway-specific credentials.
+    """
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        url = urlsplit(options['base_url'])
+        self.scheme = url.scheme
+        self.host = url.netloc
+        self.base_path = url.path.rstrip('/')
+        self.timeout = options.get('timeout', 10)
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            connection = self._local.connection = connection_class(self.host, timeout=self.timeout)
+        return connection
+
+    def _reset(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+        self._local.connection = None
+
+    def post(self, path, payload, headers=None):
+        """POST JSON and return (status, decoded body); raises GatewayError on transient failures"""
+        body = json.dumps(payload)
+        headers = dict({'Content-Type': 'application/json', 'Accept': 'application/json'}, **(headers or {}))
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request('POST', self.base_path + path, body=body, headers=headers)
+                response = connection.getresponse()
+                raw = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The server closed an idle keep-alive connection; reconnect once
+                self._reset()
+                if attempt:
+                    raise GatewayError(f'{self.name} closed the connection')
+                continue
+            except (socket.timeout, OSError, http.client.HTTPException) as e:
+                self._reset()
+                raise GatewayError(f'{self.name} request failed: {e}')
+
+            if response.status >= 500:
+                raise GatewayError(f'{self.name} returned HTTP {response.status}')
+            try:
+                return response.status, json.loads(raw or b'{}')
+            except ValueError:
+                raise GatewayError(f'{self.name} returned invalid JSON')
+
+
+class PayHereGateway(HTTPGateway):
+    """PayHere charging API; options base_url, merchant_id, merchant_secret, access_token"""
+
+    name = 'PayHere'
+    # PayHere notification status codes
+    status_codes = {'2': 'completed', '0': 'pending', '-1': 'failed', '-2': 'failed', '-3': 'failed'}
+
+    def charge(self, payment):
+        status, body = self.post('/merchant/v1/payment/charge', {
+            'order_id': self.order_id(payment),
+            'amount': str(payment.amount),
+            'currency': payment.currency,
+            'type': 'PAYMENT',
+        }, headers={'Authorization': f"Bearer {self.options.get('access_token', '')}"})
+        data = body.get('data') or {}
+        if status == 200 and body.get('status') == 1:
+            return GatewayResult(
+                self.status_codes.get(str(data.get('status_code')), 'pending'),
+                str(data.get('payment_id', '')),
+                body
+            )
+        return GatewayResult('failed', response=body, reason=body.get('msg', f'HTTP {status}'))
+
+    def parse_webhook(self, data, headers):
+        secret_hash = hashlib.md5(self.options['merchant_secret'].encode()).hexdigest().upper()
+        expected = hashlib.md5((
+            f"{self.options['merchant_id']}{data.get('order_id', '')}{data.get('payhere_amount', '')}"
+            f"{data.get('payhere_currency', '')}{data.get('status_code', '')}{secret_hash}"
+        ).encode()).hexdigest().upper()
+        if not hmac.compare_digest(expected, str(data.get('md5sig', '')).upper()):
+            raise ValueError('Invalid PayHere signature')
+        payment_id = int(str(data['order_id']).rsplit('-', 1)[-1])
+        status = self.status_codes.get(str(data.get('status_code')), 'failed')
+        return payment_id, GatewayResult(
+            status, str(data.get('payment_id', '')), dict(data), reason=data.get('status_message', '')
+        )
+
+
+class FrimiGateway(HTTPGateway):
+    """Frimi payment API; options base_url, merchant_id, api_key, webhook_secret"""
+
+    name = 'Frimi'
+
+    def charge(self, payment):
+        status, body = self.post('/payments', {
+            'merchant_id': self.options.get('merchant_id'),
+            'reference': self.order_id(payment),
+            'amount': str(payment.amount),
+            'currency': payment.currency,
+        }, headers={'X-Api-Key': self.options.get('api_key', ''), 'Idempotency-Key': self.order_id(payment)})
+        if status in (200, 201):
+            return GatewayResult(
+                {'SUCCESS': 'completed', 'FAILED': 'failed'}.get(body.get('status'), 'pending'),
+                str(body.get('transaction_id', '')),
+                body,
+                reason=body.get('message', '')
+            )
+        return GatewayResult('failed', response=body, reason=body.get('message', f'HTTP {status}'))
+
+    def parse_webhook(self, data, headers):
+        payload = json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+        expected = hmac.new(self.options['webhook_secret'].encode(), payload, hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(expected, headers.get('X-Frimi-Signature', '')):
+            raise ValueError('Invalid Frimi signature')
+        payment_id = int(str(data['reference']).rsplit('-', 1)[-1])
+        status = {'SUCCESS': 'completed', 'FAILED': 'failed'}.get(data.get('status'), 'pending')
+        return payment_id, GatewayResult(status, str(data.get('transaction_id', '')), dict(data),
+                                         reason=data.get('message', ''))
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def get_gateway(payment_method):
+    """Shared gateway client for a payment method, built from settings.PAYMENT_GATEWAYS.
+
+    Entries are a dotted class path, or a dict with 'BACKEND' and the client
+    options. Clients are kept for the life of the process so their connections
+    are reused.
+    """
+    config = dict(DEFAULT_GATEWAYS, **getattr(settings, 'PAYMENT_GATEWAYS', {})).get(payment_method)
+    if config is None:
+        raise ValueError('Unsupported payment method')
+    if isinstance(config, str):
+        config = {'BACKEND': config}
+    key = (payment_method, json.dumps(config, sort_keys=True, default=str))
+    with _gateways_lock:
+        if key not in _gateways:
+            options = {name.lower(): value for name, value in config.items() if name != 'BACKEND'}
+            _gateways[key] = import_string(config['BACKEND'])(**options)
+        return _gateways[key]
@@ -0,0 +1,133 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from providers.models import FitnessMembership
+from .models import Booking, BookingAvailability
+from .notifications import ReminderPlanner
+from .services import AvailabilityCache, PaymentService
+
+logger = logging.getLogger(__name__)
+
+
+class LifecycleSweeper:
+    """Moves bookings and memberships to the state their dates imply.
+
+    Each sweep selects matching ids in chunks walking the primary key and
+    applies one set-based UPDATE per chunk in its own transaction. The last id
+    done is checkpointed in the cache, so a run that dies part way resumes
+    where it stopped; the checkpoint is cleared once a sweep finishes.
+
+    - confirmed bookings whose start is grace_hours past become completed
+    - bookings still pending by then become no_show
+    - pending bookings held longer than hold_hours without a payment in
+      flight are cancelled and their slot capacity released
+    - active memberships past their end date become expired
+    """
+
+    checkpoint_timeout = 6 * 60 * 60
+
+    def __init__(self, chunk_size=None, grace_hours=None, hold_hours=None):
+        self.chunk_size = chunk_size or getattr(settings, 'BOOKING_SWEEP_CHUNK_SIZE', 1000)
+        self.grace_hours = grace_hours or getattr(settings, 'BOOKING_COMPLETE_AFTER_HOURS', 3)
+        self.hold_hours = hold_hours or getattr(settings, 'BOOKING_HOLD_HOURS', 24)
+
+    def run(self):
+        """Run every sweep; returns the rows each one changed"""
+        return {
+            'completed': self.complete_past_bookings(),
+            'no_show': self.mark_no_shows(),
+            'expired_holds': self.expire_holds(),
+            'expired_memberships': self.expire_memberships(),
+        }
+
+    def started_before(self, moment):
+        """Bookings whose start (local date and time) is at or before moment"""
+        moment = timezone.localtime(moment)
+        return Q(booking_date__lt=moment.date()) | Q(booking_date=moment.date(), booking_time__lte=moment.time())
+
+    def complete_past_bookings(self):
+        past = Booking.objects.filter(
+            self.started_before(timezone.now() - timedelta(hours=self.grace_hours)), status='confirmed'
+        )
+        return self._sweep('complete', past, lambda chunk: chunk.update(
+            status='completed', updated_at=timezone.now()
+        ))
+
+    def mark_no_shows(self):
+        past = Booking.objects.filter(
+            self.started_before(timezone.now() - timedelta(hours=self.grace_hours)), status='pending'
+        )
+        return self._sweep('no_show', past, lambda chunk: chunk.update(
+            status='no_show', updated_at=timezone.now()
+        ))
+
+    def expire_holds(self):
+        now = timezone.now()
+        held = Booking.objects.filter(
+            status='pending',
+            payment_status='pending',
+            created_at__lt=now - timedelta(hours=self.hold_hours)
+        ).exclude(
+            self.started_before(now)
+        ).exclude(
+            payments__status__in=PaymentService.in_flight_statuses
+        )
+        return self._sweep('expire_holds', held, self._cancel_holds)
+
+    def expire_memberships(self):
+        ended = FitnessMembership.objects.filter(status='active', end_date__lt=timezone.localdate())
+        return self._sweep('expire_memberships', ended, lambda chunk: chunk.update(
+            status='expired', updated_at=timezone.now()
+        ))
+
+    def _cancel_holds(self, chunk):
+        # Lock the chunk so a payment or confirmation can't land between the release and the update
+        ids = list(chunk.select_for_update().values_list('id', flat=True))
+        bookings = Booking.objects.filter(id__in=ids)
+
+        held = bookings.values('provider_id', 'service_id', 'booking_date', 'booking_time').annotate(
+            participants=Sum('participants')
+        ).order_by()
+        for slot in held:
+            BookingAvailability.objects.filter(
+                provider_id=slot['provider_id'],
+                service_id=slot['service_id'],
+                date=slot['booking_date'],
+                start_time=slot['booking_time']
+            ).update(current_bookings=Greatest(F('current_bookings') - slot['participants'], 0))
+
+        AvailabilityCache.invalidate_bookings(bookings)
+        ReminderPlanner().cancel_pending(bookings)
+        return bookings.update(
+            status='cancelled',
+            cancelled_at=timezone.now(),
+            cancellation_reason='Expired without confirmation or payment',
+            updated_at=timezone.now()
+        )
+
+    def _sweep(self, name, queryset, apply):
+        """Call apply with chunk_size slices of queryset in id order; returns the total it reports"""
+        checkpoint_key = f'bookings:sweep:{name}'
+        last_id = cache.get(checkpoint_key, 0)
+        total = 0
+        while True:
+            ids = list(
+                queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:self.chunk_size]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                # Re-filter so rows that changed since they were selected are left alone
+                total += apply(queryset.filter(id__in=ids))
+            last_id = ids[-1]
+            cache.set(checkpoint_key, last_id, self.checkpoint_timeout)
+            logger.info('Sweep %s: %d rows updated, checkpoint at id %d', name, total, last_id)
+        cache.delete(checkpoint_key)
+        return total
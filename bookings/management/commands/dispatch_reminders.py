@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from bookings.notifications import ReminderDispatcher
+
+
+class Command(BaseCommand):
+    help = 'Send due booking reminders; run from cron, or with --loop as a long-lived worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Reminders claimed per batch (default REMINDER_BATCH_SIZE)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for due reminders instead of exiting')
+        parser.add_argument('--interval', type=float, default=30,
+                            help='Seconds to wait between polls with --loop')
+
+    def handle(self, *args, **options):
+        dispatcher = ReminderDispatcher(batch_size=options['batch_size'])
+        while True:
+            sent, failed = dispatcher.run()
+            if sent or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Sent {sent} reminders; {failed} failed permanently'))
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from bookings.services import PaymentService
+
+
+class Command(BaseCommand):
+    help = 'Charge queued payments through their gateways; run from cron, or with --loop as a long-lived worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Payments claimed per batch (default PAYMENT_BATCH_SIZE)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for queued payments instead of exiting')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Seconds to wait between polls with --loop')
+
+    def handle(self, *args, **options):
+        service = PaymentService(batch_size=options['batch_size'])
+        while True:
+            completed, failed = service.run_pending()
+            if completed or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Completed {completed} payments; {failed} failed'))
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
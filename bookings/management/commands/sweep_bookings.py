@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from bookings.lifecycle import LifecycleSweeper
+
+
+class Command(BaseCommand):
+    help = 'Complete past bookings, mark no-shows, expire stale holds and memberships; run from cron'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Rows updated per statement (default BOOKING_SWEEP_CHUNK_SIZE)')
+        parser.add_argument('--grace-hours', type=float, default=None,
+                            help='Hours after the start before a booking is completed or marked no-show')
+        parser.add_argument('--hold-hours', type=float, default=None,
+                            help='Hours a pending, unpaid booking holds its slot')
+
+    def handle(self, *args, **options):
+        sweeper = LifecycleSweeper(
+            chunk_size=options['chunk_size'],
+            grace_hours=options['grace_hours'],
+            hold_hours=options['hold_hours']
+        )
+        for sweep, count in sweeper.run().items():
+            self.stdout.write(self.style.SUCCESS(f'{sweep}: {count}'))
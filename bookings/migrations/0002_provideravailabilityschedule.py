@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0001_initial'),
+        ('providers', '0004_provider_search_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderAvailabilitySchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('max_bookings', models.PositiveIntegerField(default=1)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_schedule', to='providers.provider')),
+                ('service', models.ForeignKey(blank=True, help_text='Leave empty for a window that applies to all services', null=True, on_delete=django.db.models.deletion.CASCADE, to='providers.providerservice')),
+            ],
+            options={
+                'ordering': ['weekday', 'start_time'],
+                'indexes': [models.Index(fields=['provider', 'is_active', 'weekday'], name='bookings_pr_provide_4df041_idx')],
+            },
+        ),
+    ]
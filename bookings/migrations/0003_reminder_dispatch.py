@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0002_provideravailabilityschedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookingreminder',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bookingreminder',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, help_text='When a dispatcher took this reminder for sending', null=True),
+        ),
+        migrations.AlterField(
+            model_name='bookingreminder',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_reminder_dispatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookingpayment',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bookingpayment',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bookingpayment',
+            name='idempotency_key',
+            field=models.CharField(blank=True, help_text='Client token that makes repeated payment requests return the same payment', max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='bookingpayment',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, help_text='When the payment worker may next charge it', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='bookingpayment',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='bookings_bo_status_6f0cf2_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_payment_intents'),
+        ('providers', '0005_membership_status_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'booking_date', 'booking_time'], name='bookings_bo_status_2fbf98_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-17 09:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_payment_users(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    BookingPayment = apps.get_model('bookings', 'BookingPayment')
+    BookingPayment.objects.update(
+        user=Subquery(Booking.objects.filter(pk=OuterRef('booking_id')).values('user_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0006_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookingpayment',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='booking_payments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(populate_payment_users, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='bookingpayment',
+            name='user',
+            field=models.ForeignKey(help_text='The paying customer; idempotency keys are unique per user', on_delete=django.db.models.deletion.CASCADE, related_name='booking_payments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='bookingpayment',
+            name='idempotency_key',
+            field=models.CharField(blank=True, help_text='Client token that makes repeated payment requests return the same payment', max_length=64, null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='bookingpayment',
+            unique_together={('user', 'idempotency_key')},
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 from decimal import Decimal
 import uuid
 from datetime import datetime, timedelta
@@ -80,6 +81,8 @@ class Booking(models.Model):
             models.Index(fields=['provider', 'booking_date']),
             models.Index(fields=['booking_date', 'booking_time']),
             models.Index(fields=['status', 'payment_status']),
+            models.Index(fields=['status', 'booking_date', 'booking_time']),
+            models.Index(fields=['user', '-created_at', '-id'], name='booking_user_keyset_idx'),
         ]
     
     def __str__(self):
@@ -87,8 +90,8 @@ class Booking(models.Model):
     
     @property
     def booking_datetime(self):
-        """Get complete booking datetime"""
-        return datetime.combine(self.booking_date, self.booking_time)
+        """Get complete booking datetime in the current time zone"""
+        return timezone.make_aware(datetime.combine(self.booking_date, self.booking_time))
     
     @property
     def end_datetime(self):
@@ -98,7 +101,7 @@ class Booking(models.Model):
     @property
     def is_past(self):
         """Check if booking is in the past"""
-        return self.booking_datetime < datetime.now()
+        return self.booking_datetime < timezone.now()
     
     @property
     def can_cancel(self):
@@ -106,7 +109,7 @@ class Booking(models.Model):
         if self.status in ['cancelled', 'completed', 'no_show']:
             return False
         # Allow cancellation up to 2 hours before booking
-        return self.booking_datetime > datetime.now() + timedelta(hours=2)
+        return self.booking_datetime > timezone.now() + timedelta(hours=2)
     
     @property
     def can_reschedule(self):
@@ -115,7 +118,7 @@ class Booking(models.Model):
             return False
         if self.reschedule_count >= 2:  # Maximum 2 reschedules
             return False
-        return self.booking_datetime > datetime.now() + timedelta(hours=24)
+        return self.booking_datetime > timezone.now() + timedelta(hours=24)
     
     def save(self, *args, **kwargs):
         # Calculate total amount if not set
@@ -177,6 +180,47 @@ class BookingAvailability(models.Model):
         return max(0, self.max_bookings - self.current_bookings)
 
 
+
+class ProviderAvailabilitySchedule(models.Model):
+    """Recurring weekly availability windows for a provider, optionally per service"""
+    
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+    
+    provider = models.ForeignKey('providers.Provider', on_delete=models.CASCADE, related_name='availability_schedule')
+    service = models.ForeignKey('providers.ProviderService', on_delete=models.CASCADE, null=True, blank=True,
+                                help_text="Leave empty for a window that applies to all services")
+    
+    # Weekly window
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    
+    # Capacity per slot
+    max_bookings = models.PositiveIntegerField(default=1)
+    is_active = models.BooleanField(default=True)
+    
+    # Metadata
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['weekday', 'start_time']
+        indexes = [
+            models.Index(fields=['provider', 'is_active', 'weekday']),
+        ]
+    
+    def __str__(self):
+        service_name = self.service.name if self.service else "General"
+        return f"{self.provider.business_name} - {service_name} on {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
 class BookingCancellation(models.Model):
     """Track booking cancellations and refunds"""
     
@@ -242,6 +286,7 @@ class BookingReminder(models.Model):
     
     STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('sending', 'Sending'),
         ('sent', 'Sent'),
         ('failed', 'Failed'),
         ('cancelled', 'Cancelled'),
@@ -262,6 +307,8 @@ class BookingReminder(models.Model):
     # Status
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     error_message = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_at = models.DateTimeField(null=True, blank=True, help_text="When a dispatcher took this reminder for sending")
     
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
@@ -299,6 +346,8 @@ class BookingPayment(models.Model):
     ]
     
     booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='payments')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='booking_payments',
+                             help_text="The paying customer; idempotency keys are unique per user")
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES)
     
     # Payment Details
@@ -316,6 +365,11 @@ class BookingPayment(models.Model):
     provider_amount = models.DecimalField(max_digits=8, decimal_places=2, default=0)
     
     # Processing
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True,
+                                       help_text="Client token that makes repeated payment requests return the same payment")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True, help_text="When the payment worker may next charge it")
+    claimed_at = models.DateTimeField(null=True, blank=True)
     processed_at = models.DateTimeField(null=True, blank=True)
     failed_reason = models.TextField(blank=True)
     
@@ -329,12 +383,17 @@ class BookingPayment(models.Model):
             models.Index(fields=['booking', 'status']),
             models.Index(fields=['gateway_transaction_id']),
             models.Index(fields=['status', 'processed_at']),
+            models.Index(fields=['status', 'next_attempt_at']),
         ]
+        unique_together = ['user', 'idempotency_key']
     
     def __str__(self):
         return f"Payment {self.id} for {self.booking.booking_id} - {self.amount} {self.currency}"
     
     def save(self, *args, **kwargs):
+        if self.user_id is None:
+            self.user_id = self.booking.user_id
+        
         # Calculate provider amount after commission
         if not self.provider_amount and self.amount:
             commission_rate = Decimal('0.10')  # 10% platform commission
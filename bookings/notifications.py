@@ -0,0 +1,373 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import BookingReminder
+
+logger = logging.getLogger(__name__)
+
+# (subject, message) per language and reminder type, formatted with provider, service, date and time
+REMINDER_TEMPLATES = {
+    'en': {
+        'confirmation': (
+            'Booking Confirmation - {provider}',
+            'Your booking for {service} on {date} at {time} has been confirmed.',
+        ),
+        'reminder_24h': (
+            'Reminder: Your appointment tomorrow at {provider}',
+            'This is a reminder for your {service} appointment tomorrow at {time}.',
+        ),
+        'reminder_2h': (
+            'Reminder: Appointment in 2 hours',
+            'Your {service} appointment at {provider} is in 2 hours.',
+        ),
+        'cancellation': (
+            'Booking Cancelled - {provider}',
+            'Your booking for {service} on {date} has been cancelled.',
+        ),
+        'reschedule': (
+            'Booking Rescheduled - {provider}',
+            'Your booking for {service} has been moved to {date} at {time}.',
+        ),
+    },
+    'si': {
+        'confirmation': (
+            'වෙන්කිරීම තහවුරු කිරීම - {provider}',
+            '{date} දින {time} ට {service} සඳහා ඔබගේ වෙන්කිරීම තහවුරු කර ඇත.',
+        ),
+        'reminder_24h': (
+            'මතක් කිරීම: හෙට {provider} හි ඔබගේ හමුව',
+            'හෙට {time} ට ඔබගේ {service} හමුව පිළිබඳ මතක් කිරීමකි.',
+        ),
+        'reminder_2h': (
+            'මතක් කිරීම: පැය 2 කින් හමුව',
+            '{provider} හි ඔබගේ {service} හමුව පැය 2 කින් ආරම්භ වේ.',
+        ),
+        'cancellation': (
+            'වෙන්කිරීම අවලංගු කරන ලදී - {provider}',
+            '{date} දින {service} සඳහා ඔබගේ වෙන්කිරීම අවලංගු කර ඇත.',
+        ),
+        'reschedule': (
+            'වෙන්කිරීම නැවත සැලසුම් කරන ලදී - {provider}',
+            'ඔබගේ {service} වෙන්කිරීම {date} දින {time} ට වෙනස් කර ඇත.',
+        ),
+    },
+    'ta': {
+        'confirmation': (
+            'முன்பதிவு உறுதிப்படுத்தல் - {provider}',
+            '{date} அன்று {time} மணிக்கு {service} க்கான உங்கள் முன்பதிவு உறுதிப்படுத்தப்பட்டது.',
+        ),
+        'reminder_24h': (
+            'நினைவூட்டல்: நாளை {provider} இல் உங்கள் சந்திப்பு',
+            'நாளை {time} மணிக்கு உங்கள் {service} சந்திப்புக்கான நினைவூட்டல்.',
+        ),
+        'reminder_2h': (
+            'நினைவூட்டல்: 2 மணி நேரத்தில் சந்திப்பு',
+            '{provider} இல் உங்கள் {service} சந்திப்பு 2 மணி நேரத்தில் தொடங்கும்.',
+        ),
+        'cancellation': (
+            'முன்பதிவு ரத்து செய்யப்பட்டது - {provider}',
+            '{date} அன்று {service} க்கான உங்கள் முன்பதிவு ரத்து செய்யப்பட்டது.',
+        ),
+        'reschedule': (
+            'முன்பதிவு மாற்றியமைக்கப்பட்டது - {provider}',
+            'உங்கள் {service} முன்பதிவு {date} அன்று {time} மணிக்கு மாற்றப்பட்டது.',
+        ),
+    },
+}
+
+
+class ReminderPlanner:
+    """Plans and renders reminders for many bookings and inserts them with one bulk_create.
+
+    Reminders are rendered in the customer's language. Localized provider and
+    service names are looked up once per (provider, service, language), so a
+    batch of bookings at the same provider formats names only once.
+    """
+
+    # (reminder type, delivery method, lead time before the booking)
+    schedule_plan = [
+        ('reminder_24h', 'email', timedelta(hours=24)),
+        ('reminder_2h', 'sms', timedelta(hours=2)),
+    ]
+
+    def __init__(self):
+        self._names = {}
+
+    def schedule(self, bookings, skip_existing=False, notice='confirmation'):
+        """An immediate notice plus the timed reminders still ahead of each booking
+
+        notice is the immediate reminder type: 'confirmation', or 'reschedule' for a moved booking.
+        """
+        now = timezone.now()
+        bookings = list(bookings)
+        existing = set()
+        if skip_existing and bookings:
+            existing = set(BookingReminder.objects.filter(
+                booking__in=bookings
+            ).exclude(status='cancelled').values_list('booking_id', 'reminder_type'))
+
+        reminders = []
+        for booking in bookings:
+            booking_datetime = booking.booking_datetime
+            plan = [(notice, 'email', now)] + [
+                (reminder_type, method, booking_datetime - lead)
+                for reminder_type, method, lead in self.schedule_plan
+                if booking_datetime > now + lead
+            ]
+            for reminder_type, method, scheduled_for in plan:
+                if (booking.id, reminder_type) not in existing:
+                    reminders.append(self.render(booking, reminder_type, method, scheduled_for))
+        return BookingReminder.objects.bulk_create(reminders)
+
+    def notify(self, bookings, reminder_type, delivery_method='email'):
+        """An immediate notification, such as a cancellation, for each booking"""
+        now = timezone.now()
+        return BookingReminder.objects.bulk_create([
+            self.render(booking, reminder_type, delivery_method, now) for booking in bookings
+        ])
+
+    def cancel_pending(self, bookings):
+        """Stop reminders that are no longer relevant once bookings are cancelled or moved"""
+        return BookingReminder.objects.filter(
+            booking__in=bookings,
+            status='pending',
+            reminder_type__in=['reminder_24h', 'reminder_2h', 'follow_up']
+        ).update(status='cancelled')
+
+    def render(self, booking, reminder_type, delivery_method, scheduled_for):
+        """Unsaved BookingReminder with subject and message in the customer's language"""
+        language = getattr(booking.user, 'language_preference', 'en')
+        templates = REMINDER_TEMPLATES.get(language, REMINDER_TEMPLATES['en'])
+        subject, message = templates.get(reminder_type, REMINDER_TEMPLATES['en'][reminder_type])
+        context = dict(
+            self._localized_names(booking, language),
+            date=booking.booking_date,
+            time=booking.booking_time
+        )
+        return BookingReminder(
+            booking=booking,
+            reminder_type=reminder_type,
+            delivery_method=delivery_method,
+            scheduled_for=scheduled_for,
+            subject=subject.format(**context)[:200],
+            message=message.format(**context)
+        )
+
+    def _localized_names(self, booking, language):
+        key = (booking.provider_id, booking.service_id, language)
+        if key not in self._names:
+            self._names[key] = {
+                'provider': booking.provider.get_localized_name(language),
+                'service': booking.service.get_localized_name(language),
+            }
+        return self._names[key]
+
+
+class SMSMessage:
+    """A text message for an SMS backend"""
+
+    def __init__(self, to, body):
+        self.to = to
+        self.body = body
+
+
+class BaseSMSBackend:
+    """Connection to an SMS gateway, opened once and reused for a batch of messages"""
+
+    def __init__(self, fail_silently=False, **kwargs):
+        self.fail_silently = fail_silently
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def send_messages(self, messages):
+        """Send messages and return the number sent"""
+        raise NotImplementedError
+
+
+class ConsoleSMSBackend(BaseSMSBackend):
+    """Logs messages instead of sending them; the default until a gateway is configured"""
+
+    def send_messages(self, messages):
+        for message in messages:
+            logger.info('SMS to %s: %s', message.to, message.body)
+        return len(messages)
+
+
+class LocmemSMSBackend(BaseSMSBackend):
+    """Keeps messages in LocmemSMSBackend.outbox, for tests"""
+
+    outbox = []
+
+    def send_messages(self, messages):
+        LocmemSMSBackend.outbox.extend(messages)
+        return len(messages)
+
+
+def get_sms_connection(backend=None, **kwargs):
+    """Instantiate the SMS backend named by settings.SMS_BACKEND"""
+    backend = backend or getattr(settings, 'SMS_BACKEND', 'bookings.notifications.ConsoleSMSBackend')
+    return import_string(backend)(**kwargs)
+
+
+class ReminderDispatcher:
+    """Claims due BookingReminder rows in batches and delivers them.
+
+    Claiming walks the (status, scheduled_for) index with SELECT ... FOR UPDATE
+    SKIP LOCKED, so several dispatchers can run side by side without sending a
+    reminder twice. Each channel in a batch shares one connection. Failed sends
+    are retried with exponential backoff until max_attempts, and outcomes are
+    written back with one bulk_update per batch.
+    """
+
+    # Reminders left in 'sending' this long belong to a dispatcher that died
+    claim_timeout = timedelta(minutes=10)
+
+    def __init__(self, batch_size=None, max_attempts=None, retry_base_seconds=None):
+        self.batch_size = batch_size or getattr(settings, 'REMINDER_BATCH_SIZE', 100)
+        self.max_attempts = max_attempts or getattr(settings, 'REMINDER_MAX_ATTEMPTS', 5)
+        self.retry_base_seconds = retry_base_seconds or getattr(settings, 'REMINDER_RETRY_BASE_SECONDS', 60)
+        self.senders = {
+            'email': self._send_emails,
+            'sms': self._send_sms,
+        }
+        # The booking field each channel sends to
+        self.recipient_fields = {
+            'email': 'customer_email',
+            'sms': 'customer_phone',
+        }
+
+    def run(self, reminders=None):
+        """Dispatch batches until nothing is left to claim; returns (sent, failed)"""
+        self.requeue_stale()
+        sent = failed = 0
+        while True:
+            batch = self.claim(reminders)
+            if not batch:
+                return sent, failed
+            batch_sent, batch_failed = self.deliver(batch)
+            sent += batch_sent
+            failed += batch_failed
+
+    def requeue_stale(self):
+        """Return reminders claimed by a dispatcher that never finished to the queue"""
+        return BookingReminder.objects.filter(
+            status='sending',
+            claimed_at__lt=timezone.now() - self.claim_timeout
+        ).update(status='pending', claimed_at=None)
+
+    def claim(self, reminders=None):
+        """Mark up to batch_size due reminders as 'sending' and return them"""
+        now = timezone.now()
+        queryset = reminders if reminders is not None else BookingReminder.objects.all()
+        # Retries are rescheduled into the future, so a run never picks them up twice
+        queryset = queryset.filter(status='pending', scheduled_for__lte=now)
+
+        with transaction.atomic():
+            ids = list(
+                queryset.order_by('scheduled_for').select_for_update(skip_locked=True).values_list(
+                    'id', flat=True
+                )[:self.batch_size]
+            )
+            if not ids:
+                return []
+            BookingReminder.objects.filter(id__in=ids, status='pending').update(status='sending', claimed_at=now)
+
+        return list(BookingReminder.objects.filter(id__in=ids, status='sending', claimed_at=now).select_related(
+            'booking__provider', 'booking__service'
+        ))
+
+    def deliver(self, reminders):
+        """Send claimed reminders, channel by channel, and record the outcomes"""
+        errors = {}
+        # Retrying can't help a booking without an address for the channel
+        undeliverable = set()
+        by_method = {}
+        for reminder in reminders:
+            field = self.recipient_fields.get(reminder.delivery_method)
+            if field and not (getattr(reminder.booking, field) or '').strip():
+                errors[reminder.id] = f'The booking has no {field.replace("_", " ")}'
+                undeliverable.add(reminder.id)
+                continue
+            by_method.setdefault(reminder.delivery_method, []).append(reminder)
+
+        for method, group in by_method.items():
+            sender = self.senders.get(method)
+            if sender is None:
+                errors.update({reminder.id: f'No delivery backend for {method}' for reminder in group})
+                continue
+            try:
+                errors.update(sender(group))
+            except Exception as e:
+                # The connection itself failed; every reminder in the group is retried
+                logger.exception('Reminder delivery over %s failed', method)
+                errors.update({reminder.id: str(e) for reminder in group})
+
+        now = timezone.now()
+        for reminder in reminders:
+            reminder.claimed_at = None
+            if reminder.id not in errors:
+                reminder.status = 'sent'
+                reminder.sent_at = now
+                reminder.error_message = ''
+                continue
+            reminder.attempts += 1
+            reminder.error_message = errors[reminder.id]
+            if (reminder.attempts >= self.max_attempts or reminder.delivery_method not in self.senders
+                    or reminder.id in undeliverable):
+                reminder.status = 'failed'
+            else:
+                reminder.status = 'pending'
+                reminder.scheduled_for = now + self.retry_delay(reminder.attempts)
+
+        BookingReminder.objects.bulk_update(
+            reminders, ['status', 'sent_at', 'error_message', 'attempts', 'scheduled_for', 'claimed_at']
+        )
+        failed = sum(1 for reminder in reminders if reminder.status == 'failed')
+        return len(reminders) - len(errors), failed
+
+    def retry_delay(self, attempts):
+        """Exponential backoff, capped at a day"""
+        return timedelta(seconds=min(self.retry_base_seconds * 2 ** (attempts - 1), 24 * 60 * 60))
+
+    def _send_emails(self, reminders):
+        errors = {}
+        with get_connection() as connection:
+            for reminder in reminders:
+                message = EmailMessage(
+                    subject=reminder.subject,
+                    body=reminder.message,
+                    to=[reminder.booking.customer_email],
+                    connection=connection
+                )
+                try:
+                    message.send()
+                except Exception as e:
+                    errors[reminder.id] = str(e)
+        return errors
+
+    def _send_sms(self, reminders):
+        errors = {}
+        with get_sms_connection() as connection:
+            for reminder in reminders:
+                try:
+                    connection.send_messages([SMSMessage(reminder.booking.customer_phone, reminder.message)])
+                except Exception as e:
+                    errors[reminder.id] = str(e)
+        return errors
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from common.serializers import SparseFieldsetMixin
 from .models import Booking, BookingAvailability, BookingCancellation, BookingPayment
 from providers.serializers import ProviderListSerializer, ProviderServiceSerializer
 
@@ -48,13 +49,19 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         
         return Booking.objects.create(**validated_data)
 
-class BookingListSerializer(serializers.ModelSerializer):
+class BookingListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for booking list view"""
     provider_name = serializers.CharField(source='provider.business_name', read_only=True)
     service_name = serializers.CharField(source='service.name', read_only=True)
     can_cancel = serializers.BooleanField(read_only=True)
     can_reschedule = serializers.BooleanField(read_only=True)
     
+    expandable_fields = {'service': (ProviderServiceSerializer, {})}
+    field_dependencies = {
+        'can_cancel': ['status', 'booking_date', 'booking_time'],
+        'can_reschedule': ['status', 'reschedule_count', 'booking_date', 'booking_time'],
+    }
+    
     class Meta:
         model = Booking
         fields = [
@@ -137,9 +144,9 @@ class BookingPaymentSerializer(serializers.ModelSerializer):
         model = BookingPayment
         fields = [
             'id', 'payment_method', 'amount', 'currency', 'status',
-            'gateway_transaction_id', 'processed_at', 'created_at'
+            'gateway_transaction_id', 'failed_reason', 'processed_at', 'created_at'
         ]
-        read_only_fields = ['id', 'gateway_transaction_id', 'processed_at', 'created_at']
+        read_only_fields = ['id', 'gateway_transaction_id', 'failed_reason', 'processed_at', 'created_at']
 
 class RescheduleBookingSerializer(serializers.Serializer):
     """Serializer for rescheduling bookings"""
@@ -174,7 +181,7 @@ class RescheduleBookingSerializer(serializers.Serializer):
 
 class ProviderBookingsSerializer(serializers.ModelSerializer):
     """Serializer for provider's booking management"""
-    customer_name = serializers.CharField(source='customer_name', read_only=True)
+    customer_name = serializers.CharField(read_only=True)
     service_name = serializers.CharField(source='service.name', read_only=True)
     
     class Meta:
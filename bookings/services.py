@@ -1,7 +1,323 @@
-from django.db.models import Q, Sum
+import logging
+import time as clock
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from datetime import datetime, timedelta, time
-from .models import Booking, BookingAvailability, BookingCancellation, BookingReminder, BookingPayment
+from .models import (
+    Booking, BookingAvailability, BookingCancellation, BookingReminder, BookingPayment,
+    ProviderAvailabilitySchedule
+)
+from providers.counters import increment_bookings
+from .gateways import GatewayError, GatewayResult, get_gateway
+from .notifications import ReminderPlanner
+
+logger = logging.getLogger(__name__)
+
+WEEKDAY_NAMES = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+class AvailabilityCache:
+    """Cached per-day slot maps [(time, capacity, booked)] for one provider and service.
+    
+    Data keys embed a provider version, bumped when schedules or operating
+    hours change, and a per-date version, bumped when a booking or
+    BookingAvailability row on that date changes. A reader that computed a map
+    before an invalidation therefore writes it under a key nobody reads again.
+    """
+    
+    timeout = 60 * 10
+    
+    def __init__(self, provider_id, service_id):
+        self.provider_id = provider_id
+        self.service_id = service_id
+    
+    @staticmethod
+    def _provider_version_key(provider_id):
+        return f'bookings:slots:provider:{provider_id}'
+    
+    @staticmethod
+    def _date_version_key(provider_id, service_id, date):
+        return f'bookings:slots:date:{provider_id}:{service_id}:{date.isoformat()}'
+    
+    def _versions(self, keys):
+        versions = cache.get_many(keys)
+        missing = [key for key in keys if key not in versions]
+        for key in missing:
+            # A fresh version never collides with data cached under an evicted one
+            cache.add(key, clock.time_ns(), timeout=None)
+        if missing:
+            versions.update(cache.get_many(missing))
+        return versions
+    
+    def _data_keys(self, dates):
+        provider_key = self._provider_version_key(self.provider_id)
+        date_keys = {date: self._date_version_key(self.provider_id, self.service_id, date) for date in dates}
+        versions = self._versions([provider_key] + list(date_keys.values()))
+        return {
+            date: f'bookings:slots:{self.provider_id}:{versions.get(provider_key)}:'
+                  f'{self.service_id}:{date.isoformat()}:{versions.get(date_key)}'
+            for date, date_key in date_keys.items()
+        }
+    
+    @classmethod
+    def provider_version(cls, provider_id):
+        """Current availability version of a provider"""
+        key = cls._provider_version_key(provider_id)
+        return cls(provider_id, None)._versions([key])[key]
+    
+    def get_many(self, dates):
+        """Cached day maps for dates, and the keys to store the missing ones under"""
+        keys = self._data_keys(dates)
+        cached = cache.get_many(list(keys.values()))
+        days = {date: cached[key] for date, key in keys.items() if key in cached}
+        missing = {date: key for date, key in keys.items() if key not in cached}
+        return days, missing
+    
+    def set_many(self, missing, days):
+        cache.set_many({key: days[date] for date, key in missing.items()}, self.timeout)
+    
+    @staticmethod
+    def _bump(key):
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass  # No version yet, so nothing is cached under it
+    
+    @classmethod
+    def invalidate_dates(cls, provider_id, service_id, dates):
+        """Drop the cached maps of one service on the given dates once the transaction commits"""
+        keys = [cls._date_version_key(provider_id, service_id, date) for date in set(dates)]
+        transaction.on_commit(lambda: [cls._bump(key) for key in keys])
+    
+    @classmethod
+    def invalidate_provider(cls, provider_id):
+        """Drop every cached map of a provider once the transaction commits"""
+        key = cls._provider_version_key(provider_id)
+        transaction.on_commit(lambda: cls._bump(key))
+    
+    @classmethod
+    def invalidate_bookings(cls, bookings):
+        """Drop the cached maps touched by a booking queryset, e.g. before a bulk update"""
+        for provider_id, service_id, date in bookings.values_list(
+            'provider_id', 'service_id', 'booking_date'
+        ).distinct().order_by():
+            cls.invalidate_dates(provider_id, service_id, [date])
+
+
+def to_minutes(value):
+    """Minutes since midnight of a time"""
+    return value.hour * 60 + value.minute
+
+
+def to_time(minutes):
+    return time(minutes // 60 % 24, minutes % 60)
+
+
+class WeeklySchedule:
+    """A provider's operating hours and availability windows compiled to minutes since midnight.
+    
+    hours[weekday] is (open, close) or None; windows[weekday] lists
+    (start, end, max_bookings, service_id) sorted by start, with service_id None
+    for windows shared by all services. The compiled form is cached under the
+    provider's availability version, so schedule or operating-hours changes
+    recompile it, and every availability check is integer comparisons.
+    """
+    
+    timeout = 60 * 60 * 24
+    
+    def __init__(self, hours, windows):
+        self.hours = hours
+        self.windows = windows
+    
+    @classmethod
+    def for_provider(cls, provider):
+        """The compiled schedule, memoized on the provider instance and cached per version"""
+        version = AvailabilityCache.provider_version(provider.pk)
+        memo = getattr(provider, '_weekly_schedule', None)
+        if memo is not None and memo[0] == version:
+            return memo[1]
+        
+        key = f'bookings:schedule:{provider.pk}:{version}'
+        data = cache.get(key)
+        if data is None:
+            data = cls.compile(provider)
+            # Inside a transaction the compiled schedule may include changes whose version bump waits
+            # for the commit; caching it now would file them under the old version, even on rollback
+            transaction.on_commit(lambda: cache.set(key, data, cls.timeout))
+        compiled = cls(*data)
+        provider._weekly_schedule = (version, compiled)
+        return compiled
+    
+    @staticmethod
+    def compile(provider):
+        """(hours, windows) for a provider from its operating_hours and one schedule query"""
+        hours = []
+        for name in WEEKDAY_NAMES:
+            operating_hours = provider.operating_hours.get(name, {})
+            if operating_hours:
+                open_time = datetime.strptime(operating_hours.get('open', '09:00'), '%H:%M').time()
+                close_time = datetime.strptime(operating_hours.get('close', '17:00'), '%H:%M').time()
+                hours.append((to_minutes(open_time), to_minutes(close_time)))
+            else:
+                hours.append(None)
+        
+        windows = [[] for _ in range(7)]
+        schedules = ProviderAvailabilitySchedule.objects.filter(
+            provider=provider, is_active=True
+        ).order_by('weekday', 'start_time').values_list(
+            'weekday', 'start_time', 'end_time', 'max_bookings', 'service_id'
+        )
+        for weekday, start_time, end_time, max_bookings, service_id in schedules:
+            start, end = to_minutes(start_time), to_minutes(end_time)
+            # A window ending at midnight ends at the end of the day
+            windows[weekday].append((start, end if end > start else 24 * 60, max_bookings, service_id))
+        return hours, windows
+    
+    def is_open(self, weekday, minute):
+        hours = self.hours[weekday]
+        return hours is not None and hours[0] <= minute <= hours[1]
+    
+    def capacity(self, weekday, minute, service_id):
+        """max_bookings of the window covering minute, preferring a service-specific one"""
+        general = None
+        for start, end, max_bookings, window_service_id in self.windows[weekday]:
+            if start <= minute < end:
+                if window_service_id == service_id:
+                    return max_bookings
+                if window_service_id is None and general is None:
+                    general = max_bookings
+        return general
+    
+    def timeline(self, weekday, service_id, step):
+        """[(minute, capacity)] of slot starts every step minutes from each window start"""
+        if self.hours[weekday] is None:
+            return []
+        starts = set()
+        for start, end, _, window_service_id in self.windows[weekday]:
+            if window_service_id in (service_id, None):
+                starts.update(range(start, end, step))
+        
+        timeline = []
+        for minute in sorted(starts):
+            if self.is_open(weekday, minute):
+                capacity = self.capacity(weekday, minute, service_id)
+                if capacity is not None:
+                    timeline.append((minute, capacity))
+        return timeline
+
+
+class AvailabilityEngine:
+    """Open slots for one provider and service over a date range in two queries.
+    
+    Weekly schedules, the participants already booked per slot and the slots
+    blocked or marked unavailable are loaded for the whole range up front;
+    each day's capacity timeline is then built in memory from the schedule
+    windows of its weekday.
+    """
+    
+    slot_minutes = 30
+    active_statuses = ['pending', 'confirmed']
+    
+    def __init__(self, provider, service):
+        self.provider = provider
+        self.service = service
+    
+    def slots(self, date_from, date_to, participants=1, exclude_booking=None):
+        """Slots with room for participants, as dicts with date, time, capacity and available_spots"""
+        dates = [date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+        if exclude_booking:
+            days = self.compute_days(date_from, date_to, exclude_booking)
+        else:
+            days = self.cached_days(dates)
+        
+        # Applied on read so cached day maps never depend on the current time
+        advance_hours = getattr(self.service, 'minimum_notice_hours', 24)
+        earliest = timezone.now() + timedelta(hours=advance_hours)
+        
+        available_slots = []
+        for current_date in dates:
+            for slot_time, capacity, booked in days[current_date]:
+                if timezone.make_aware(datetime.combine(current_date, slot_time)) < earliest:
+                    continue
+                remaining = capacity - booked
+                if remaining >= participants:
+                    available_slots.append({
+                        'date': current_date,
+                        'time': slot_time,
+                        'capacity': capacity,
+                        'available_spots': remaining
+                    })
+        return available_slots
+    
+    def cached_days(self, dates):
+        """Day maps for dates, computing only the ones missing from the cache"""
+        slot_cache = AvailabilityCache(self.provider.id, self.service.id)
+        days, missing = slot_cache.get_many(dates)
+        if missing:
+            computed = self.compute_days(min(missing), max(missing))
+            slot_cache.set_many(missing, computed)
+            days.update({date: computed[date] for date in missing})
+        return days
+    
+    def compute_days(self, date_from, date_to, exclude_booking=None):
+        """{date: [(time, capacity, booked participants)]} for the range, in two queries"""
+        timelines = self._weekly_timelines()
+        booked, closed = self._booked_participants(date_from, date_to, exclude_booking)
+        days = {}
+        current_date = date_from
+        while current_date <= date_to:
+            days[current_date] = [
+                (slot_time, capacity, booked.get((current_date, slot_time), 0))
+                for slot_time, capacity in timelines[current_date.weekday()]
+                if (current_date, slot_time) not in closed
+            ]
+            current_date += timedelta(days=1)
+        return days
+    
+    def _weekly_timelines(self):
+        """Per weekday, the [(slot start, capacity)] inside operating hours; query one when not cached"""
+        schedule = WeeklySchedule.for_provider(self.provider)
+        return {
+            weekday: [
+                (to_time(minute), capacity)
+                for minute, capacity in schedule.timeline(weekday, self.service.id, self.slot_minutes)
+            ]
+            for weekday in range(7)
+        }
+    
+    def _booked_participants(self, date_from, date_to, exclude_booking=None):
+        """{(date, time): participants} already booked in the range, and the blocked or unavailable slots; query two"""
+        bookings = Booking.objects.filter(
+            provider=self.provider,
+            service=self.service,
+            booking_date__range=(date_from, date_to),
+            status__in=self.active_statuses
+        )
+        if exclude_booking:
+            bookings = bookings.exclude(id=exclude_booking.id)
+        booked_rows = bookings.values_list('booking_date', 'booking_time').annotate(
+            total=Sum('participants'), closed=Value(False)
+        ).order_by()
+        # Rows without a service close the slot for every service of the provider
+        closed_rows = BookingAvailability.objects.filter(
+            Q(service=self.service) | Q(service__isnull=True),
+            Q(is_blocked=True) | Q(is_available=False),
+            provider=self.provider,
+            date__range=(date_from, date_to),
+        ).values_list('date', 'start_time').annotate(total=Value(0), closed=Value(True)).order_by()
+        
+        booked, closed = {}, set()
+        for slot_date, slot_time, total, is_closed in booked_rows.union(closed_rows, all=True):
+            if is_closed:
+                closed.add((slot_date, slot_time))
+            else:
+                booked[(slot_date, slot_time)] = total
+        return booked, closed
+
 
 class BookingService:
     """Service class for booking operations"""
@@ -10,52 +326,30 @@ class BookingService:
         """Check if a booking slot is available"""
         
         # Check if date is in the past
-        if date < timezone.now().date():
+        if date < timezone.localdate():
             return False, "Cannot book appointments in the past"
         
         # Check if it's same day and time has passed
-        if date == timezone.now().date():
-            current_time = timezone.now().time()
+        if date == timezone.localdate():
+            current_time = timezone.localtime().time()
             if time <= current_time:
                 return False, "Cannot book appointments for past times today"
         
         # Check provider's general availability
+        schedule = WeeklySchedule.for_provider(provider)
         weekday = date.weekday()
-        operating_hours = provider.operating_hours.get(self._get_weekday_name(weekday), {})
-        if not operating_hours:
+        minute = to_minutes(time)
+        if schedule.hours[weekday] is None:
             return False, "Provider is not available on this day"
         
-        open_time = datetime.strptime(operating_hours.get('open', '09:00'), '%H:%M').time()
-        close_time = datetime.strptime(operating_hours.get('close', '17:00'), '%H:%M').time()
-        
-        if not (open_time <= time <= close_time):
+        if not schedule.is_open(weekday, minute):
+            open_time, close_time = map(to_time, schedule.hours[weekday])
             return False, f"Provider is not available at this time. Operating hours: {open_time} - {close_time}"
         
-        # Check service-specific availability
-        service_availability = provider.availability_schedule.filter(
-            service=service,
-            weekday=weekday,
-            start_time__lte=time,
-            end_time__gt=time,
-            is_active=True
-        ).first()
-        
-        if not service_availability:
-            # Check general availability if no service-specific
-            general_availability = provider.availability_schedule.filter(
-                service__isnull=True,
-                weekday=weekday,
-                start_time__lte=time,
-                end_time__gt=time,
-                is_active=True
-            ).first()
-            
-            if not general_availability:
-                return False, "No availability found for this time slot"
-            
-            max_capacity = general_availability.max_bookings
-        else:
-            max_capacity = service_availability.max_bookings
+        # Check service-specific availability, then general availability
+        max_capacity = schedule.capacity(weekday, minute, service.id)
+        if max_capacity is None:
+            return False, "No availability found for this time slot"
         
         # Check existing bookings for this slot
         existing_bookings_query = Booking.objects.filter(
@@ -79,7 +373,7 @@ class BookingService:
         
         # Check minimum advance notice
         advance_hours = getattr(service, 'minimum_notice_hours', 24)
-        booking_datetime = datetime.combine(date, time)
+        booking_datetime = timezone.make_aware(datetime.combine(date, time))
         min_booking_time = timezone.now() + timedelta(hours=advance_hours)
         
         if booking_datetime < min_booking_time:
@@ -90,6 +384,11 @@ class BookingService:
     def create_booking(self, user, provider, service, booking_data):
         """Create a new booking"""
         
+        # provider and service may come along in serializer validated_data
+        booking_data = {
+            key: value for key, value in booking_data.items() if key not in ('provider', 'service')
+        }
+        
         # Validate availability
         is_available, message = self.check_availability(
             provider=provider,
@@ -102,23 +401,31 @@ class BookingService:
         if not is_available:
             raise ValueError(message)
         
-        # Create booking
-        booking = Booking.objects.create(
-            user=user,
-            provider=provider,
-            service=service,
-            service_price=service.price,
-            total_amount=service.price * booking_data['participants'],
-            duration_minutes=service.duration_minutes,
-            **booking_data
-        )
-        
-        # Schedule notifications
-        self.schedule_booking_notifications(booking)
-        
-        # Update provider booking count
-        provider.total_bookings += 1
-        provider.save(update_fields=['total_bookings'])
+        with transaction.atomic():
+            # The capacity check above is advisory; this reservation is what prevents overbooking
+            self._reserve_slot(
+                provider, service, booking_data['booking_date'], booking_data['booking_time'],
+                booking_data['participants']
+            )
+            
+            # Create booking
+            booking = Booking.objects.create(
+                user=user,
+                provider=provider,
+                service=service,
+                service_price=service.price,
+                total_amount=service.price * booking_data['participants'],
+                duration_minutes=service.duration_minutes,
+                **booking_data
+            )
+            
+            AvailabilityCache.invalidate_dates(provider.id, service.id, [booking.booking_date])
+            
+            # Schedule notifications
+            self.schedule_booking_notifications(booking)
+            
+            # Atomic increment so concurrent bookings aren't lost
+            increment_bookings(provider.pk)
         
         return booking
     
@@ -128,29 +435,36 @@ class BookingService:
         if not booking.can_cancel:
             raise ValueError("This booking cannot be cancelled")
         
-        # Calculate refund
-        refund_amount, refund_percentage = self._calculate_refund(booking)
-        
-        # Create cancellation record
-        cancellation = BookingCancellation.objects.create(
-            booking=booking,
-            cancellation_type=cancellation_type,
-            reason=reason,
-            cancelled_by=cancelled_by,
-            refund_amount=refund_amount,
-            refund_percentage=refund_percentage,
-            refund_status='pending' if refund_amount > 0 else 'none'
-        )
-        
-        # Update booking status
-        booking.status = 'cancelled'
-        booking.cancelled_at = timezone.now()
-        booking.cancelled_by = cancelled_by
-        booking.cancellation_reason = reason
-        booking.save()
-        
-        # Schedule cancellation notification
-        self.send_cancellation_notification(booking)
+        with transaction.atomic():
+            # Lock the booking so concurrent cancellations release its spots only once
+            if Booking.objects.select_for_update().get(pk=booking.pk).status not in AvailabilityEngine.active_statuses:
+                raise ValueError("This booking cannot be cancelled")
+            
+            # Calculate refund
+            refund_amount, refund_percentage = self._calculate_refund(booking)
+            
+            # Create cancellation record
+            cancellation = BookingCancellation.objects.create(
+                booking=booking,
+                cancellation_type=cancellation_type,
+                reason=reason,
+                cancelled_by=cancelled_by,
+                refund_amount=refund_amount,
+                refund_percentage=refund_percentage,
+                refund_status='pending' if refund_amount > 0 else 'none'
+            )
+            
+            # Update booking status and return its spots
+            booking.status = 'cancelled'
+            booking.cancelled_at = timezone.now()
+            booking.cancelled_by = cancelled_by
+            booking.cancellation_reason = reason
+            booking.save()
+            self.release_slot(booking)
+            AvailabilityCache.invalidate_dates(booking.provider_id, booking.service_id, [booking.booking_date])
+            
+            # Schedule cancellation notification
+            self.send_cancellation_notification(booking)
         
         return cancellation
     
@@ -173,136 +487,103 @@ class BookingService:
         if not is_available:
             raise ValueError(message)
         
-        # Create new booking for the new slot
-        original_booking = booking
-        new_booking = Booking.objects.create(
-            user=booking.user,
-            provider=booking.provider,
-            service=booking.service,
-            booking_date=new_date,
-            booking_time=new_time,
-            duration_minutes=booking.duration_minutes,
-            participants=booking.participants,
-            service_price=booking.service_price,
-            total_amount=booking.total_amount,
-            customer_name=booking.customer_name,
-            customer_phone=booking.customer_phone,
-            customer_email=booking.customer_email,
-            special_requests=booking.special_requests,
-            payment_status=booking.payment_status,
-            original_booking=original_booking,
-            reschedule_count=booking.reschedule_count + 1
-        )
-        
-        # Update original booking
-        original_booking.status = 'rescheduled'
-        original_booking.save()
+        with transaction.atomic():
+            if Booking.objects.select_for_update().get(pk=booking.pk).status not in AvailabilityEngine.active_statuses:
+                raise ValueError("This booking cannot be rescheduled")
+            self._reserve_slot(booking.provider, booking.service, new_date, new_time, booking.participants)
+            
+            # Create new booking for the new slot
+            original_booking = booking
+            new_booking = Booking.objects.create(
+                user=booking.user,
+                provider=booking.provider,
+                service=booking.service,
+                booking_date=new_date,
+                booking_time=new_time,
+                duration_minutes=booking.duration_minutes,
+                participants=booking.participants,
+                service_price=booking.service_price,
+                total_amount=booking.total_amount,
+                customer_name=booking.customer_name,
+                customer_phone=booking.customer_phone,
+                customer_email=booking.customer_email,
+                special_requests=booking.special_requests,
+                payment_status=booking.payment_status,
+                original_booking=original_booking,
+                reschedule_count=booking.reschedule_count + 1
+            )
+            
+            # Update original booking and return its spots
+            original_booking.status = 'rescheduled'
+            original_booking.save()
+            self.release_slot(original_booking)
+            ReminderPlanner().cancel_pending([original_booking])
+            AvailabilityCache.invalidate_dates(
+                booking.provider_id, booking.service_id, [original_booking.booking_date, new_date]
+            )
         
-        # Schedule notifications for new booking
-        self.schedule_booking_notifications(new_booking)
+        # Tell the customer about the move and schedule the new slot's reminders
+        ReminderPlanner().schedule([new_booking], notice='reschedule')
         
         return new_booking
     
-    def get_available_slots(self, provider, service, date_from, date_to):
-        """Get available time slots for a provider and service"""
-        
-        available_slots = []
-        current_date = date_from
-        
-        while current_date <= date_to:
-            weekday = current_date.weekday()
-            
-            # Get provider's operating hours
-            operating_hours = provider.operating_hours.get(self._get_weekday_name(weekday), {})
-            if not operating_hours:
-                current_date += timedelta(days=1)
-                continue
-            
-            # Get availability schedule
-            schedule = provider.availability_schedule.filter(
-                Q(service=service) | Q(service__isnull=True),
-                weekday=weekday,
-                is_active=True
+    def _reserve_slot(self, provider, service, date, time, participants):
+        """Take spots from the slot's BookingAvailability counter with one conditional UPDATE.
+        
+        Only the counter row of this slot is contended, so bookings for other
+        slots never wait on each other. Must run inside a transaction.
+        """
+        slot = BookingAvailability.objects.filter(
+            provider=provider, service=service, date=date, start_time=time
+        ).first()
+        if slot is None:
+            capacity = WeeklySchedule.for_provider(provider).capacity(date.weekday(), to_minutes(time), service.id)
+            if capacity is None:
+                raise ValueError("No availability found for this time slot")
+            slot, _ = BookingAvailability.objects.get_or_create(
+                provider=provider, service=service, date=date, start_time=time,
+                defaults={
+                    'end_time': (datetime.combine(date, time) + timedelta(minutes=service.duration_minutes)).time(),
+                    'max_bookings': capacity,
+                    # Spots taken before this slot had a counter
+                    'current_bookings': Booking.objects.filter(
+                        provider=provider, service=service, booking_date=date, booking_time=time,
+                        status__in=AvailabilityEngine.active_statuses
+                    ).aggregate(total=Sum('participants'))['total'] or 0,
+                }
             )
-            
-            for slot in schedule:
-                # Generate time slots (e.g., every 30 minutes)
-                current_time = slot.start_time
-                end_time = slot.end_time
-                slot_duration = timedelta(minutes=service.duration_minutes)
-                
-                while current_time < end_time:
-                    # Check if this specific slot is available
-                    is_available, _ = self.check_availability(
-                        provider=provider,
-                        service=service,
-                        date=current_date,
-                        time=current_time,
-                        participants=1
-                    )
-                    
-                    if is_available:
-                        available_slots.append({
-                            'date': current_date,
-                            'time': current_time,
-                            'available_spots': slot.max_bookings
-                        })
-                    
-                    # Move to next slot (30-minute intervals)
-                    current_time = (datetime.combine(current_date, current_time) + timedelta(minutes=30)).time()
-            
-            current_date += timedelta(days=1)
         
-        return available_slots
+        reserved = BookingAvailability.objects.filter(
+            pk=slot.pk,
+            is_available=True,
+            is_blocked=False,
+            current_bookings__lte=F('max_bookings') - participants
+        ).update(current_bookings=F('current_bookings') + participants)
+        if not reserved:
+            raise ValueError("Not enough spots available for this time slot")
+    
+    def release_slot(self, booking):
+        """Return a booking's spots to its slot counter"""
+        BookingAvailability.objects.filter(
+            provider_id=booking.provider_id,
+            service_id=booking.service_id,
+            date=booking.booking_date,
+            start_time=booking.booking_time
+        ).update(current_bookings=Greatest(F('current_bookings') - booking.participants, 0))
+    
+    def get_available_slots(self, provider, service, date_from, date_to, participants=1):
+        """Get available time slots for a provider and service"""
+        return AvailabilityEngine(provider, service).slots(date_from, date_to, participants)
     
     def schedule_booking_notifications(self, booking):
         """Schedule notifications for a booking"""
-        
-        booking_datetime = booking.booking_datetime
-        
-        # Confirmation notification (immediate)
-        BookingReminder.objects.create(
-            booking=booking,
-            reminder_type='confirmation',
-            delivery_method='email',
-            scheduled_for=timezone.now(),
-            subject=f'Booking Confirmation - {booking.provider.business_name}',
-            message=f'Your booking for {booking.service.name} on {booking.booking_date} at {booking.booking_time} has been confirmed.'
-        )
-        
-        # 24-hour reminder
-        if booking_datetime > timezone.now() + timedelta(hours=24):
-            BookingReminder.objects.create(
-                booking=booking,
-                reminder_type='reminder_24h',
-                delivery_method='email',
-                scheduled_for=booking_datetime - timedelta(hours=24),
-                subject=f'Reminder: Your appointment tomorrow at {booking.provider.business_name}',
-                message=f'This is a reminder for your {booking.service.name} appointment tomorrow at {booking.booking_time}.'
-            )
-        
-        # 2-hour reminder
-        if booking_datetime > timezone.now() + timedelta(hours=2):
-            BookingReminder.objects.create(
-                booking=booking,
-                reminder_type='reminder_2h',
-                delivery_method='sms',
-                scheduled_for=booking_datetime - timedelta(hours=2),
-                subject=f'Reminder: Appointment in 2 hours',
-                message=f'Your {booking.service.name} appointment at {booking.provider.business_name} is in 2 hours.'
-            )
+        return ReminderPlanner().schedule([booking])
     
     def send_cancellation_notification(self, booking):
-        """Send cancellation notification"""
-        
-        BookingReminder.objects.create(
-            booking=booking,
-            reminder_type='cancellation',
-            delivery_method='email',
-            scheduled_for=timezone.now(),
-            subject=f'Booking Cancelled - {booking.provider.business_name}',
-            message=f'Your booking for {booking.service.name} on {booking.booking_date} has been cancelled.'
-        )
+        """Send cancellation notification and stop its pending reminders"""
+        planner = ReminderPlanner()
+        planner.cancel_pending([booking])
+        return planner.notify([booking], 'cancellation')
     
     def _calculate_refund(self, booking):
         """Calculate refund amount based on cancellation policy"""
@@ -320,92 +601,216 @@ class BookingService:
         
         refund_amount = (booking.total_amount * refund_percentage) / 100
         return refund_amount, refund_percentage
-    
-    def _get_weekday_name(self, weekday):
-        """Convert weekday number to name"""
-        weekdays = {
-            0: 'monday', 1: 'tuesday', 2: 'wednesday', 3: 'thursday',
-            4: 'friday', 5: 'saturday', 6: 'sunday'
-        }
-        return weekdays.get(weekday, 'monday')
 
 class PaymentService:
-    """Service class for payment processing"""
-    
-    def process_payment(self, booking, payment_method, payment_data=None):
-        """Process payment for a booking"""
-        
-        # Create payment record
-        payment = BookingPayment.objects.create(
-            booking=booking,
-            payment_method=payment_method,
-            amount=booking.total_amount,
-            status='pending'
-        )
-        
+    """Payment intents and the worker that settles them.
+
+    A payment request only records a pending BookingPayment, keyed by the
+    client's idempotency token. The worker claims due payments with
+    SELECT ... FOR UPDATE SKIP LOCKED and charges them through the gateway
+    client for their method; transient gateway errors are retried with
+    exponential backoff. Results from the worker and from gateway webhooks
+    both go through apply_result, which ignores payments already settled,
+    except that a gateway confirming the charge overrides a local failure.
+    """
+
+    in_flight_statuses = ['pending', 'processing']
+    final_statuses = ['completed', 'failed', 'cancelled', 'refunded']
+    # Payments left in 'processing' this long without a gateway transaction belong to a worker that died
+    claim_timeout = timedelta(minutes=10)
+
+    def __init__(self, batch_size=None, max_attempts=None, retry_base_seconds=None):
+        self.batch_size = batch_size or getattr(settings, 'PAYMENT_BATCH_SIZE', 20)
+        self.max_attempts = max_attempts or getattr(settings, 'PAYMENT_MAX_ATTEMPTS', 5)
+        self.retry_base_seconds = retry_base_seconds or getattr(settings, 'PAYMENT_RETRY_BASE_SECONDS', 30)
+
+    def create_intent(self, booking, payment_method, idempotency_key=None):
+        """Record a payment for the worker to charge; returns (payment, created)
+
+        Repeating a request with the same idempotency key, or while a payment
+        for the booking is still in flight, returns the existing payment.
+        """
+        if payment_method not in dict(BookingPayment.PAYMENT_METHOD_CHOICES):
+            raise ValueError('Unsupported payment method')
+        if payment_method != 'cash':
+            # Fail fast on methods without a configured gateway
+            get_gateway(payment_method)
+
+        with transaction.atomic():
+            # Serializes concurrent requests for the same booking
+            booking = Booking.objects.select_for_update().get(pk=booking.pk)
+
+            if idempotency_key:
+                existing = BookingPayment.objects.filter(
+                    user_id=booking.user_id, idempotency_key=idempotency_key
+                ).first()
+                if existing is not None:
+                    if existing.booking_id != booking.pk:
+                        raise ValueError('This idempotency key was used for another booking')
+                    return existing, False
+
+            if booking.payment_status == 'paid':
+                raise ValueError('This booking has already been paid')
+
+            in_flight = booking.payments.filter(status__in=self.in_flight_statuses).exclude(
+                payment_method='cash'
+            ).first()
+            if in_flight is not None:
+                if in_flight.payment_method != payment_method:
+                    raise ValueError('A payment for this booking is already in progress')
+                return in_flight, False
+
+            try:
+                with transaction.atomic():
+                    payment = BookingPayment.objects.create(
+                        booking=booking,
+                        user_id=booking.user_id,
+                        payment_method=payment_method,
+                        amount=booking.total_amount,
+                        status='pending',
+                        idempotency_key=idempotency_key or None,
+                        next_attempt_at=None if payment_method == 'cash' else timezone.now()
+                    )
+            except IntegrityError:
+                # The user just used the same key for another booking's request
+                raise ValueError('This idempotency key was used for another booking')
+
+            if payment_method == 'cash':
+                self._process_cash_payment(payment)
+        return payment, True
+
+    def run_pending(self, payments=None):
+        """Charge due payments batch by batch until none are left; returns (completed, failed)"""
+        self.requeue_stale()
+        completed = failed = 0
+        while True:
+            batch = self.claim(payments)
+            if not batch:
+                return completed, failed
+            for payment in batch:
+                payment = self.charge(payment)
+                completed += payment.status == 'completed'
+                failed += payment.status == 'failed'
+
+    def requeue_stale(self):
+        """Return payments claimed by a worker that died before reaching the gateway to the queue"""
+        return BookingPayment.objects.filter(
+            status='processing',
+            gateway_transaction_id='',
+            claimed_at__lt=timezone.now() - self.claim_timeout
+        ).update(status='pending', claimed_at=None, next_attempt_at=timezone.now())
+
+    def claim(self, payments=None):
+        """Mark up to batch_size due payments as 'processing' and return them"""
+        now = timezone.now()
+        queryset = payments if payments is not None else BookingPayment.objects.all()
+        # Cash payments have no next_attempt_at, so the worker never picks them up
+        queryset = queryset.filter(status='pending', next_attempt_at__lte=now)
+
+        with transaction.atomic():
+            ids = list(
+                queryset.order_by('next_attempt_at').select_for_update(skip_locked=True).values_list(
+                    'id', flat=True
+                )[:self.batch_size]
+            )
+            if not ids:
+                return []
+            BookingPayment.objects.filter(id__in=ids, status='pending').update(
+                status='processing', claimed_at=now, next_attempt_at=None
+            )
+
+        return list(BookingPayment.objects.filter(id__in=ids, status='processing', claimed_at=now).select_related(
+            'booking'
+        ))
+
+    def charge(self, payment):
+        """Send one claimed payment to its gateway and record the outcome"""
         try:
-            if payment_method == 'payhere':
-                return self._process_payhere_payment(payment, payment_data)
-            elif payment_method == 'frimi':
-                return self._process_frimi_payment(payment, payment_data)
-            elif payment_method == 'cash':
-                return self._process_cash_payment(payment)
-            else:
-                payment.status = 'failed'
-                payment.failed_reason = 'Unsupported payment method'
-                payment.save()
-                return payment, False
-                
+            result = get_gateway(payment.payment_method).charge(payment)
+        except GatewayError as e:
+            return self._retry(payment, str(e))
         except Exception as e:
+            logger.exception('Charging payment %s failed', payment.pk)
+            result = GatewayResult('failed', reason=str(e))
+        return self.apply_result(payment, result)
+
+    def apply_result(self, payment, result):
+        """Move a payment to the state the gateway reported; settled payments are left as they are"""
+        with transaction.atomic():
+            payment = BookingPayment.objects.select_for_update().select_related('booking').get(pk=payment.pk)
+            # A payment failed here (say when retries ran out on timeouts) may still have gone
+            # through; the gateway's confirmation of the charge wins
+            late_success = payment.status == 'failed' and result.status == 'completed'
+            if payment.status in self.final_statuses and not late_success:
+                return payment
+            if result.status == 'pending' and payment.status == 'pending':
+                # Not claimed yet, so leave it queued: the worker's charge repeats safely, while a
+                # recorded transaction id would keep requeue_stale away from it if that worker died
+                return payment
+
+            now = timezone.now()
+            payment.gateway_transaction_id = result.transaction_id or payment.gateway_transaction_id
+            payment.gateway_response = result.response
+            # Accepted without a transaction id leaves the webhook nothing to match; keeping the
+            # claim lets requeue_stale retry the payment once the claim times out
+            if result.status != 'pending' or payment.gateway_transaction_id:
+                payment.claimed_at = None
+            if result.status == 'completed':
+                payment.status = 'completed'
+                payment.processed_at = now
+                payment.failed_reason = ''
+                self._mark_booking_paid(payment.booking)
+            elif result.status == 'failed':
+                payment.status = 'failed'
+                payment.processed_at = now
+                payment.failed_reason = result.reason or 'Declined by the payment gateway'
+            else:
+                # Accepted but unconfirmed; the gateway's webhook settles it
+                payment.status = 'processing'
+            payment.save(update_fields=[
+                'status', 'gateway_transaction_id', 'gateway_response', 'claimed_at',
+                'processed_at', 'failed_reason', 'updated_at'
+            ])
+        return payment
+
+    def retry_delay(self, attempts):
+        """Exponential backoff, capped at an hour"""
+        return timedelta(seconds=min(self.retry_base_seconds * 2 ** (attempts - 1), 60 * 60))
+
+    def _retry(self, payment, reason):
+        payment.attempts += 1
+        payment.failed_reason = reason
+        payment.claimed_at = None
+        if payment.attempts >= self.max_attempts:
             payment.status = 'failed'
-            payment.failed_reason = str(e)
-            payment.save()
-            return payment, False
-    
-    def _process_payhere_payment(self, payment, payment_data):
-        """Process PayHere payment"""
-        
-        # This would integrate with PayHere API
-        # For now, simulate successful payment
-        payment.status = 'completed'
-        payment.gateway_transaction_id = f"PH_{timezone.now().strftime('%Y%m%d%H%M%S')}"
-        payment.processed_at = timezone.now()
-        payment.save()
-        
-        # Update booking payment status
-        booking = payment.booking
-        booking.payment_status = 'paid'
-        booking.status = 'confirmed'
-        booking.confirmed_at = timezone.now()
-        booking.save()
-        
-        return payment, True
-    
-    def _process_frimi_payment(self, payment, payment_data):
-        """Process Frimi payment"""
-        
-        # This would integrate with Frimi API
-        # For now, simulate successful payment
-        payment.status = 'completed'
-        payment.gateway_transaction_id = f"FR_{timezone.now().strftime('%Y%m%d%H%M%S')}"
-        payment.processed_at = timezone.now()
-        payment.save()
-        
-        # Update booking payment status
-        booking = payment.booking
+            payment.processed_at = timezone.now()
+        else:
+            payment.status = 'pending'
+            payment.next_attempt_at = timezone.now() + self.retry_delay(payment.attempts)
+        # Only touch the row while this worker still owns the claim
+        BookingPayment.objects.filter(pk=payment.pk, status='processing').update(
+            status=payment.status,
+            attempts=payment.attempts,
+            failed_reason=payment.failed_reason,
+            claimed_at=None,
+            next_attempt_at=payment.next_attempt_at,
+            processed_at=payment.processed_at,
+            updated_at=timezone.now()
+        )
+        return payment
+
+    def _mark_booking_paid(self, booking):
         booking.payment_status = 'paid'
-        booking.status = 'confirmed'
-        booking.confirmed_at = timezone.now()
-        booking.save()
-        
-        return payment, True
-    
+        update_fields = ['payment_status', 'updated_at']
+        if booking.status == 'pending':
+            booking.status = 'confirmed'
+            booking.confirmed_at = timezone.now()
+            update_fields += ['status', 'confirmed_at']
+        booking.save(update_fields=update_fields)
+
     def _process_cash_payment(self, payment):
         """Process cash payment (to be paid at venue)"""
         
-        payment.status = 'pending'
-        payment.save()
-        
         # Update booking status
         booking = payment.booking
         booking.payment_status = 'pending'
@@ -414,6 +819,3 @@ class PaymentService:
         booking.save()
         
         return payment, True
-
-
-
@@ -0,0 +1,30 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from providers.models import Provider
+from .models import BookingAvailability, ProviderAvailabilitySchedule
+from .services import AvailabilityCache
+
+
+@receiver(post_save, sender=BookingAvailability)
+@receiver(post_delete, sender=BookingAvailability)
+def invalidate_availability_date(sender, instance, **kwargs):
+    """Drop cached slots on the date of a changed availability row"""
+    if instance.service_id is None:
+        AvailabilityCache.invalidate_provider(instance.provider_id)
+    else:
+        AvailabilityCache.invalidate_dates(instance.provider_id, instance.service_id, [instance.date])
+
+
+@receiver(post_save, sender=ProviderAvailabilitySchedule)
+@receiver(post_delete, sender=ProviderAvailabilitySchedule)
+def invalidate_availability_schedule(sender, instance, **kwargs):
+    """Weekly schedule changes affect every date of the provider"""
+    AvailabilityCache.invalidate_provider(instance.provider_id)
+
+
+@receiver(post_save, sender=Provider)
+def invalidate_operating_hours(sender, instance, update_fields=None, **kwargs):
+    """Operating hours bound every slot; counter-only saves leave them alone"""
+    if update_fields is None or 'operating_hours' in update_fields:
+        instance.__dict__.pop('_weekly_schedule', None)
+        AvailabilityCache.invalidate_provider(instance.pk)
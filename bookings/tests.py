@@ -1,3 +1,618 @@
-from django.test import TestCase
+import hashlib
+import threading
+import time as time_module
+from datetime import time, timedelta
+from django.contrib import admin
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection, OperationalError
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from providers.counters import reconcile_counters
+from providers.models import FitnessCenter, FitnessMembership, Provider
+from providers.tests import User, create_provider
+from .admin import BookingAdmin
+from .lifecycle import LifecycleSweeper
+from .gateways import GatewayError, GatewayResult, LocmemGateway, PayHereGateway
+from .models import Booking, BookingAvailability, BookingPayment, BookingReminder, ProviderAvailabilitySchedule
+from .notifications import LocmemSMSBackend, ReminderDispatcher, ReminderPlanner
+from .services import (
+    AvailabilityCache, AvailabilityEngine, BookingService, PaymentService, WeeklySchedule, WEEKDAY_NAMES
+)
 
-# Create your tests here.
+WEEKLY_HOURS = {
+    day: {'open': '06:00', 'close': '21:00'}
+    for day in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+}
+
+
+class BookingTestMixin:
+    """A provider open every day with a general 09:00-12:00 schedule"""
+    
+    def setUp(self):
+        cache.clear()
+        self.provider = create_provider('studio', operating_hours=WEEKLY_HOURS)
+        self.service = self.provider.services.order_by('price').first()
+        for weekday in range(7):
+            ProviderAvailabilitySchedule.objects.create(
+                provider=self.provider, weekday=weekday,
+                start_time=time(9), end_time=time(12), max_bookings=3
+            )
+        self.day = timezone.localdate() + timedelta(days=3)
+    
+    def booking_data(self, slot_time, participants=1):
+        return {
+            'booking_date': self.day, 'booking_time': slot_time, 'participants': participants,
+            'customer_name': 'Customer', 'customer_phone': '0771234567', 'customer_email': 'customer@example.com',
+        }
+    
+    def book(self, slot_time, participants=1, day=None, status='confirmed'):
+        return Booking.objects.create(
+            user=self.provider.user, provider=self.provider, service=self.service,
+            booking_date=day or self.day, booking_time=slot_time, duration_minutes=60,
+            participants=participants, service_price=self.service.price,
+            total_amount=self.service.price * participants, status=status,
+            customer_name='Customer', customer_phone='0771234567', customer_email='customer@example.com'
+        )
+
+
+class AvailabilityEngineTests(BookingTestMixin, TestCase):
+    
+    def test_two_queries_for_any_range(self):
+        with CaptureQueriesContext(connection) as context:
+            slots = AvailabilityEngine(self.provider, self.service).slots(self.day, self.day + timedelta(days=13))
+        self.assertEqual(len(context), 2)
+        self.assertEqual(len(slots), 14 * 6)
+    
+    def test_blocked_and_unavailable_slots_are_not_offered(self):
+        for start, flags in [(time(9), {'is_blocked': True}), (time(9, 30), {'is_available': False})]:
+            BookingAvailability.objects.create(
+                provider=self.provider, service=self.service, date=self.day,
+                start_time=start, end_time=time(10, 30), max_bookings=3, **flags
+            )
+        BookingAvailability.objects.create(
+            provider=self.provider, date=self.day + timedelta(days=1),
+            start_time=time(10), end_time=time(11), is_blocked=True
+        )
+        engine = AvailabilityEngine(self.provider, self.service)
+        with CaptureQueriesContext(connection) as context:
+            slots = [(slot['date'], slot['time']) for slot in engine.slots(self.day, self.day + timedelta(days=1))]
+        self.assertEqual(len(context), 2)
+        self.assertNotIn((self.day, time(9)), slots)
+        self.assertNotIn((self.day, time(9, 30)), slots)
+        self.assertNotIn((self.day + timedelta(days=1), time(10)), slots)
+        self.assertEqual(len(slots), 2 * 6 - 3)
+    
+    def test_booked_participants_reduce_spots(self):
+        self.book(time(9), participants=2)
+        self.book(time(9, 30), participants=3)
+        self.book(time(10), participants=3, status='cancelled')
+        slots = {
+            slot['time']: slot['available_spots']
+            for slot in AvailabilityEngine(self.provider, self.service).slots(self.day, self.day)
+        }
+        self.assertEqual(slots[time(9)], 1)
+        self.assertNotIn(time(9, 30), slots)
+        self.assertEqual(slots[time(10)], 3)
+    
+    def test_service_schedule_takes_precedence(self):
+        ProviderAvailabilitySchedule.objects.create(
+            provider=self.provider, service=self.service, weekday=self.day.weekday(),
+            start_time=time(11), end_time=time(13), max_bookings=1
+        )
+        slots = {
+            slot['time']: slot['capacity']
+            for slot in AvailabilityEngine(self.provider, self.service).slots(self.day, self.day)
+        }
+        self.assertEqual(slots[time(10, 30)], 3)
+        self.assertEqual(slots[time(11)], 1)
+        self.assertEqual(slots[time(12, 30)], 1)
+    
+    def test_slots_endpoint(self):
+        response = self.client.get(reverse('bookings:available-slots'), {
+            'provider_id': self.provider.id, 'service_id': self.service.id,
+            'date_from': self.day.isoformat(), 'date_to': self.day.isoformat()
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['slots'][0], {
+            'date': self.day.isoformat(), 'time': '09:00:00', 'capacity': 3, 'available_spots': 3
+        })
+
+
+class AvailabilityCacheTests(BookingTestMixin, TestCase):
+    
+    def slots(self):
+        return {
+            slot['time']: slot['available_spots']
+            for slot in AvailabilityEngine(self.provider, self.service).slots(self.day, self.day)
+        }
+    
+    def test_repeat_lookups_hit_the_cache(self):
+        self.slots()
+        with CaptureQueriesContext(connection) as context:
+            self.slots()
+        self.assertEqual(len(context), 0)
+    
+    def test_cancel_invalidates_the_date(self):
+        booking = self.book(time(9), participants=3)
+        self.assertNotIn(time(9), self.slots())
+        with self.captureOnCommitCallbacks(execute=True):
+            BookingService().cancel_booking(booking, self.provider.user, 'Changed plans')
+        self.assertEqual(self.slots()[time(9)], 3)
+    
+    def test_schedule_change_invalidates_the_provider(self):
+        self.assertEqual(self.slots()[time(9)], 3)
+        ProviderAvailabilitySchedule.objects.filter(weekday=self.day.weekday()).update(max_bookings=5)
+        self.assertEqual(self.slots()[time(9)], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            ProviderAvailabilitySchedule.objects.filter(weekday=self.day.weekday()).first().save()
+        self.assertEqual(self.slots()[time(9)], 5)
+
+
+class CapacityReservationTests(BookingTestMixin, TransactionTestCase):
+    """Concurrent bookings never oversell a slot"""
+    
+    def test_threads_racing_for_one_slot(self):
+        outcomes = []
+        start = threading.Barrier(8)
+        
+        def attempt():
+            start.wait()
+            try:
+                for _ in range(100):
+                    try:
+                        BookingService().create_booking(
+                            self.provider.user, self.provider, self.service, self.booking_data(time(9))
+                        )
+                        outcomes.append('booked')
+                        return
+                    except OperationalError:
+                        # SQLite rejects concurrent writers instead of queueing them; retry like a client
+                        time_module.sleep(0.01)
+                    except ValueError as error:
+                        outcomes.append(error)
+                        return
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=attempt) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(outcomes), 8)
+        self.assertEqual(outcomes.count('booked'), 3)
+        self.assertEqual(Booking.objects.filter(booking_time=time(9)).count(), 3)
+        slot = BookingAvailability.objects.get(provider=self.provider, date=self.day, start_time=time(9))
+        self.assertEqual(slot.current_bookings, 3)
+        self.provider.refresh_from_db()
+        self.assertEqual(self.provider.total_bookings, 3)
+    
+    def test_cancel_and_reschedule_return_spots(self):
+        booking_service = BookingService()
+        first = booking_service.create_booking(
+            self.provider.user, self.provider, self.service, self.booking_data(time(9), participants=3)
+        )
+        with self.assertRaises(ValueError):
+            booking_service.create_booking(self.provider.user, self.provider, self.service, self.booking_data(time(9)))
+        
+        moved = booking_service.reschedule_booking(first, self.day + timedelta(days=1), time(9))
+        notices = set(moved.reminders.values_list('reminder_type', flat=True))
+        self.assertIn('reschedule', notices)
+        self.assertNotIn('confirmation', notices)
+        booking_service.create_booking(self.provider.user, self.provider, self.service, self.booking_data(time(9)))
+        counters = dict(BookingAvailability.objects.values_list('date', 'current_bookings'))
+        self.assertEqual(counters, {self.day: 1, self.day + timedelta(days=1): 3})
+        # A reschedule is not a new booking, and reconciliation agrees
+        self.provider.refresh_from_db()
+        self.assertEqual(self.provider.total_bookings, 2)
+        self.assertEqual(reconcile_counters(fix=False)['drift'], [])
+
+
+class FailingSMSBackend(LocmemSMSBackend):
+    
+    def send_messages(self, messages):
+        raise ConnectionError('Gateway unavailable')
+
+
+@override_settings(SMS_BACKEND='bookings.notifications.LocmemSMSBackend')
+class ReminderDispatcherTests(BookingTestMixin, TestCase):
+    
+    def setUp(self):
+        super().setUp()
+        LocmemSMSBackend.outbox = []
+        self.booking = self.book(time(9))
+        self.due = timezone.now() - timedelta(minutes=1)
+        for reminder_type, method in [('confirmation', 'email'), ('reminder_24h', 'email'), ('reminder_2h', 'sms')]:
+            BookingReminder.objects.create(
+                booking=self.booking, reminder_type=reminder_type, delivery_method=method,
+                scheduled_for=self.due, subject=reminder_type, message=f'{reminder_type} message'
+            )
+        BookingReminder.objects.create(
+            booking=self.booking, reminder_type='follow_up', delivery_method='email',
+            scheduled_for=timezone.now() + timedelta(days=1), subject='later', message='later'
+        )
+    
+    def test_due_reminders_are_sent_in_batches(self):
+        sent, failed = ReminderDispatcher(batch_size=2).run()
+        self.assertEqual((sent, failed), (3, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual([message.to for message in LocmemSMSBackend.outbox], [self.booking.customer_phone])
+        self.assertEqual(BookingReminder.objects.filter(status='sent', sent_at__isnull=False).count(), 3)
+        self.assertEqual(BookingReminder.objects.get(reminder_type='follow_up').status, 'pending')
+    
+    def test_reminders_without_a_recipient_fail_at_once(self):
+        Booking.objects.filter(pk=self.booking.pk).update(customer_email='')
+        self.assertEqual(ReminderDispatcher().run(), (1, 2))
+        self.assertEqual(mail.outbox, [])
+        reminder = BookingReminder.objects.get(reminder_type='confirmation')
+        self.assertEqual((reminder.status, reminder.attempts), ('failed', 1))
+        self.assertEqual(reminder.error_message, 'The booking has no customer email')
+        self.assertEqual(BookingReminder.objects.get(reminder_type='reminder_2h').status, 'sent')
+    
+    @override_settings(SMS_BACKEND='bookings.tests.FailingSMSBackend')
+    def test_failed_sends_back_off_then_fail(self):
+        dispatcher = ReminderDispatcher(max_attempts=2, retry_base_seconds=60)
+        self.assertEqual(dispatcher.run(), (2, 0))
+        reminder = BookingReminder.objects.get(reminder_type='reminder_2h')
+        self.assertEqual((reminder.status, reminder.attempts), ('pending', 1))
+        self.assertEqual(reminder.error_message, 'Gateway unavailable')
+        self.assertGreater(reminder.scheduled_for, timezone.now() + timedelta(seconds=50))
+        
+        BookingReminder.objects.filter(pk=reminder.pk).update(scheduled_for=self.due)
+        self.assertEqual(dispatcher.run(), (0, 1))
+        self.assertEqual(BookingReminder.objects.get(pk=reminder.pk).status, 'failed')
+    
+    def test_stale_claims_are_requeued(self):
+        BookingReminder.objects.filter(reminder_type='confirmation').update(
+            status='sending', claimed_at=timezone.now() - timedelta(hours=1)
+        )
+        BookingReminder.objects.filter(reminder_type='reminder_24h').update(
+            status='sending', claimed_at=timezone.now()
+        )
+        self.assertEqual(ReminderDispatcher().run(), (2, 0))
+        self.assertEqual(BookingReminder.objects.get(reminder_type='reminder_24h').status, 'sending')
+
+
+class ReminderPlannerTests(BookingTestMixin, TestCase):
+    
+    def test_bulk_schedule_in_one_insert(self):
+        bookings = [self.book(time(9)), self.book(time(10)), self.book(time(11))]
+        bookings = list(Booking.objects.filter(id__in=[booking.id for booking in bookings]).select_related(
+            'provider', 'service', 'user'
+        ))
+        with CaptureQueriesContext(connection) as context:
+            ReminderPlanner().schedule(bookings)
+        self.assertEqual(len(context), 1)
+        self.assertEqual(BookingReminder.objects.count(), 9)
+        reminder = BookingReminder.objects.get(booking=bookings[0], reminder_type='reminder_2h')
+        self.assertEqual(reminder.delivery_method, 'sms')
+        self.assertEqual(reminder.message, f'Your {self.service.name} appointment at studio is in 2 hours.')
+    
+    def test_skip_existing_and_language(self):
+        self.provider.user.language_preference = 'si'
+        self.provider.user.save()
+        self.provider.business_name_si = 'ස්ටූඩියෝ'
+        self.provider.save()
+        booking = self.book(time(9))
+        planner = ReminderPlanner()
+        planner.schedule([booking])
+        self.assertEqual(planner.schedule([booking], skip_existing=True), [])
+        confirmation = BookingReminder.objects.get(reminder_type='confirmation')
+        self.assertEqual(confirmation.subject, 'වෙන්කිරීම තහවුරු කිරීම - ස්ටූඩියෝ')
+    
+    def test_cancellation_stops_pending_reminders(self):
+        booking = self.book(time(9))
+        booking_service = BookingService()
+        booking_service.schedule_booking_notifications(booking)
+        booking_service.send_cancellation_notification(booking)
+        statuses = dict(BookingReminder.objects.values_list('reminder_type', 'status'))
+        self.assertEqual(statuses, {
+            'confirmation': 'pending', 'reminder_24h': 'cancelled', 'reminder_2h': 'cancelled',
+            'cancellation': 'pending'
+        })
+
+
+class WeeklyScheduleTests(BookingTestMixin, TestCase):
+    
+    def test_compiled_once_per_version(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            WeeklySchedule.for_provider(Provider.objects.get(pk=self.provider.pk))
+        provider = Provider.objects.get(pk=self.provider.pk)
+        with CaptureQueriesContext(connection) as context:
+            schedule = WeeklySchedule.for_provider(provider)
+            available, _ = BookingService().check_availability(provider, self.service, self.day, time(9, 30))
+        self.assertTrue(available)
+        # Only the booked-participants aggregate touches the database
+        self.assertEqual(len(context), 1)
+        self.assertEqual(schedule.hours[0], (6 * 60, 21 * 60))
+        self.assertEqual(schedule.capacity(self.day.weekday(), 9 * 60 + 30, self.service.id), 3)
+    
+    def test_cached_only_once_committed(self):
+        ProviderAvailabilitySchedule.objects.filter(provider=self.provider).update(max_bookings=9)
+        # The callbacks are dropped, as on a rollback
+        with self.captureOnCommitCallbacks():
+            schedule = WeeklySchedule.for_provider(Provider.objects.get(pk=self.provider.pk))
+        self.assertEqual(schedule.capacity(self.day.weekday(), 9 * 60, self.service.id), 9)
+        version = AvailabilityCache.provider_version(self.provider.pk)
+        self.assertIsNone(cache.get(f'bookings:schedule:{self.provider.pk}:{version}'))
+    
+    def test_operating_hours_change_recompiles(self):
+        hours = dict(WEEKLY_HOURS, **{WEEKDAY_NAMES[self.day.weekday()]: {'open': '10:00', 'close': '21:00'}})
+        self.provider.operating_hours = hours
+        with self.captureOnCommitCallbacks(execute=True):
+            self.provider.save()
+        provider = Provider.objects.get(pk=self.provider.pk)
+        available, message = BookingService().check_availability(provider, self.service, self.day, time(9, 30))
+        self.assertFalse(available)
+        self.assertEqual(message, 'Provider is not available at this time. Operating hours: 10:00:00 - 21:00:00')
+
+
+class ProviderBookingsViewTests(BookingTestMixin, TestCase):
+    
+    def test_calendar_grouped_by_day_and_slot(self):
+        self.book(time(9), participants=2)
+        self.book(time(9))
+        self.book(time(9), status='cancelled')
+        self.book(time(10), day=self.day + timedelta(days=1))
+        self.client.force_login(self.provider.user)
+        response = self.client.get(reverse('bookings:provider-bookings'), {
+            'date_from': self.day.isoformat(), 'date_to': (self.day + timedelta(days=1)).isoformat()
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['total_bookings'], 4)
+        self.assertEqual(data['total_participants'], 4)
+        first_slot = data['days'][0]['slots'][0]
+        self.assertEqual(
+            (first_slot['time'], first_slot['capacity'], first_slot['bookings_count'], first_slot['participants']),
+            ('09:00:00', 3, 3, 3)
+        )
+        self.assertEqual(len(first_slot['bookings']), 3)
+        self.assertEqual(data['days'][1]['participants'], 1)
+    
+    def test_conditional_requests(self):
+        booking = self.book(time(9))
+        self.client.force_login(self.provider.user)
+        url = reverse('bookings:provider-bookings')
+        params = {'date_from': self.day.isoformat()}
+        etag = self.client.get(url, params)['ETag']
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertLessEqual(len(context), 4)
+        
+        Booking.objects.filter(pk=booking.pk).update(status='confirmed', updated_at=timezone.now())
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+    
+    def test_admin_actions_change_the_etag(self):
+        booking = self.book(time(9))
+        self.client.force_login(self.provider.user)
+        url = reverse('bookings:provider-bookings')
+        params = {'date_from': self.day.isoformat()}
+        etag = self.client.get(url, params)['ETag']
+        
+        request = RequestFactory().post('/')
+        request._messages = CookieStorage(request)
+        BookingAdmin(Booking, admin.site).mark_completed(request, Booking.objects.filter(pk=booking.pk))
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, 'completed')
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(PAYMENT_GATEWAYS={'payhere': 'bookings.gateways.LocmemGateway'})
+class PaymentServiceTests(BookingTestMixin, TestCase):
+    
+    def setUp(self):
+        super().setUp()
+        LocmemGateway.charges = []
+        LocmemGateway.results = []
+        self.booking = self.book(time(9), status='pending')
+        self.client.force_login(self.provider.user)
+        self.url = reverse('bookings:process-payment', args=[self.booking.booking_id])
+    
+    def test_request_only_enqueues_an_idempotent_intent(self):
+        first = self.client.post(self.url, {'payment_method': 'payhere'}, HTTP_IDEMPOTENCY_KEY='order-1')
+        again = self.client.post(self.url, {'payment_method': 'payhere'}, HTTP_IDEMPOTENCY_KEY='order-1')
+        self.assertEqual((first.status_code, again.status_code), (202, 202))
+        self.assertEqual(first.data['payment']['id'], again.data['payment']['id'])
+        self.assertEqual(first.data['payment']['status'], 'pending')
+        self.assertEqual(BookingPayment.objects.count(), 1)
+        self.assertEqual(LocmemGateway.charges, [])
+        
+        status_response = self.client.get(first.data['status_url'])
+        self.assertEqual(status_response.data['payment']['status'], 'pending')
+    
+    def test_worker_retries_transient_errors(self):
+        payment, created = PaymentService().create_intent(self.booking, 'payhere', 'order-2')
+        LocmemGateway.results = [GatewayError('timed out')]
+        service = PaymentService(retry_base_seconds=60)
+        self.assertEqual(service.run_pending(), (0, 0))
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.attempts), ('pending', 1))
+        self.assertGreater(payment.next_attempt_at, timezone.now() + timedelta(seconds=50))
+        
+        BookingPayment.objects.filter(pk=payment.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(service.run_pending(), (1, 0))
+        self.assertEqual(LocmemGateway.charges, [f'GRACE-{payment.pk}'] * 2)
+        self.booking.refresh_from_db()
+        self.assertEqual((self.booking.payment_status, self.booking.status), ('paid', 'confirmed'))
+        
+        with self.assertRaisesMessage(ValueError, 'already been paid'):
+            PaymentService().create_intent(self.booking, 'payhere')
+    
+    def test_webhook_settles_pending_charges_once(self):
+        payment, created = PaymentService().create_intent(self.booking, 'payhere')
+        LocmemGateway.results = [GatewayResult('pending', 'LM-T1')]
+        self.assertEqual(PaymentService().run_pending(), (0, 0))
+        self.assertEqual(BookingPayment.objects.get(pk=payment.pk).status, 'processing')
+        
+        self.client.logout()
+        url = reverse('bookings:payment-webhook', args=['payhere'])
+        response = self.client.post(url, {'payment_id': payment.pk, 'status': 'completed'})
+        self.assertEqual(response.data, {'status': 'completed'})
+        response = self.client.post(url, {'payment_id': payment.pk, 'status': 'failed'})
+        self.assertEqual(response.data, {'status': 'completed'})
+        self.assertEqual(BookingPayment.objects.get(pk=payment.pk).gateway_transaction_id, 'LM-T1')
+    
+    def test_idempotency_keys_are_scoped_to_the_user(self):
+        payment, _ = PaymentService().create_intent(self.booking, 'payhere', 'order-1')
+        other = self.book(time(10), status='pending')
+        Booking.objects.filter(pk=other.pk).update(user=User.objects.create(username='other'))
+        other.refresh_from_db()
+        other_payment, created = PaymentService().create_intent(other, 'payhere', 'order-1')
+        self.assertTrue(created)
+        self.assertNotEqual(other_payment.pk, payment.pk)
+        
+        mine = self.book(time(11), status='pending')
+        with self.assertRaisesMessage(ValueError, 'another booking'):
+            PaymentService().create_intent(mine, 'payhere', 'order-1')
+    
+    def test_gateway_confirmation_overrides_exhausted_retries(self):
+        payment, _ = PaymentService().create_intent(self.booking, 'payhere')
+        LocmemGateway.results = [GatewayError('timed out')]
+        self.assertEqual(PaymentService(max_attempts=1).run_pending(), (0, 1))
+        self.assertEqual(BookingPayment.objects.get(pk=payment.pk).status, 'failed')
+        
+        payment = PaymentService().apply_result(payment, GatewayResult('completed', 'LM-T2'))
+        self.assertEqual((payment.status, payment.failed_reason), ('completed', ''))
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.payment_status, 'paid')
+    
+    def test_pending_webhook_leaves_unclaimed_payments_queued(self):
+        payment, _ = PaymentService().create_intent(self.booking, 'payhere')
+        payment = PaymentService().apply_result(payment, GatewayResult('pending', 'LM-T3'))
+        self.assertEqual((payment.status, payment.gateway_transaction_id), ('pending', ''))
+        self.assertEqual(PaymentService().run_pending(), (1, 0))
+        self.assertEqual(LocmemGateway.charges, [f'GRACE-{payment.pk}'])
+    
+    def test_pending_charges_without_a_transaction_are_requeued(self):
+        payment, _ = PaymentService().create_intent(self.booking, 'payhere')
+        LocmemGateway.results = [GatewayResult('pending')]
+        self.assertEqual(PaymentService().run_pending(), (0, 0))
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'processing')
+        self.assertIsNotNone(payment.claimed_at)
+        
+        BookingPayment.objects.filter(pk=payment.pk).update(
+            claimed_at=timezone.now() - PaymentService.claim_timeout - timedelta(minutes=1)
+        )
+        self.assertEqual(PaymentService().run_pending(), (1, 0))
+        self.assertEqual(LocmemGateway.charges, [f'GRACE-{payment.pk}'] * 2)
+    
+    def test_payhere_webhook_signature(self):
+        gateway = PayHereGateway(base_url='https://sandbox.payhere.lk', merchant_id='M1', merchant_secret='secret')
+        data = {
+            'merchant_id': 'M1', 'order_id': 'GRACE-7', 'payment_id': '320027',
+            'payhere_amount': '1000.00', 'payhere_currency': 'LKR', 'status_code': '2',
+        }
+        secret_hash = hashlib.md5(b'secret').hexdigest().upper()
+        data['md5sig'] = hashlib.md5(f'M1GRACE-71000.00LKR2{secret_hash}'.encode()).hexdigest().upper()
+        payment_id, result = gateway.parse_webhook(data, {})
+        self.assertEqual((payment_id, result.status, result.transaction_id), (7, 'completed', '320027'))
+        
+        with self.assertRaises(ValueError):
+            gateway.parse_webhook(dict(data, status_code='-2'), {})
+
+
+class LifecycleSweeperTests(BookingTestMixin, TestCase):
+    
+    def test_past_bookings_are_completed_or_no_show(self):
+        past = timezone.localdate() - timedelta(days=1)
+        attended = self.book(time(9), day=past)
+        unconfirmed = self.book(time(10), day=past, status='pending')
+        upcoming = self.book(time(9))
+        
+        counts = LifecycleSweeper(chunk_size=1).run()
+        self.assertEqual((counts['completed'], counts['no_show']), (1, 1))
+        statuses = dict(Booking.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[attended.id], 'completed')
+        self.assertEqual(statuses[unconfirmed.id], 'no_show')
+        self.assertEqual(statuses[upcoming.id], 'confirmed')
+        self.assertIsNone(cache.get('bookings:sweep:complete'))
+    
+    def test_stale_holds_release_capacity(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            held = BookingService().create_booking(
+                self.provider.user, self.provider, self.service, self.booking_data(time(9), participants=2)
+            )
+            paying = BookingService().create_booking(
+                self.provider.user, self.provider, self.service, self.booking_data(time(9))
+            )
+        BookingPayment.objects.create(booking=paying, payment_method='payhere', amount=paying.total_amount)
+        Booking.objects.update(created_at=timezone.now() - timedelta(days=2))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(LifecycleSweeper().expire_holds(), 1)
+        held.refresh_from_db()
+        self.assertEqual(held.status, 'cancelled')
+        slot = BookingAvailability.objects.get(provider=self.provider, date=self.day, start_time=time(9))
+        self.assertEqual(slot.current_bookings, 1)
+    
+    def test_ended_memberships_expire(self):
+        center = FitnessCenter.objects.create(provider=self.provider, fitness_type='gym')
+        membership = FitnessMembership.objects.create(
+            user=self.provider.user, fitness_center=center, membership_type='monthly',
+            start_date=timezone.localdate() - timedelta(days=40),
+            end_date=timezone.localdate() - timedelta(days=1), amount_paid=5000
+        )
+        self.assertEqual(LifecycleSweeper().expire_memberships(), 1)
+        membership.refresh_from_db()
+        self.assertEqual(membership.status, 'expired')
+        
+        self.client.force_login(self.provider.user)
+        response = self.client.get(reverse('providers:user-fitness-memberships'), {'status': 'expired'})
+        results = response.data['results'] if 'results' in response.data else response.data
+        self.assertEqual([item['id'] for item in results], [membership.id])
+        response = self.client.get(reverse('providers:user-fitness-memberships'), {'status': 'active'})
+        results = response.data['results'] if 'results' in response.data else response.data
+        self.assertEqual(len(results), 0)
+
+
+class BookingListPaginationTests(BookingTestMixin, TestCase):
+    
+    def test_cursor_pages_walk_every_booking_once(self):
+        created = timezone.now()
+        bookings = [self.book(time(9 + index % 3), day=self.day + timedelta(days=index)) for index in range(5)]
+        # Two bookings share created_at so the pk tie-breaker decides their order
+        for index, booking in enumerate(bookings):
+            Booking.objects.filter(pk=booking.pk).update(created_at=created - timedelta(minutes=index // 2 * 2))
+        expected = list(Booking.objects.order_by('-created_at', '-id').values_list('booking_id', flat=True))
+        self.client.force_login(self.provider.user)
+        
+        seen = []
+        url = reverse('bookings:user-bookings') + '?pagination=cursor&page_size=2'
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertNotIn('COUNT(', ' '.join(query['sql'] for query in context.captured_queries))
+            self.assertNotIn('count', response.data)
+            seen += [item['booking_id'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual([str(booking_id) for booking_id in expected], [str(booking_id) for booking_id in seen])
+        
+        self.assertEqual(self.client.get(reverse('bookings:user-bookings'), {'cursor': 'bogus'}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('bookings:user-bookings')).data['count'], 5)
+    
+    def test_sparse_fieldsets_narrow_the_query(self):
+        for index in range(3):
+            self.book(time(9 + index))
+        self.client.force_login(self.provider.user)
+        url = reverse('bookings:user-bookings')
+        
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'fields': 'booking_id,status,can_cancel', 'pagination': 'cursor'})
+        self.assertEqual(set(response.data['results'][0]), {'booking_id', 'status', 'can_cancel'})
+        booking_queries = [query['sql'] for query in context.captured_queries if 'bookings_booking' in query['sql']]
+        self.assertEqual(len(booking_queries), 1)
+        self.assertNotIn('customer_email', booking_queries[0])
+        self.assertNotIn('providers_provider', booking_queries[0])
+        
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'expand': 'service', 'pagination': 'cursor'})
+        self.assertEqual(response.data['results'][0]['service']['name'], self.service.name)
+        self.assertIn('provider_name', response.data['results'][0])
+        self.assertEqual(len([query for query in context.captured_queries if 'bookings_booking' in query['sql']]), 1)
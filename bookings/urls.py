@@ -9,12 +9,15 @@ urlpatterns = [
     path('create/', views.BookingCreateView.as_view(), name='create-booking'),
     path('<uuid:booking_id>/cancel/', views.cancel_booking, name='cancel-booking'),
     path('<uuid:booking_id>/payment/', views.process_payment, name='process-payment'),
+    path('payments/<int:payment_id>/', views.payment_status, name='payment-status'),
+    path('payments/webhook/<str:payment_method>/', views.payment_webhook, name='payment-webhook'),
     
     # Availability checking
     path('availability/check/', views.check_availability, name='check-availability'),
+    path('availability/slots/', views.available_slots, name='available-slots'),
     
-    # Provider endpoints (will be added later for full implementation)
-    # path('provider/', views.ProviderBookingsView.as_view(), name='provider-bookings'),
+    # Provider endpoints
+    path('provider/', views.ProviderBookingsView.as_view(), name='provider-bookings'),
     # path('<uuid:booking_id>/confirm/', views.confirm_booking, name='confirm-booking'),
 ]
 
@@ -1,21 +1,32 @@
 from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from django.db.models import Count, Max, Q, Sum
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from datetime import datetime, timedelta
+import hashlib
+from common.pagination import HybridPagination
+from common.views import SparseFieldsetViewMixin
 from .models import Booking, BookingAvailability, BookingCancellation, BookingPayment
 from .serializers import (
     BookingCreateSerializer, BookingListSerializer, BookingDetailSerializer,
     BookingUpdateSerializer, BookingCancellationSerializer,
     BookingPaymentSerializer, RescheduleBookingSerializer, ProviderBookingsSerializer
 )
-from .services import BookingService, PaymentService
+from .gateways import get_gateway
+from .services import BookingService, PaymentService, WeeklySchedule, to_minutes
 from providers.models import Provider, ProviderService
 
-class BookingPagination(PageNumberPagination):
+# Longest windows the slot and calendar endpoints compute in one request
+MAX_SLOT_RANGE_DAYS = 30
+MAX_CALENDAR_RANGE_DAYS = 62
+
+class BookingPagination(HybridPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
@@ -47,16 +58,107 @@ class BookingCreateView(generics.CreateAPIView):
         except ValueError as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-class UserBookingsView(generics.ListAPIView):
+class ProviderBookingsView(generics.GenericAPIView):
+    """Booking calendar for the signed-in provider, grouped by day and slot"""
+    serializer_class = ProviderBookingsSerializer
+    permission_classes = [IsAuthenticated]
+    
+    # Statuses that take up a slot on the calendar
+    occupying_statuses = ['pending', 'confirmed', 'completed']
+    
+    def get(self, request, *args, **kwargs):
+        provider = get_object_or_404(Provider, user=request.user)
+        try:
+            date_from = request.GET.get('date_from')
+            date_from = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else timezone.localdate()
+            date_to = request.GET.get('date_to')
+            date_to = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else date_from + timedelta(days=6)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if date_to < date_from or (date_to - date_from).days > MAX_CALENDAR_RANGE_DAYS:
+            return Response({'error': f'Date range must span at most {MAX_CALENDAR_RANGE_DAYS + 1} days'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        # Range scan on the (provider, booking_date) index
+        bookings = Booking.objects.filter(provider=provider, booking_date__range=(date_from, date_to))
+        status_filter = request.GET.get('status')
+        if status_filter:
+            bookings = bookings.filter(status=status_filter)
+        
+        # Cheap validator query first; unchanged calendars are answered with 304
+        state = bookings.aggregate(last_modified=Max('updated_at'), total=Count('id'))
+        etag = '"%s"' % hashlib.md5(
+            f"{provider.id}:{date_from}:{date_to}:{status_filter}:{state['total']}:{state['last_modified']}".encode()
+        ).hexdigest()
+        last_modified = state['last_modified'].timestamp() if state['last_modified'] else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+        
+        # Occupancy per slot, summed in SQL
+        occupancy = {
+            (row['booking_date'], row['booking_time'], row['service']): row
+            for row in bookings.values('booking_date', 'booking_time', 'service').annotate(
+                booking_count=Count('id'),
+                participant_count=Sum('participants', filter=Q(status__in=self.occupying_statuses))
+            ).order_by()
+        }
+        
+        schedule = WeeklySchedule.for_provider(provider)
+        days = {}
+        for booking in bookings.select_related('service').order_by('booking_date', 'booking_time', 'id'):
+            day = days.setdefault(booking.booking_date, {
+                'date': booking.booking_date, 'bookings': 0, 'participants': 0, 'slots': {}
+            })
+            slot_key = (booking.booking_date, booking.booking_time, booking.service_id)
+            slot = day['slots'].get(slot_key)
+            if slot is None:
+                totals = occupancy[slot_key]
+                slot = day['slots'][slot_key] = {
+                    'time': booking.booking_time,
+                    'service_id': booking.service_id,
+                    'service_name': booking.service.name,
+                    'capacity': schedule.capacity(
+                        booking.booking_date.weekday(), to_minutes(booking.booking_time), booking.service_id
+                    ),
+                    'bookings_count': totals['booking_count'],
+                    'participants': totals['participant_count'] or 0,
+                    'bookings': []
+                }
+                day['bookings'] += slot['bookings_count']
+                day['participants'] += slot['participants']
+            slot['bookings'].append(self.get_serializer(booking).data)
+        
+        calendar = [dict(day, slots=list(day['slots'].values())) for day in days.values()]
+        response = Response({
+            'date_from': date_from,
+            'date_to': date_to,
+            'total_bookings': state['total'],
+            'total_participants': sum(day['participants'] for day in calendar),
+            'days': calendar
+        })
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+class UserBookingsView(SparseFieldsetViewMixin, generics.ListAPIView):
     """List user's bookings"""
     serializer_class = BookingListSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = BookingPagination
     
     def get_queryset(self):
-        return Booking.objects.filter(user=self.request.user).select_related(
+        queryset = Booking.objects.filter(user=self.request.user).select_related(
             'provider', 'service'
         ).order_by('-created_at')
+        
+        # Statuses are kept current by the sweep_bookings job, so filter on the stored value
+        statuses = [value for value in self.request.query_params.get('status', '').split(',') if value]
+        if statuses:
+            queryset = queryset.filter(status__in=statuses)
+        return queryset
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -118,37 +220,90 @@ def check_availability(request):
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def process_payment(request, booking_id):
-    """Process payment for a booking"""
+@api_view(['GET'])
+def available_slots(request):
+    """List open slots with remaining spots for a provider service over a date range"""
     try:
-        booking = get_object_or_404(Booking, booking_id=booking_id, user=request.user)
+        provider_id = request.GET.get('provider_id')
+        service_id = request.GET.get('service_id')
+        if not all([provider_id, service_id]):
+            return Response({'error': 'Missing required parameters'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
         
-        if booking.payment_status == 'paid':
-            return Response({'error': 'This booking has already been paid'}, 
+        today = timezone.localdate()
+        date_from = request.GET.get('date_from')
+        date_from = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else today
+        date_to = request.GET.get('date_to')
+        date_to = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else date_from + timedelta(days=13)
+        participants = int(request.GET.get('participants', 1))
+        
+        if date_to < date_from or (date_to - date_from).days > MAX_SLOT_RANGE_DAYS:
+            return Response({'error': f'Date range must span at most {MAX_SLOT_RANGE_DAYS + 1} days'}, 
                           status=status.HTTP_400_BAD_REQUEST)
         
-        payment_method = request.data.get('payment_method', 'payhere')
+        provider = get_object_or_404(Provider, id=provider_id)
+        service = get_object_or_404(ProviderService, id=service_id, provider=provider)
         
-        payment_service = PaymentService()
-        payment, success = payment_service.process_payment(
-            booking=booking,
-            payment_method=payment_method,
-            payment_data=request.data
+        slots = BookingService().get_available_slots(
+            provider, service, max(date_from, today), date_to, participants
         )
         
-        if success:
-            serializer = BookingPaymentSerializer(payment)
-            return Response({
-                'message': 'Payment processed successfully',
-                'payment': serializer.data
-            })
-        else:
-            return Response({
-                'error': 'Payment processing failed',
-                'reason': payment.failed_reason
-            }, status=status.HTTP_400_BAD_REQUEST)
-            
-    except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({
+            'provider_id': provider.id,
+            'service_id': service.id,
+            'date_from': date_from,
+            'date_to': date_to,
+            'slots': slots
+        })
+        
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def process_payment(request, booking_id):
+    """Queue a payment for a booking; poll status_url or wait for the gateway webhook"""
+    booking = get_object_or_404(Booking, booking_id=booking_id, user=request.user)
+    payment_method = request.data.get('payment_method', 'payhere')
+    idempotency_key = request.headers.get('Idempotency-Key') or request.data.get('idempotency_key')
+    if idempotency_key and len(idempotency_key) > 64:
+        return Response({'error': 'idempotency_key must be at most 64 characters'},
+                      status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        payment, created = PaymentService().create_intent(booking, payment_method, idempotency_key)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    in_flight = payment.status in PaymentService.in_flight_statuses and payment.payment_method != 'cash'
+    return Response({
+        'message': 'Payment queued' if in_flight else 'Payment recorded',
+        'payment': BookingPaymentSerializer(payment).data,
+        'status_url': request.build_absolute_uri(reverse('bookings:payment-status', args=[payment.id]))
+    }, status=status.HTTP_202_ACCEPTED if in_flight else (status.HTTP_201_CREATED if created else status.HTTP_200_OK))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def payment_status(request, payment_id):
+    """Current state of one of the user's payments"""
+    payment = get_object_or_404(BookingPayment, id=payment_id, booking__user=request.user)
+    return Response({
+        'payment': BookingPaymentSerializer(payment).data,
+        'booking_payment_status': payment.booking.payment_status
+    })
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def payment_webhook(request, payment_method):
+    """Status callback from a payment gateway; authenticated by the gateway's signature"""
+    try:
+        gateway = get_gateway(payment_method)
+        data = request.data.dict() if hasattr(request.data, 'dict') else request.data
+        payment_id, result = gateway.parse_webhook(data, request.headers)
+    except (ValueError, KeyError, TypeError) as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    payment = get_object_or_404(BookingPayment, id=payment_id, payment_method=payment_method)
+    payment = PaymentService().apply_result(payment, result)
+    return Response({'status': payment.status})
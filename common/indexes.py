@@ -0,0 +1,111 @@
+import threading
+import unicodedata
+
+from django.core.cache import cache
+
+# Joiners shape Sinhala/Tamil conjuncts but users rarely type them
+ZERO_WIDTH_CHARACTERS = {'\u200c', '\u200d'}
+MAX_TERM_LENGTH = 100
+
+
+def tokenize(text):
+    """Split text into casefolded word tokens.
+
+    Letters, combining marks and digits form words, so Sinhala and Tamil vowel
+    signs stay attached to their consonants instead of splitting the word.
+    """
+    tokens = []
+    current = []
+    for char in unicodedata.normalize('NFC', text or '').casefold():
+        if char in ZERO_WIDTH_CHARACTERS:
+            continue
+        if unicodedata.category(char)[0] in 'LMN':
+            current.append(char)
+        elif current:
+            tokens.append(''.join(current)[:MAX_TERM_LENGTH])
+            current = []
+    if current:
+        tokens.append(''.join(current)[:MAX_TERM_LENGTH])
+    return tokens
+
+
+class VersionedIndex:
+    """Process-local index kept coherent across workers with a shared cache version.
+
+    Each worker holds its own copy of the index. Local changes are applied in
+    place and announce themselves by bumping the version in the cache; a worker
+    that sees a version it did not produce reloads before answering. Indexes
+    that set payload_key also publish their contents to the cache, so other
+    workers reload from there instead of the database.
+    """
+
+    version_key = None
+    payload_key = None
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = None
+
+    def load(self):
+        """Populate the index from the database"""
+        raise NotImplementedError
+
+    def export(self):
+        """Picklable snapshot of the index contents"""
+        raise NotImplementedError
+
+    def restore(self, payload):
+        """Replace the index contents with a snapshot from export()"""
+        raise NotImplementedError
+
+    def _publish(self, version):
+        if self.payload_key:
+            cache.set(self.payload_key, {'version': version, 'data': self.export()}, timeout=None)
+
+    def _reload(self, version):
+        payload = cache.get(self.payload_key) if self.payload_key else None
+        if payload is not None and payload['version'] == version:
+            self.restore(payload['data'])
+        else:
+            self.load()
+            self._publish(version)
+
+    def _shared_version(self):
+        cache.add(self.version_key, 0, timeout=None)
+        return cache.get(self.version_key)
+
+    def _bump_version(self):
+        cache.add(self.version_key, 0, timeout=None)
+        try:
+            return cache.incr(self.version_key)
+        except ValueError:
+            # Version evicted between add() and incr()
+            return None
+
+    def ensure_fresh(self):
+        """Reload the index if it is empty or another worker changed it"""
+        version = self._shared_version()
+        with self._lock:
+            if not self._loaded or version != self._version:
+                self._reload(version)
+                self._version = version
+                self._loaded = True
+
+    def changed(self):
+        """Record a local change so other workers reload their copy"""
+        previous = self._version
+        version = self._bump_version()
+        with self._lock:
+            if self._loaded and version is not None and previous is not None and version == previous + 1:
+                self._version = version
+                self._publish(version)
+            else:
+                # Someone else changed the index too; reload on next access
+                self._loaded = False
+
+    def invalidate(self):
+        """Force every worker, this one included, to reload"""
+        self._bump_version()
+        with self._lock:
+            self._loaded = False
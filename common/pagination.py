@@ -0,0 +1,141 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class HybridPagination(PageNumberPagination):
+    """Page-number pagination with a keyset mode selectable per request.
+
+    ?pagination=cursor (or any ?cursor=) pages by the queryset's ordering plus
+    the primary key as a tie-breaker. Each page filters past the last row of
+    the previous one, so there is no COUNT(*) and no OFFSET scan however deep
+    the client goes. Cursor pages only link forward and carry no count.
+
+    Keyset mode needs an ordering made of non-null model fields; anything else
+    falls back to page numbers.
+    """
+
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keyset = None
+        if not self.use_cursor(request):
+            return super().paginate_queryset(queryset, request, view)
+
+        self.keyset = self.keyset_ordering(queryset)
+        if self.keyset is None:
+            return super().paginate_queryset(queryset, request, view)
+
+        queryset = queryset.order_by(*[('-' if descending else '') + path for path, descending, _ in self.keyset])
+        token = request.query_params.get(self.cursor_query_param)
+        if token:
+            queryset = queryset.filter(self.after(self.decode_cursor(token)))
+
+        page_size = self.get_page_size(request)
+        rows = list(queryset[:page_size + 1])
+        self.next_values = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            self.next_values = [self.value_of(rows[-1], path) for path, _, _ in self.keyset]
+        return rows
+
+    def get_paginated_response(self, data):
+        if self.keyset is None:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if self.keyset is None:
+            return super().get_next_link()
+        if self.next_values is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_values))
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+
+    def keyset_ordering(self, queryset):
+        """[(path, descending, field)] for the queryset's ordering plus pk, or None if it can't be keyed"""
+        ordering = list(queryset.query.order_by)
+        if not ordering and queryset.query.default_ordering:
+            ordering = list(queryset.model._meta.ordering)
+        if not ordering or not all(isinstance(item, str) for item in ordering):
+            return None
+
+        pk_name = queryset.model._meta.pk.name
+        keyset = []
+        for item in ordering:
+            path = item.lstrip('-')
+            field = self.resolve_field(queryset.model, path)
+            if field is None or field.null:
+                return None
+            keyset.append((path, item.startswith('-'), field))
+            if path in ('pk', pk_name):
+                return keyset
+        keyset.append(('pk', keyset[0][1], queryset.model._meta.pk))
+        return keyset
+
+    def resolve_field(self, model, path):
+        parts = path.split('__')
+        try:
+            for part in parts[:-1]:
+                model = model._meta.get_field(part).related_model
+                if model is None:
+                    return None
+            if parts[-1] == 'pk':
+                return model._meta.pk
+            return model._meta.get_field(parts[-1])
+        except FieldDoesNotExist:
+            return None
+
+    def after(self, values):
+        """Rows that sort after values in keyset order"""
+        condition = Q()
+        equal = Q()
+        for (path, descending, _), value in zip(self.keyset, values):
+            condition |= equal & Q(**{f"{path}__{'lt' if descending else 'gt'}": value})
+            equal &= Q(**{path: value})
+        return condition
+
+    def value_of(self, obj, path):
+        for part in path.split('__'):
+            obj = getattr(obj, part)
+        return obj
+
+    def encode_cursor(self, values):
+        encoded = [
+            value.isoformat() if hasattr(value, 'isoformat') else str(value) if isinstance(value, Decimal) else value
+            for value in values
+        ]
+        return base64.urlsafe_b64encode(json.dumps(encoded).encode()).decode()
+
+    def decode_cursor(self, token):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(token.encode()))
+            if not isinstance(values, list) or len(values) != len(self.keyset):
+                raise ValueError
+            return [field.to_python(value) for (_, _, field), value in zip(self.keyset, values)]
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
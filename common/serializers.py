@@ -0,0 +1,112 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin for ?fields= and ?expand= on reads.
+
+    ?fields=id,quantity keeps only the listed top-level fields. Fields in
+    expandable_fields are swapped in (or added) only when named in ?expand=,
+    so heavy nested representations are opt-in. Only the outermost
+    serializer of a GET response reads the parameters.
+
+    field_dependencies names the model fields that method and property
+    fields read, so query_plan() can narrow the queryset to them.
+    """
+
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+    expandable_fields = {}
+    field_dependencies = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS or not self._is_outermost():
+            return fields
+
+        expand = self._query_list(request, self.expand_query_param) or set()
+        for name in expand & self.expandable_fields.keys():
+            serializer_class, kwargs = self.expandable_fields[name]
+            fields[name] = serializer_class(read_only=True, **kwargs)
+
+        requested = self._query_list(request, self.fields_query_param)
+        if requested:
+            # Expanding a field asks for it too
+            fields = {name: field for name, field in fields.items() if name in requested or name in expand}
+        return fields
+
+    def _is_outermost(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    @staticmethod
+    def _query_list(request, param):
+        if param not in request.query_params:
+            return None
+        return {name.strip() for name in request.query_params[param].split(',') if name.strip()}
+
+    def query_plan(self):
+        """(select_related paths, only() paths or None) for the fields this serializer will output"""
+        return query_plan(self, self.Meta.model)
+
+
+def query_plan(serializer, model, prefix=''):
+    """Relations to join and columns to load for a serializer's fields.
+
+    The column list is None when some field reads something the plan can't
+    see (a method or property field without field_dependencies), since
+    deferring it would cost a query per row.
+    """
+    related = set()
+    columns = {f'{prefix}{model._meta.pk.attname}'}
+    dependencies = getattr(serializer, 'field_dependencies', {})
+    complete = True
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in dependencies:
+            for path in dependencies[name]:
+                columns.add(prefix + path)
+                *relations, _ = path.split('__')
+                for depth in range(1, len(relations) + 1):
+                    related.add(prefix + '__'.join(relations[:depth]))
+            continue
+        if field.source == '*':
+            complete = False
+            continue
+
+        current, path = model, prefix
+        for position, attr in enumerate(field.source_attrs):
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                complete = False
+                break
+            last = position == len(field.source_attrs) - 1
+            if not model_field.concrete:
+                # Reverse relations and many-to-many need prefetching, not joins
+                complete = False
+                break
+            if model_field.is_relation and (not last or isinstance(field, serializers.BaseSerializer)):
+                columns.add(path + attr)
+                related.add(path + attr)
+                if not last:
+                    current, path = model_field.related_model, f'{path}{attr}__'
+                    continue
+                if isinstance(field, serializers.ListSerializer):
+                    complete = False
+                    break
+                nested_related, nested_columns = query_plan(field, model_field.related_model, f'{path}{attr}__')
+                related |= nested_related
+                if nested_columns is None:
+                    complete = False
+                else:
+                    columns |= nested_columns
+            else:
+                columns.add(path + (model_field.name if model_field.is_relation else attr))
+    return related, (columns if complete else None)
@@ -0,0 +1,43 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.permissions import SAFE_METHODS
+
+
+class SparseFieldsetViewMixin:
+    """Generic view mixin that loads only what a SparseFieldsetMixin serializer will output.
+
+    Reads join the relations the selected fields follow and defer every
+    column they don't read, so ?fields= and ?expand= shrink the query as well
+    as the payload.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        related, columns = self.get_serializer().query_plan()
+        if columns is not None:
+            # The plan covers every output field, so joins the view added for other fields go
+            queryset = queryset.select_related(None).only(*sorted(columns | self.ordering_columns(queryset, related)))
+        if related:
+            queryset = queryset.select_related(*sorted(related))
+        return queryset
+
+    def ordering_columns(self, queryset, related):
+        """Ordering fields stay loaded; keyset pagination reads them off the last row"""
+        ordering = queryset.query.order_by or (queryset.model._meta.ordering if queryset.query.default_ordering else [])
+        columns = set()
+        for item in ordering:
+            if not isinstance(item, str) or item.lstrip('-') in ('?', 'pk'):
+                continue
+            path = item.lstrip('-')
+            if '__' in path:
+                if path.rsplit('__', 1)[0] in related:
+                    columns.add(path)
+                continue
+            try:
+                queryset.model._meta.get_field(path)
+            except FieldDoesNotExist:
+                # Annotations are computed, not loaded
+                continue
+            columns.add(path)
+        return columns
@@ -0,0 +1,70 @@
+from django.core.exceptions import ValidationError
+
+# Characters scanners and datasets put between digit groups
+BARCODE_SEPARATORS = str.maketrans('', '', ' -')
+
+
+def check_digit(digits):
+    """GS1 check digit for a code without its last digit"""
+    total = sum(int(digit) * (3 if position % 2 == 0 else 1) for position, digit in enumerate(reversed(digits)))
+    return str(-total % 10)
+
+
+def normalize_barcode(value):
+    """Canonical form of an EAN-8, EAN-13, UPC-A, UPC-E or GTIN-14 code.
+
+    UPC-A, UPC-E and GTIN-14 codes with a zero indicator become the EAN-13
+    they encode, so every spelling of a product stores and looks up the same
+    key. EAN-8 codes stay 8 digits. Raises ValidationError for anything else.
+    """
+    digits = str(value).strip().translate(BARCODE_SEPARATORS)
+    if not digits.isascii() or not digits.isdigit():
+        raise ValidationError('Barcode must contain only digits')
+    if len(digits) == 14 and digits.startswith('0'):
+        digits = digits[1:]
+    elif len(digits) == 12:
+        digits = '0' + digits
+    if len(digits) not in (8, 13):
+        raise ValidationError('Barcode must be an EAN-8, EAN-13, UPC-A, UPC-E or GTIN-14 code')
+    if check_digit(digits[:-1]) == digits[-1]:
+        return digits
+    # UPC-E carries the check digit of its UPC-A expansion
+    expanded = expand_upc_e(digits)
+    if expanded is None:
+        raise ValidationError('Barcode check digit is wrong')
+    return expanded
+
+
+def expand_upc_e(code):
+    """UPC-A (as EAN-13) for an 8-digit UPC-E code, or None if it isn't one"""
+    if len(code) != 8 or code[0] not in '01':
+        return None
+    system, body, check = code[0], code[1:7], code[7]
+    last = body[5]
+    if last in '012':
+        manufacturer, product = body[:2] + last + '00', '00' + body[2:5]
+    elif last == '3':
+        manufacturer, product = body[:3] + '00', '000' + body[3:5]
+    elif last == '4':
+        manufacturer, product = body[:4] + '0', '0000' + body[4]
+    else:
+        manufacturer, product = body[:5], '0000' + last
+    upc_a = system + manufacturer + product
+    if check_digit(upc_a) != check:
+        return None
+    return '0' + upc_a + check
+
+
+def barcode_candidates(value):
+    """Stored barcodes a scanned value could be; some 8-digit codes are valid as both EAN-8 and UPC-E"""
+    code = normalize_barcode(value)
+    expanded = expand_upc_e(code)
+    return [code, expanded] if expanded else [code]
+
+
+def resolve_barcode(value):
+    """The food with this barcode, or None; one lookup on the unique barcode index"""
+    from .models import Food
+
+    candidates = barcode_candidates(value)
+    return Food.objects.select_related('category').filter(barcode__in=candidates).order_by('barcode').first()
@@ -0,0 +1,191 @@
+import csv
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from .barcodes import normalize_barcode
+from .matrix import NUTRIENT_FIELDS, nutrient_matrix
+from .models import Food, FoodCategory
+from .search import food_search_index
+from .summaries import resummarize_foods
+
+TEXT_FIELDS = ['name', 'name_si', 'name_ta', 'common_serving_size', 'serving_size_description', 'description']
+FLAG_FIELDS = ['is_vegetarian', 'is_vegan', 'is_gluten_free', 'is_dairy_free']
+
+# Open Food Facts style columns: source key -> (Food field, unit multiplier)
+FIELD_ALIASES = {
+    'code': ('barcode', None),
+    'product_name': ('name', None),
+    'energy-kcal_100g': ('calories', 1),
+    'proteins_100g': ('protein_g', 1),
+    'carbohydrates_100g': ('carbs_g', 1),
+    'fat_100g': ('fat_g', 1),
+    'fiber_100g': ('fiber_g', 1),
+    'sugars_100g': ('sugar_g', 1),
+    'sodium_100g': ('sodium_mg', 1000),
+    'vitamin-c_100g': ('vitamin_c_mg', 1000),
+    'calcium_100g': ('calcium_mg', 1000),
+    'iron_100g': ('iron_mg', 1000),
+}
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+MAX_REPORTED_ERRORS = 100
+
+
+def read_records(path):
+    """Stream dict records from a .csv or .jsonl file without loading it whole
+
+    A .jsonl line that isn't a JSON object is yielded as a ValueError in its
+    place, so the importer reports and skips it and carries on.
+    """
+    with open(path, encoding='utf-8-sig', newline='') as handle:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(handle)
+            return
+        for number, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield ValueError(f'Line {number} is not valid JSON')
+                continue
+            if not isinstance(record, dict):
+                yield ValueError(f'Line {number} is not a JSON object')
+                continue
+            yield record
+
+
+class FoodImporter:
+    """Upserts packaged foods keyed by barcode, one bulk statement per chunk.
+
+    Records are Food field names (or Open Food Facts column names) with a
+    barcode, a name and calories per 100g. A record whose barcode already
+    exists replaces that food's imported fields; the rest are created.
+    bulk_create skips save() and signals, so the in-memory food indexes are
+    reloaded after every chunk.
+    """
+
+    def __init__(self, chunk_size=1000, update_existing=True):
+        self.chunk_size = chunk_size
+        self.update_existing = update_existing
+        self.categories = {}
+        self.counts = {'created': 0, 'updated': 0, 'skipped': 0}
+        self.errors = []
+
+    def run(self, records):
+        """Import an iterable of records; returns the created/updated/skipped counts"""
+        records = iter(records)
+        position = 0
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk, position)
+            position += len(chunk)
+        return self.counts
+
+    def import_chunk(self, records, position=0):
+        foods = {}
+        for offset, record in enumerate(records, start=position + 1):
+            if isinstance(record, Exception):
+                self.skip(offset, record)
+                continue
+            try:
+                food = self.build_food(record)
+            except (ValidationError, ValueError, TypeError) as error:
+                self.skip(offset, error)
+                continue
+            # A later record for the same product wins
+            foods[food.barcode] = food
+
+        existing = set(Food.objects.filter(barcode__in=list(foods)).values_list('barcode', flat=True))
+        if not self.update_existing:
+            self.counts['skipped'] += len(existing)
+            foods = {barcode: food for barcode, food in foods.items() if barcode not in existing}
+        if not foods:
+            return
+
+        with transaction.atomic():
+            if self.update_existing:
+                # MySQL upserts on any unique key and refuses an explicit target
+                target = ['barcode'] if connection.features.supports_update_conflicts_with_target else None
+                Food.objects.bulk_create(
+                    foods.values(), update_conflicts=True, unique_fields=target,
+                    update_fields=self.update_fields
+                )
+            else:
+                Food.objects.bulk_create(foods.values())
+        # Committed foods can be scanned right away, so they must be loggable and searchable too
+        nutrient_matrix.invalidate()
+        food_search_index.invalidate()
+        updated = existing & foods.keys()
+        if updated:
+            resummarize_foods(Food.objects.filter(barcode__in=updated).values('pk'))
+        self.counts['updated'] += len(updated)
+        self.counts['created'] += len(foods.keys() - existing)
+
+    @property
+    def update_fields(self):
+        return TEXT_FIELDS + NUTRIENT_FIELDS + FLAG_FIELDS + [
+            'category', 'origin', 'serving_size_grams', 'allergen_info', 'updated_at'
+        ]
+
+    def build_food(self, record):
+        values = {}
+        for key, value in record.items():
+            if value in (None, ''):
+                continue
+            field, multiplier = FIELD_ALIASES.get(key, (key, None))
+            values.setdefault(field, float(value) * multiplier if multiplier else value)
+
+        if not values.get('barcode'):
+            raise ValueError('Missing barcode')
+        if not str(values.get('name', '')).strip():
+            raise ValueError('Missing name')
+        if 'calories' not in values:
+            raise ValueError('Missing calories')
+        if values.get('origin', 'processed') not in dict(Food.ORIGIN_CHOICES):
+            raise ValueError(f"Unknown origin {values['origin']!r}")
+
+        food = Food(
+            barcode=normalize_barcode(values['barcode']),
+            origin=values.get('origin', 'processed'),
+            category=self.category(values.get('category')),
+            allergen_info=self.allergens(values.get('allergen_info', [])),
+        )
+        for field in TEXT_FIELDS:
+            setattr(food, field, str(values.get(field, '')).strip()[:Food._meta.get_field(field).max_length])
+        for field in NUTRIENT_FIELDS:
+            amount = float(values.get(field, 0))
+            if amount < 0:
+                raise ValueError(f'{field} cannot be negative')
+            setattr(food, field, amount)
+        for field in FLAG_FIELDS:
+            if field in values:
+                setattr(food, field, str(values[field]).strip().lower() in TRUE_VALUES)
+        if 'serving_size_grams' in values:
+            food.serving_size_grams = max(int(float(values['serving_size_grams'])), 0)
+        return food
+
+    def category(self, name):
+        """Category by name, created once per import"""
+        name = str(name or '').strip()
+        if not name:
+            return None
+        if name not in self.categories:
+            self.categories[name], _ = FoodCategory.objects.get_or_create(name=name)
+        return self.categories[name]
+
+    def allergens(self, value):
+        if isinstance(value, str):
+            return [item.strip() for item in value.split(',') if item.strip()]
+        return list(value)
+
+    def skip(self, position, error):
+        self.counts['skipped'] += 1
+        if len(self.errors) >= MAX_REPORTED_ERRORS:
+            return
+        message = '; '.join(error.messages) if isinstance(error, ValidationError) else str(error)
+        self.errors.append((position, message))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from nutrition.importers import FoodImporter, read_records
+
+
+class Command(BaseCommand):
+    help = 'Import packaged foods from a .csv or .jsonl file, upserting by barcode in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV with a header row, or one JSON object per line')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Records per bulk statement')
+        parser.add_argument('--skip-existing', action='store_true',
+                            help='Leave foods whose barcode already exists untouched')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        importer = FoodImporter(chunk_size=options['chunk_size'], update_existing=not options['skip_existing'])
+        try:
+            counts = importer.run(read_records(options['path']))
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+
+        for position, message in importer.errors:
+            self.stderr.write(f'Record {position}: {message}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {counts['created']}, updated {counts['updated']}, skipped {counts['skipped']} foods"
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from nutrition.summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute daily nutrition summaries from meal logs, e.g. after bulk imports or food nutrient edits'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help='Only this user id (repeatable)')
+        parser.add_argument('--from', dest='date_from', help='First log date, YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', help='Last log date, YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        dates = {}
+        for option in ('date_from', 'date_to'):
+            if options[option]:
+                dates[option] = parse_date(options[option])
+                if dates[option] is None:
+                    raise CommandError(f'Invalid date: {options[option]}')
+        written = rebuild_summaries(users=options['users'], **dates)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} summary rows'))
@@ -0,0 +1,155 @@
+import numpy as np
+
+from common.indexes import VersionedIndex
+
+NUTRIENT_FIELDS = [
+    'calories', 'protein_g', 'carbs_g', 'fat_g', 'fiber_g', 'sugar_g',
+    'sodium_mg', 'vitamin_c_mg', 'calcium_mg', 'iron_mg',
+]
+COLUMNS = {field: column for column, field in enumerate(NUTRIENT_FIELDS)}
+
+
+class NutrientMatrix(VersionedIndex):
+    """Every food's nutrients as one float64 matrix, one row per food, columns in NUTRIENT_FIELDS order.
+
+    Meal math over many log entries or foods becomes a row gather plus one
+    dot product instead of per-field Python arithmetic. Rows are swapped in on
+    Food save/delete; other workers reload through the shared version.
+    """
+
+    version_key = 'nutrition:matrix:version'
+    payload_key = 'nutrition:matrix:payload'
+
+    def __init__(self):
+        super().__init__()
+        self._set(np.empty(0, dtype=np.int64), np.empty((0, len(NUTRIENT_FIELDS))), np.empty(0))
+
+    def _set(self, ids, values, serving_grams):
+        # One tuple so readers always see arrays from the same version
+        self._data = (ids, values, serving_grams, {food_id: row for row, food_id in enumerate(ids.tolist())})
+
+    def load(self):
+        from .models import Food
+
+        rows = list(Food.objects.order_by('id').values_list('id', 'serving_size_grams', *NUTRIENT_FIELDS))
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        serving_grams = np.array([row[1] or 0 for row in rows], dtype=np.float64)
+        values = np.array([row[2:] for row in rows], dtype=np.float64).reshape(len(rows), len(NUTRIENT_FIELDS))
+        self._set(ids, values, serving_grams)
+
+    def export(self):
+        ids, values, serving_grams, _ = self._data
+        return {'ids': ids, 'values': values, 'serving_grams': serving_grams}
+
+    def restore(self, payload):
+        self._set(payload['ids'], payload['values'], payload['serving_grams'])
+
+    def _put(self, rows):
+        """Insert or replace (food_id, serving_grams, *nutrients) rows in a new snapshot"""
+        with self._lock:
+            ids, values, serving_grams, positions = self._data
+            values = values.copy()
+            serving_grams = serving_grams.copy()
+            added = []
+            for food_id, grams, *vector in rows:
+                if food_id in positions:
+                    values[positions[food_id]] = vector
+                    serving_grams[positions[food_id]] = grams or 0
+                else:
+                    added.append((food_id, grams or 0, vector))
+            if added:
+                ids = np.append(ids, [food_id for food_id, _, _ in added]).astype(np.int64)
+                values = np.vstack([values, [vector for _, _, vector in added]])
+                serving_grams = np.append(serving_grams, [grams for _, grams, _ in added])
+            self._set(ids, values, serving_grams)
+            return self._data
+
+    def update(self, food):
+        """Swap a saved food's row into the current snapshot; a worker with nothing loaded just reloads later"""
+        with self._lock:
+            if self._loaded:
+                self._put([
+                    (food.pk, food.serving_size_grams, *[getattr(food, field) or 0 for field in NUTRIENT_FIELDS])
+                ])
+        self.changed()
+
+    def _load_missing(self, food_ids):
+        """Add rows this worker hasn't seen yet, e.g. foods written by bulk_create, which skips signals"""
+        from .models import Food
+
+        rows = Food.objects.filter(pk__in=food_ids).values_list('id', 'serving_size_grams', *NUTRIENT_FIELDS)
+        return self._put([tuple(value or 0 for value in row) for row in rows])
+
+    def remove(self, food_id):
+        with self._lock:
+            if self._loaded:
+                ids, values, serving_grams, rows = self._data
+                if food_id not in rows:
+                    return
+                keep = ids != food_id
+                self._set(ids[keep], values[keep], serving_grams[keep])
+        self.changed()
+
+    def _snapshot(self):
+        self.ensure_fresh()
+        return self._data
+
+    def _gather(self, food_ids):
+        """Row indexes for food_ids plus the snapshot they index; foods not in the database raise KeyError"""
+        data = self._snapshot()
+        missing = set(food_ids) - data[3].keys()
+        if missing:
+            data = self._load_missing(missing)
+        rows = data[3]
+        return np.fromiter((rows[food_id] for food_id in food_ids), dtype=np.int64, count=len(food_ids)), data
+
+    def per_entry(self, food_ids, quantities):
+        """(n, nutrients) matrix of each (food, quantity) entry's nutrients"""
+        indexes, (_, values, _, _) = self._gather(food_ids)
+        return values[indexes] * np.asarray(quantities, dtype=np.float64)[:, None]
+
+    def totals(self, food_ids, quantities):
+        """Summed nutrients of (food, quantity) entries as {field: value}"""
+        indexes, (_, values, _, _) = self._gather(food_ids)
+        if not len(indexes):
+            return dict.fromkeys(NUTRIENT_FIELDS, 0.0)
+        vector = np.asarray(quantities, dtype=np.float64) @ values[indexes]
+        return dict(zip(NUTRIENT_FIELDS, vector.tolist()))
+
+    def grouped_totals(self, keys, food_ids, quantities):
+        """Summed nutrients per key (e.g. date or meal type) as {key: {field: value}}"""
+        groups = list(dict.fromkeys(keys))
+        positions = {key: position for position, key in enumerate(groups)}
+        sums = np.zeros((len(groups), len(NUTRIENT_FIELDS)))
+        np.add.at(sums, np.array([positions[key] for key in keys], dtype=np.int64), self.per_entry(food_ids, quantities))
+        return {key: dict(zip(NUTRIENT_FIELDS, row.tolist())) for key, row in zip(groups, sums)}
+
+    def per_serving(self, food_ids):
+        """Nutrients per common serving (serving_size_grams / 100 of the stored values) as {food_id: {field: value}}"""
+        indexes, (_, values, serving_grams, _) = self._gather(food_ids)
+        scaled = values[indexes] * (serving_grams[indexes] / 100)[:, None]
+        return {food_id: dict(zip(NUTRIENT_FIELDS, row.tolist())) for food_id, row in zip(food_ids, scaled)}
+
+    def closest(self, target, limit=10, candidates=None):
+        """Foods whose nutrients are nearest target ({field: value}); returns [(food_id, distance)]
+
+        Each targeted nutrient contributes its difference relative to the
+        target, so a miss of 10 kcal weighs less than a miss of 10 g protein.
+        """
+        ids, values, _, rows = self._snapshot()
+        columns = [COLUMNS[field] for field in target]
+        goal = np.array([float(value) for value in target.values()])
+        if candidates is not None:
+            indexes = np.array([rows[food_id] for food_id in candidates if food_id in rows], dtype=np.int64)
+            ids, values = ids[indexes], values[indexes]
+        if not len(ids) or not columns:
+            return []
+        scale = np.where(goal > 0, goal, 1.0)
+        distance = (np.abs(values[:, columns] - goal) / scale).sum(axis=1)
+        limit = min(limit, len(ids))
+        nearest = np.argpartition(distance, limit - 1)[:limit]
+        nearest = nearest[np.argsort(distance[nearest], kind='stable')]
+        return [(int(ids[row]), float(distance[row])) for row in nearest]
+
+
+nutrient_matrix = NutrientMatrix()
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0003_foodcategory_localfooddatabase_alter_food_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='meallog',
+            index=models.Index(fields=['user', '-logged_at', '-id'], name='meallog_user_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+NUTRIENT_FIELDS = [
+    'calories', 'protein_g', 'carbs_g', 'fat_g', 'fiber_g', 'sugar_g',
+    'sodium_mg', 'vitamin_c_mg', 'calcium_mg', 'iron_mg',
+]
+
+
+def populate_summaries(apps, schema_editor):
+    # Frozen copy of nutrition.summaries.rebuild_summaries()
+    MealLog = apps.get_model('nutrition', 'MealLog')
+    DailyNutritionSummary = apps.get_model('nutrition', 'DailyNutritionSummary')
+    rows = MealLog.objects.order_by().values('user_id', 'log_date', 'meal_type').annotate(
+        meal_count=models.Count('id'),
+        **{field: models.Sum(models.F(f'food__{field}') * models.F('quantity')) for field in NUTRIENT_FIELDS}
+    )
+    DailyNutritionSummary.objects.bulk_create(
+        [DailyNutritionSummary(**row) for row in rows.iterator()], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0004_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyNutritionSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('log_date', models.DateField()),
+                ('meal_type', models.CharField(choices=[('breakfast', 'Breakfast'), ('lunch', 'Lunch'), ('dinner', 'Dinner'), ('snack', 'Snack')], max_length=20)),
+                ('meal_count', models.IntegerField(default=0)),
+                ('calories', models.FloatField(default=0)),
+                ('protein_g', models.FloatField(default=0)),
+                ('carbs_g', models.FloatField(default=0)),
+                ('fat_g', models.FloatField(default=0)),
+                ('fiber_g', models.FloatField(default=0)),
+                ('sugar_g', models.FloatField(default=0)),
+                ('sodium_mg', models.FloatField(default=0)),
+                ('vitamin_c_mg', models.FloatField(default=0)),
+                ('calcium_mg', models.FloatField(default=0)),
+                ('iron_mg', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily nutrition summaries',
+                'ordering': ['log_date', 'meal_type'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='meallog',
+            index=models.Index(fields=['user', 'log_date'], name='nutrition_m_user_id_2f7bc4_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailynutritionsummary',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nutrition_summaries', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailynutritionsummary',
+            unique_together={('user', 'log_date', 'meal_type')},
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:21
+
+import nutrition.barcodes
+from django.db import migrations, models
+
+BARCODE_SEPARATORS = str.maketrans('', '', ' -')
+
+
+def check_digit(digits):
+    total = sum(int(digit) * (3 if position % 2 == 0 else 1) for position, digit in enumerate(reversed(digits)))
+    return str(-total % 10)
+
+
+def expand_upc_e(code):
+    if len(code) != 8 or code[0] not in '01':
+        return None
+    system, body, check = code[0], code[1:7], code[7]
+    last = body[5]
+    if last in '012':
+        manufacturer, product = body[:2] + last + '00', '00' + body[2:5]
+    elif last == '3':
+        manufacturer, product = body[:3] + '00', '000' + body[3:5]
+    elif last == '4':
+        manufacturer, product = body[:4] + '0', '0000' + body[4]
+    else:
+        manufacturer, product = body[:5], '0000' + last
+    upc_a = system + manufacturer + product
+    if check_digit(upc_a) != check:
+        return None
+    return '0' + upc_a + check
+
+
+def normalize_barcode(value):
+    # Frozen copy of nutrition.barcodes.normalize_barcode(), returning None where it raises
+    digits = str(value).strip().translate(BARCODE_SEPARATORS)
+    if not digits.isascii() or not digits.isdigit():
+        return None
+    if len(digits) == 14 and digits.startswith('0'):
+        digits = digits[1:]
+    elif len(digits) == 12:
+        digits = '0' + digits
+    if len(digits) not in (8, 13):
+        return None
+    if check_digit(digits[:-1]) == digits[-1]:
+        return digits
+    return expand_upc_e(digits)
+
+
+def normalize_barcodes(apps, schema_editor):
+    # Unreadable codes could never be scanned, and only one food can keep a code
+    Food = apps.get_model('nutrition', 'Food')
+    seen = set()
+    for food in Food.objects.exclude(barcode__isnull=True).order_by('id').iterator():
+        barcode = normalize_barcode(food.barcode)
+        if barcode in seen:
+            barcode = None
+        if barcode is not None:
+            seen.add(barcode)
+        if barcode != food.barcode:
+            Food.objects.filter(pk=food.pk).update(barcode=barcode)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0005_daily_nutrition_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_barcodes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='food',
+            name='barcode',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True, validators=[nutrition.barcodes.normalize_barcode]),
+        ),
+    ]
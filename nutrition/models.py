@@ -1,6 +1,7 @@
 from django.conf import settings
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from .barcodes import normalize_barcode
 
 
 class FoodCategory(models.Model):
@@ -74,8 +75,9 @@ class Food(models.Model):
     health_benefits = models.TextField(blank=True)
     allergen_info = models.JSONField(default=list, help_text="List of allergens")
     
-    # Barcode Support
-    barcode = models.CharField(max_length=50, blank=True, null=True)
+    # Barcode Support, stored in normalize_barcode() form
+    barcode = models.CharField(max_length=50, unique=True, blank=True, null=True,
+                               validators=[normalize_barcode])
     
     # Metadata
     is_verified = models.BooleanField(default=False, help_text="Verified by nutritionist")
@@ -95,6 +97,11 @@ class Food(models.Model):
     def __str__(self) -> str:
         return self.name
     
+    def save(self, *args, **kwargs):
+        # Every spelling of a code shares the unique key; blank means no barcode
+        self.barcode = normalize_barcode(self.barcode) if self.barcode else None
+        super().save(*args, **kwargs)
+    
     def get_localized_name(self, language='en'):
         """Get food name in specified language"""
         if language == 'si' and self.name_si:
@@ -172,5 +179,38 @@ class MealLog(models.Model):
 
     class Meta:
         ordering = ['-logged_at']
+        indexes = [
+            models.Index(fields=['user', '-logged_at', '-id'], name='meallog_user_keyset_idx'),
+            models.Index(fields=['user', 'log_date']),
+        ]
 
 
+class DailyNutritionSummary(models.Model):
+    """Per-user, per-day, per-meal-type nutrient totals, maintained from MealLog by nutrition.summaries"""
+    
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='nutrition_summaries')
+    log_date = models.DateField()
+    meal_type = models.CharField(max_length=20, choices=MealLog.MEAL_TYPES)
+    meal_count = models.IntegerField(default=0)
+    
+    # Sums of food value * quantity, as the dashboards compute them
+    calories = models.FloatField(default=0)
+    protein_g = models.FloatField(default=0)
+    carbs_g = models.FloatField(default=0)
+    fat_g = models.FloatField(default=0)
+    fiber_g = models.FloatField(default=0)
+    sugar_g = models.FloatField(default=0)
+    sodium_mg = models.FloatField(default=0)
+    vitamin_c_mg = models.FloatField(default=0)
+    calcium_mg = models.FloatField(default=0)
+    iron_mg = models.FloatField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['user', 'log_date', 'meal_type']
+        ordering = ['log_date', 'meal_type']
+        verbose_name_plural = "Daily nutrition summaries"
+    
+    def __str__(self):
+        return f"{self.user} {self.log_date} {self.meal_type}"
@@ -0,0 +1,221 @@
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from math import log1p
+
+from django.db.models import Case, Count, IntegerField, Value, When
+from rest_framework import filters
+
+from common.indexes import VersionedIndex, tokenize
+
+MAX_QUERY_TERMS = 8
+
+
+def trigrams(term):
+    """Character trigrams of a term padded with spaces, so short words still yield some"""
+    padded = f' {term} '
+    return {padded[position:position + 3] for position in range(len(padded) - 2)}
+
+
+def regional_texts(regional_names):
+    """Names out of LocalFoodDatabase.regional_names, which is a dict or a list"""
+    if isinstance(regional_names, dict):
+        values = regional_names.values()
+    elif isinstance(regional_names, (list, tuple)):
+        values = regional_names
+    else:
+        return []
+    return [value for value in values if isinstance(value, str)]
+
+
+class FoodSearchIndex(VersionedIndex):
+    """In-memory fuzzy index over food names in English, Sinhala and Tamil.
+
+    Each food's name, traditional and regional names and category names are
+    tokenized into terms; terms are found by prefix (a bisect into the sorted
+    terms) or by shared character trigrams, so typos and partial words still
+    match. A food matches when every query word matches one of its terms, and
+    ranks by match quality weighted per source plus how often it is logged.
+    """
+
+    version_key = 'nutrition:food_search:version'
+    payload_key = 'nutrition:food_search:payload'
+    field_weights = {
+        'name': 3.0,
+        'local': 2.0,
+        'category': 1.0,
+    }
+    min_similarity = 0.4
+    prefix_similarity = 0.9
+    popularity_weight = 0.1
+    scan_limit = 500
+
+    def __init__(self):
+        super().__init__()
+        self._reset()
+
+    def _reset(self):
+        self._food_terms = {}
+        self._term_foods = defaultdict(dict)
+        self._grams = defaultdict(set)
+        self._terms = []
+        self._popularity = Counter()
+
+    def _food_texts(self, food, local_info=None, category=None):
+        texts = [(text, 'name') for text in (food.name, food.name_si, food.name_ta)]
+        if local_info is not None:
+            texts.append((local_info.traditional_name, 'local'))
+            texts.extend((text, 'local') for text in regional_texts(local_info.regional_names))
+        if category is not None:
+            texts.extend((text, 'category') for text in (category.name, category.name_si, category.name_ta))
+        return texts
+
+    def _make_terms(self, texts):
+        terms = {}
+        for text, field in texts:
+            for term in tokenize(text):
+                terms[term] = max(terms.get(term, 0), self.field_weights[field])
+        return terms
+
+    def _insert(self, food_id, terms):
+        self._discard(food_id)
+        for term, weight in terms.items():
+            if term not in self._term_foods:
+                insort(self._terms, term)
+                for gram in trigrams(term):
+                    self._grams[gram].add(term)
+            self._term_foods[term][food_id] = weight
+        if terms:
+            self._food_terms[food_id] = terms
+
+    def _discard(self, food_id):
+        for term in self._food_terms.pop(food_id, {}):
+            foods = self._term_foods[term]
+            foods.pop(food_id, None)
+            if foods:
+                continue
+            del self._term_foods[term]
+            del self._terms[bisect_left(self._terms, term)]
+            for gram in trigrams(term):
+                self._grams[gram].discard(term)
+                if not self._grams[gram]:
+                    del self._grams[gram]
+
+    def load(self):
+        from .models import Food, MealLog
+
+        self._reset()
+        foods = Food.objects.select_related('category', 'local_info')
+        for food in foods.iterator(chunk_size=500):
+            terms = self._make_terms(self._food_texts(food, getattr(food, 'local_info', None), food.category))
+            self._insert(food.pk, terms)
+        logged = MealLog.objects.order_by().values_list('food_id').annotate(count=Count('id'))
+        self._popularity = Counter(dict(logged))
+
+    def export(self):
+        return {'foods': self._food_terms, 'popularity': dict(self._popularity)}
+
+    def restore(self, payload):
+        self._reset()
+        for food_id, terms in payload['foods'].items():
+            self._insert(food_id, terms)
+        self._popularity = Counter(payload['popularity'])
+
+    def update(self, food):
+        """Re-index one food's names after it, its local info or its category was saved"""
+        from .models import LocalFoodDatabase
+
+        local_info = LocalFoodDatabase.objects.filter(food_id=food.pk).first()
+        terms = self._make_terms(self._food_texts(food, local_info, food.category))
+        with self._lock:
+            if self._loaded:
+                self._insert(food.pk, terms)
+        self.changed()
+
+    def remove(self, food_id):
+        with self._lock:
+            if self._loaded:
+                self._discard(food_id)
+                self._popularity.pop(food_id, None)
+        self.changed()
+
+    def record_use(self, food_id, count=1):
+        """Adjust a food's logged count in this worker only.
+
+        Popularity is only a ranking hint, so it is not worth a version bump
+        (and a reload everywhere) per meal log; other workers catch up on
+        their next reload.
+        """
+        with self._lock:
+            if self._loaded:
+                self._popularity[food_id] = max(self._popularity[food_id] + count, 0)
+
+    def _similar_terms(self, token):
+        """{term: similarity} for indexed terms close to one query token"""
+        similar = {}
+        position = bisect_left(self._terms, token)
+        end = min(position + self.scan_limit, len(self._terms))
+        while position < end and self._terms[position].startswith(token):
+            term = self._terms[position]
+            similar[term] = 1.0 if term == token else self.prefix_similarity
+            position += 1
+
+        grams = trigrams(token)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+        for term, count in shared.items():
+            # Dice coefficient over trigram sets
+            similarity = 2 * count / (len(grams) + len(trigrams(term)))
+            if similarity >= self.min_similarity and similarity > similar.get(term, 0):
+                similar[term] = similarity
+        return similar
+
+    def search(self, text, limit=50):
+        """Foods matching every word of text as [(food_id, rank)], best first"""
+        self.ensure_fresh()
+        tokens = list(dict.fromkeys(tokenize(text)))[:MAX_QUERY_TERMS]
+        if not tokens:
+            return []
+
+        with self._lock:
+            quality = None
+            for token in tokens:
+                best = {}
+                for term, similarity in self._similar_terms(token).items():
+                    for food_id, weight in self._term_foods[term].items():
+                        best[food_id] = max(best.get(food_id, 0), similarity * weight)
+                if quality is None:
+                    quality = best
+                else:
+                    quality = {food_id: score + best[food_id] for food_id, score in quality.items() if food_id in best}
+                if not quality:
+                    return []
+            ranked = [
+                (food_id, round(score + self.popularity_weight * log1p(self._popularity[food_id]), 4))
+                for food_id, score in quality.items()
+            ]
+        ranked.sort(key=lambda hit: (-hit[1], hit[0]))
+        return ranked[:limit]
+
+
+food_search_index = FoodSearchIndex()
+
+
+class FoodSearchFilter(filters.SearchFilter):
+    """?search= over the food search index, ordered by search rank unless ?ordering= is given"""
+
+    max_results = 200
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '')
+        if not text.strip():
+            return queryset
+        hits = food_search_index.search(text, limit=self.max_results)
+        if not hits:
+            return queryset.none()
+        return queryset.filter(pk__in=[food_id for food_id, _ in hits]).annotate(
+            search_position=Case(
+                *[When(pk=food_id, then=Value(position)) for position, (food_id, _) in enumerate(hits)],
+                output_field=IntegerField()
+            )
+        ).order_by('search_position')
@@ -1,15 +1,55 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+from common.serializers import SparseFieldsetMixin
+from .barcodes import normalize_barcode
 from .models import Food, MealLog
+from .search import food_search_index
+from .summaries import apply_new_logs
 
+MAX_BULK_MEAL_LOGS = 200
+
+
+class BarcodeField(serializers.CharField):
+    """Accepts any spelling of a barcode and hands on its normalized form"""
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        if not value:
+            return None
+        try:
+            return normalize_barcode(value)
+        except ValidationError as error:
+            raise serializers.ValidationError(error.messages)
+
+
+class FoodSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    barcode = BarcodeField(
+        required=False, allow_blank=True, allow_null=True, max_length=50,
+        validators=[UniqueValidator(queryset=Food.objects.all(), message='A food with this barcode already exists.')]
+    )
 
-class FoodSerializer(serializers.ModelSerializer):
     class Meta:
         model = Food
         fields = '__all__'
 
 
-class MealLogSerializer(serializers.ModelSerializer):
-    food_detail = FoodSerializer(source='food', read_only=True)
+class FoodSummarySerializer(serializers.ModelSerializer):
+    """The food columns a meal row needs; ?expand=food_detail gives the full food"""
+
+    class Meta:
+        model = Food
+        fields = [
+            'id', 'name', 'name_si', 'name_ta', 'serving_size_grams', 'common_serving_size',
+            'calories', 'protein_g', 'carbs_g', 'fat_g'
+        ]
+
+
+class MealLogSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    food_detail = FoodSummarySerializer(source='food', read_only=True)
+    expandable_fields = {'food_detail': (FoodSerializer, {'source': 'food'})}
 
     class Meta:
         model = MealLog
@@ -23,3 +63,59 @@ class MealLogSerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
+
+
+class BulkMealLogItemSerializer(serializers.Serializer):
+    """One food in a bulk meal log; meal_type and log_date fall back to the request's"""
+    food = serializers.IntegerField(min_value=1)
+    quantity = serializers.FloatField()
+    meal_type = serializers.ChoiceField(choices=MealLog.MEAL_TYPES, required=False)
+    log_date = serializers.DateField(required=False)
+
+    def validate_quantity(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('Quantity must be positive.')
+        return value
+
+
+class BulkMealLogSerializer(serializers.Serializer):
+    """A whole meal or day of meal logs, created together"""
+    meal_type = serializers.ChoiceField(choices=MealLog.MEAL_TYPES, required=False)
+    log_date = serializers.DateField(required=False)
+    items = BulkMealLogItemSerializer(many=True, allow_empty=False, max_length=MAX_BULK_MEAL_LOGS)
+
+    def validate(self, data):
+        log_date = data.get('log_date') or timezone.localdate()
+        errors = {}
+        for position, item in enumerate(data['items']):
+            item.setdefault('log_date', log_date)
+            if 'meal_type' not in item:
+                if 'meal_type' not in data:
+                    errors[position] = {'meal_type': 'Give meal_type on the item or the request.'}
+                    continue
+                item['meal_type'] = data['meal_type']
+
+        # Every referenced food in one query
+        food_ids = {item['food'] for item in data['items']}
+        known = set(Food.objects.filter(pk__in=food_ids).values_list('pk', flat=True))
+        for position, item in enumerate(data['items']):
+            if item['food'] not in known:
+                errors.setdefault(position, {})['food'] = f"Food {item['food']} does not exist."
+        if errors:
+            raise serializers.ValidationError({'items': errors})
+        return data
+
+    def create(self, validated_data):
+        user = self.context['request'].user
+        meal_logs = [
+            MealLog(user=user, food_id=item['food'], quantity=item['quantity'],
+                    meal_type=item['meal_type'], log_date=item['log_date'])
+            for item in validated_data['items']
+        ]
+        with transaction.atomic():
+            # bulk_create skips the MealLog signals, so summaries are updated per group here
+            meal_logs = MealLog.objects.bulk_create(meal_logs)
+            apply_new_logs(meal_logs)
+        for meal_log in meal_logs:
+            food_search_index.record_use(meal_log.food_id)
+        return meal_logs
@@ -0,0 +1,86 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .matrix import NUTRIENT_FIELDS, nutrient_matrix
+from .models import Food, FoodCategory, LocalFoodDatabase, MealLog
+from .search import food_search_index
+from .summaries import apply_log_change, log_state, resummarize_foods
+
+
+@receiver(pre_save, sender=MealLog)
+def remember_logged_state(sender, instance, **kwargs):
+    """Keep what the summary currently counts for this log, so post_save can move it"""
+    previous = None
+    if instance.pk is not None:
+        stored = MealLog.objects.filter(pk=instance.pk).first()
+        previous = log_state(stored) if stored is not None else None
+    instance._summary_state = previous
+
+
+@receiver(post_save, sender=MealLog)
+def summarize_meal_log(sender, instance, created, **kwargs):
+    """Fold a created or edited meal log into the daily nutrition summary"""
+    apply_log_change(getattr(instance, '_summary_state', None), log_state(instance))
+    instance._summary_state = log_state(instance)
+    if created:
+        transaction.on_commit(partial(food_search_index.record_use, instance.food_id))
+
+
+@receiver(post_delete, sender=MealLog)
+def unsummarize_meal_log(sender, instance, **kwargs):
+    """Take a deleted meal log out of the daily nutrition summary"""
+    apply_log_change(log_state(instance), None)
+    transaction.on_commit(partial(food_search_index.record_use, instance.food_id, -1))
+
+
+@receiver(pre_save, sender=Food)
+def remember_food_nutrients(sender, instance, **kwargs):
+    """Keep the stored nutrients, so post_save can tell whether summaries need recomputing"""
+    stored = None
+    if instance.pk is not None:
+        stored = Food.objects.filter(pk=instance.pk).values_list(*NUTRIENT_FIELDS).first()
+    instance._stored_nutrients = stored
+
+
+@receiver(post_save, sender=Food)
+def refresh_food_nutrients(sender, instance, created, **kwargs):
+    """Keep the in-memory nutrient matrix, search index and daily summaries in step with food changes.
+
+    The summaries commit or roll back with the food; the in-memory indexes
+    are shared with other workers, so they change only once it commits.
+    """
+    transaction.on_commit(partial(nutrient_matrix.update, instance))
+    transaction.on_commit(partial(food_search_index.update, instance))
+    stored = getattr(instance, '_stored_nutrients', None)
+    if not created and stored != tuple(getattr(instance, field) for field in NUTRIENT_FIELDS):
+        resummarize_foods([instance.pk])
+
+
+@receiver(post_delete, sender=Food)
+def drop_food_nutrients(sender, instance, **kwargs):
+    """Remove a deleted food from the nutrient matrix and search index"""
+    # The collector clears instance.pk once the delete is done
+    transaction.on_commit(partial(nutrient_matrix.remove, instance.pk))
+    transaction.on_commit(partial(food_search_index.remove, instance.pk))
+
+
+@receiver(post_save, sender=LocalFoodDatabase)
+@receiver(post_delete, sender=LocalFoodDatabase)
+def reindex_local_food(sender, instance, **kwargs):
+    """Traditional and regional names are searchable, so re-index their food once the change commits"""
+    transaction.on_commit(partial(reindex_food, instance.food_id))
+
+
+def reindex_food(food_id):
+    food = Food.objects.select_related('category').filter(pk=food_id).first()
+    if food is not None:
+        food_search_index.update(food)
+
+
+@receiver(post_save, sender=FoodCategory)
+@receiver(post_delete, sender=FoodCategory)
+def reindex_food_category(sender, instance, **kwargs):
+    """Category names are searchable on every food in the category; reload the whole index on commit"""
+    transaction.on_commit(food_search_index.invalidate)
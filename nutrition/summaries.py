@@ -0,0 +1,132 @@
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Count, Exists, OuterRef, Sum
+
+from .matrix import NUTRIENT_FIELDS
+from .models import DailyNutritionSummary, MealLog
+
+
+def log_state(meal_log):
+    """The MealLog fields its summary row depends on"""
+    return {
+        'user_id': meal_log.user_id,
+        'log_date': meal_log.log_date,
+        'meal_type': meal_log.meal_type,
+        'food_id': meal_log.food_id,
+        'quantity': meal_log.quantity,
+    }
+
+
+def summary_key(state):
+    return (state['user_id'], state['log_date'], state['meal_type'])
+
+
+def apply_log_change(before, after):
+    """Refresh the summary rows a meal log left and entered; states come from log_state(), None if absent"""
+    if before == after:
+        return
+    resummarize(summary_key(state) for state in (before, after) if state is not None)
+
+
+def apply_new_logs(meal_logs):
+    """Refresh the summary rows of newly bulk-created meal logs, once per row"""
+    resummarize((meal_log.user_id, meal_log.log_date, meal_log.meal_type) for meal_log in meal_logs)
+
+
+def resummarize(keys):
+    """Recompute (user_id, log_date, meal_type) summary rows from MealLog.
+
+    Totals always come from the logs' current foods, so taking a log out
+    never subtracts different nutrients than the row holds. The row is locked
+    first, so concurrent changes to one row recompute one after the other.
+    """
+    sums = {field: Sum(F(f'food__{field}') * F('quantity')) for field in NUTRIENT_FIELDS}
+    # Sorted so concurrent callers lock rows in the same order
+    for user_id, log_date, meal_type in sorted(set(keys)):
+        key = {'user_id': user_id, 'log_date': log_date, 'meal_type': meal_type}
+        with transaction.atomic():
+            row, _ = DailyNutritionSummary.objects.get_or_create(**key)
+            DailyNutritionSummary.objects.select_for_update().filter(pk=row.pk).first()
+            totals = MealLog.objects.filter(**key).aggregate(meal_count=Count('id'), **sums)
+            if not totals['meal_count']:
+                DailyNutritionSummary.objects.filter(pk=row.pk).delete()
+                continue
+            DailyNutritionSummary.objects.filter(pk=row.pk).update(
+                **{field: totals[field] or 0 for field in NUTRIENT_FIELDS}, meal_count=totals['meal_count']
+            )
+
+
+def resummarize_foods(food_ids):
+    """Recompute every summary row that includes one of these foods, after their nutrients changed"""
+    touched = MealLog.objects.filter(
+        food_id__in=food_ids, user_id=OuterRef('user_id'), log_date=OuterRef('log_date'),
+        meal_type=OuterRef('meal_type')
+    )
+    return _write_summaries(
+        MealLog.objects.filter(Exists(touched)),
+        DailyNutritionSummary.objects.filter(Exists(touched))
+    )
+
+
+def rebuild_summaries(users=None, date_from=None, date_to=None):
+    """Recompute summary rows from MealLog with one grouped query; returns the rows written
+
+    users is a queryset or list of user ids; omitted filters mean everything.
+    """
+    logs = MealLog.objects.all()
+    summaries = DailyNutritionSummary.objects.all()
+    if users is not None:
+        logs = logs.filter(user__in=users)
+        summaries = summaries.filter(user__in=users)
+    if date_from is not None:
+        logs = logs.filter(log_date__gte=date_from)
+        summaries = summaries.filter(log_date__gte=date_from)
+    if date_to is not None:
+        logs = logs.filter(log_date__lte=date_to)
+        summaries = summaries.filter(log_date__lte=date_to)
+
+    return _write_summaries(logs, summaries)
+
+
+def _write_summaries(logs, summaries):
+    """Replace summaries with rows grouped from logs, in one grouped query"""
+    rows = logs.order_by().values('user_id', 'log_date', 'meal_type').annotate(
+        meal_count=Count('id'),
+        **{field: Sum(F(f'food__{field}') * F('quantity')) for field in NUTRIENT_FIELDS}
+    )
+    with transaction.atomic():
+        summaries.delete()
+        created = DailyNutritionSummary.objects.bulk_create(
+            [DailyNutritionSummary(**row) for row in rows.iterator()], batch_size=1000
+        )
+    return len(created)
+
+
+def daily_totals(user, date_from, date_to):
+    """Per-day totals with a per-meal-type breakdown, from one indexed range lookup
+
+    Returns an OrderedDict of every date in the range to {'meal_count',
+    nutrient totals..., 'meals': {meal_type: {...}}}; days without logs are zero.
+    """
+    days = OrderedDict()
+    day = date_from
+    while day <= date_to:
+        days[day] = dict({field: 0 for field in NUTRIENT_FIELDS}, meal_count=0, meals={})
+        day += timedelta(days=1)
+
+    rows = DailyNutritionSummary.objects.filter(
+        user=user, log_date__gte=date_from, log_date__lte=date_to
+    ).values('log_date', 'meal_type', 'meal_count', *NUTRIENT_FIELDS)
+    for row in rows:
+        totals = days[row['log_date']]
+        if row['meal_count'] <= 0:
+            continue
+        totals['meal_count'] += row['meal_count']
+        for field in NUTRIENT_FIELDS:
+            totals[field] += row[field]
+        totals['meals'][row['meal_type']] = dict(
+            {field: row[field] for field in NUTRIENT_FIELDS}, meal_count=row['meal_count']
+        )
+    return days
@@ -0,0 +1,403 @@
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .barcodes import normalize_barcode
+from .importers import FoodImporter, read_records
+from .matrix import NutrientMatrix, nutrient_matrix
+from .models import DailyNutritionSummary, Food, FoodCategory, LocalFoodDatabase, MealLog
+from .search import food_search_index
+from .summaries import daily_totals, rebuild_summaries
+
+User = get_user_model()
+
+
+class DailyNutritionSummaryTests(TestCase):
+    """Summaries follow meal log changes and match a full rebuild"""
+    
+    def setUp(self):
+        nutrient_matrix.invalidate()
+        self.user = User.objects.create(username='eater')
+        self.rice = Food.objects.create(name='Rice', calories=130, protein_g=2.5, carbs_g=28, fat_g=0.3, iron_mg=0.2)
+        self.dhal = Food.objects.create(name='Dhal', calories=116, protein_g=9, carbs_g=20, fat_g=0.4, iron_mg=3.3)
+        self.day = date(2026, 3, 2)
+    
+    def log(self, food, quantity, meal_type='lunch', day=None):
+        return MealLog.objects.create(
+            user=self.user, food=food, quantity=quantity, meal_type=meal_type, log_date=day or self.day
+        )
+    
+    def snapshot(self):
+        return list(DailyNutritionSummary.objects.filter(meal_count__gt=0).order_by(
+            'log_date', 'meal_type'
+        ).values_list('log_date', 'meal_type', 'meal_count', 'calories', 'protein_g', 'iron_mg'))
+    
+    def test_changes_are_applied_incrementally(self):
+        self.log(self.rice, 2)
+        dhal = self.log(self.dhal, 1)
+        self.log(self.rice, 1, meal_type='dinner')
+        moved = self.log(self.dhal, 1, meal_type='breakfast')
+        moved.quantity = 0.5
+        moved.log_date = self.day + timedelta(days=1)
+        moved.save()
+        dhal.delete()
+        
+        totals = daily_totals(self.user, self.day, self.day + timedelta(days=1))
+        self.assertAlmostEqual(totals[self.day]['calories'], 390)
+        self.assertEqual(totals[self.day]['meal_count'], 2)
+        self.assertEqual(set(totals[self.day]['meals']), {'lunch', 'dinner'})
+        self.assertAlmostEqual(totals[self.day + timedelta(days=1)]['meals']['breakfast']['protein_g'], 4.5)
+        
+        incremental = self.snapshot()
+        rebuild_summaries()
+        self.assertEqual(len(incremental), len(self.snapshot()))
+        for kept, rebuilt in zip(incremental, self.snapshot()):
+            self.assertEqual(kept[:3], rebuilt[:3])
+            for value, expected in zip(kept[3:], rebuilt[3:]):
+                self.assertAlmostEqual(value, expected)
+    
+    def test_food_edits_never_leave_stale_rows(self):
+        meal = self.log(self.rice, 2)
+        self.rice.calories = 50
+        self.rice.save()
+        self.assertAlmostEqual(daily_totals(self.user, self.day, self.day)[self.day]['calories'], 100)
+        meal.delete()
+        self.assertFalse(DailyNutritionSummary.objects.exists())
+        
+        self.log(self.rice, 1)
+        FoodImporter().run([{'barcode': '96385074', 'name': 'Packet Rice', 'calories': 10}])
+        self.log(Food.objects.get(barcode='96385074'), 1)
+        # Upserts skip the Food signals; the importer recomputes rows itself
+        FoodImporter().run([{'barcode': '96385074', 'name': 'Packet Rice', 'calories': 20}])
+        self.assertAlmostEqual(daily_totals(self.user, self.day, self.day)[self.day]['calories'], 70)
+    
+    def test_summary_endpoint_reads_one_range(self):
+        self.log(self.rice, 1, day=self.day)
+        self.log(self.dhal, 2, day=self.day - timedelta(days=3))
+        self.client.force_login(self.user)
+        
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('nutrition-summary'), {'period': 'week', 'date': self.day})
+        summary_queries = [query for query in context.captured_queries if 'dailynutritionsummary' in query['sql']]
+        self.assertEqual(len(summary_queries), 1)
+        self.assertEqual(len(response.data['days']), 7)
+        self.assertAlmostEqual(response.data['totals']['calories'], 362)
+        self.assertAlmostEqual(response.data['daily_averages']['calories'], 181)
+        
+        response = self.client.get(reverse('nutrition-summary'), {'date_from': self.day, 'date_to': '2020-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class NutrientMatrixTests(TestCase):
+    """The in-memory matrix follows food changes and matches per-field arithmetic"""
+    
+    def setUp(self):
+        nutrient_matrix.invalidate()
+        self.user = User.objects.create(username='planner')
+        self.rice = Food.objects.create(name='Rice', calories=130, protein_g=2.5, carbs_g=28, fat_g=0.3)
+        self.chicken = Food.objects.create(name='Chicken', calories=165, protein_g=31, fat_g=3.6, serving_size_grams=150)
+        self.dhal = Food.objects.create(name='Dhal', calories=116, protein_g=9, carbs_g=20, fat_g=0.4)
+    
+    def test_totals_match_per_field_arithmetic(self):
+        entries = [(self.rice, 2), (self.chicken, 0.5), (self.dhal, 1.5)]
+        totals = nutrient_matrix.totals([food.pk for food, _ in entries], [quantity for _, quantity in entries])
+        for field in ('calories', 'protein_g', 'carbs_g', 'fat_g'):
+            self.assertAlmostEqual(totals[field], sum(getattr(food, field) * quantity for food, quantity in entries))
+        
+        grouped = nutrient_matrix.grouped_totals(
+            ['lunch', 'dinner', 'lunch'], [self.rice.pk, self.chicken.pk, self.dhal.pk], [1, 1, 1]
+        )
+        self.assertAlmostEqual(grouped['lunch']['calories'], 246)
+        self.assertAlmostEqual(grouped['dinner']['protein_g'], 31)
+        self.assertAlmostEqual(
+            nutrient_matrix.per_serving([self.chicken.pk])[self.chicken.pk]['protein_g'],
+            self.chicken.get_nutrition_per_serving()['protein_g']
+        )
+    
+    def test_food_changes_reach_the_matrix(self):
+        nutrient_matrix.ensure_fresh()
+        self.rice.calories = 200
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rice.save()
+        self.assertAlmostEqual(nutrient_matrix.totals([self.rice.pk], [1])['calories'], 200)
+        
+        dhal_id = self.dhal.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dhal.delete()
+        with self.assertRaises(KeyError):
+            nutrient_matrix.totals([dhal_id], [1])
+        
+        # Foods written without signals are loaded on first use instead of failing
+        nutrient_matrix.ensure_fresh()
+        bulk_food, = Food.objects.bulk_create([Food(name='Bulk', calories=75, serving_size_grams=50)])
+        MealLog.objects.create(user=self.user, food=bulk_food, quantity=2, meal_type='lunch', log_date=date(2026, 3, 2))
+        self.assertAlmostEqual(DailyNutritionSummary.objects.get(user=self.user).calories, 150)
+        
+        # Another worker's change is picked up through the shared version
+        Food.objects.filter(pk=self.rice.pk).update(calories=90)
+        nutrient_matrix.invalidate()
+        self.assertAlmostEqual(nutrient_matrix.totals([self.rice.pk], [1])['calories'], 90)
+    
+    def test_rolled_back_changes_never_reach_the_matrix(self):
+        nutrient_matrix.ensure_fresh()
+        self.rice.calories = 999
+        # The callbacks are dropped, as on a rollback
+        with self.captureOnCommitCallbacks():
+            self.rice.save()
+        Food.objects.filter(pk=self.rice.pk).update(calories=130)
+        self.assertAlmostEqual(nutrient_matrix.totals([self.rice.pk], [1])['calories'], 130)
+        self.assertAlmostEqual(NutrientMatrix().totals([self.rice.pk], [1])['calories'], 130)
+    
+    def test_updates_patch_the_loaded_snapshot(self):
+        nutrient_matrix.ensure_fresh()
+        self.rice.calories = 200
+        with CaptureQueriesContext(connection) as context:
+            nutrient_matrix.update(self.rice)
+        self.assertEqual(len(context), 0)
+        self.assertAlmostEqual(nutrient_matrix.totals([self.rice.pk], [1])['calories'], 200)
+    
+    def test_match_endpoint_ranks_by_macro_distance(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('food-matches'), {'calories': 160, 'protein_g': 30, 'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([food['name'] for food in response.data['results']], ['Chicken', 'Dhal'])
+        
+        response = self.client.get(reverse('food-matches'), {'calories': 'lots'})
+        self.assertEqual(response.status_code, 400)
+
+
+class FoodSearchTests(TestCase):
+    """Food search matches fuzzy, multilingual and regional names and ranks by use"""
+    
+    def setUp(self):
+        food_search_index.invalidate()
+        self.user = User.objects.create(username='searcher')
+        grains = FoodCategory.objects.create(name='Grains', name_si='ධාන්‍ය')
+        self.rice = Food.objects.create(name='Red Rice', name_si='රතු බත්', calories=130, category=grains)
+        self.kiribath = Food.objects.create(name='Kiribath', name_ta='பால் சோறு', calories=180, category=grains)
+        self.rice_flour = Food.objects.create(name='Rice Flour', calories=360, category=grains)
+        self.pol_sambol = Food.objects.create(name='Pol Sambol', calories=150)
+        LocalFoodDatabase.objects.create(
+            food=self.kiribath, traditional_name='Milk Rice', regional_names={'north': 'Paal Soru'}
+        )
+    
+    def names(self, text):
+        food_ids = [food_id for food_id, _ in food_search_index.search(text)]
+        foods = Food.objects.in_bulk(food_ids)
+        return [foods[food_id].name for food_id in food_ids]
+    
+    def test_matches_typos_prefixes_and_other_names(self):
+        self.assertEqual(self.names('sambal'), ['Pol Sambol'])
+        self.assertEqual(self.names('kiri'), ['Kiribath'])
+        self.assertEqual(self.names('බත්'), ['Red Rice'])
+        self.assertEqual(self.names('பால்'), ['Kiribath'])
+        self.assertEqual(self.names('paal soru'), ['Kiribath'])
+        self.assertEqual(set(self.names('grains')), {'Red Rice', 'Kiribath', 'Rice Flour'})
+        self.assertEqual(self.names('rice flour'), ['Rice Flour'])
+        self.assertEqual(self.names('xyzzy'), [])
+    
+    def test_ranks_by_quality_then_popularity(self):
+        self.assertEqual(self.names('rice')[:2], ['Red Rice', 'Rice Flour'])
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                MealLog.objects.create(user=self.user, food=self.rice_flour, quantity=1, meal_type='lunch',
+                                       log_date=date(2026, 3, 2))
+        self.assertEqual(self.names('rice')[:2], ['Rice Flour', 'Red Rice'])
+        # Milk Rice is a traditional name, weighted below the food's own name
+        self.assertEqual(self.names('rice')[-1], 'Kiribath')
+    
+    def test_index_follows_food_changes(self):
+        self.pol_sambol.name = 'Coconut Sambol'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pol_sambol.save()
+        self.assertEqual(self.names('coconut'), ['Coconut Sambol'])
+        self.assertEqual(self.names('pol'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kiribath.delete()
+        self.assertEqual(self.names('kiribath'), [])
+    
+    def test_rolled_back_changes_never_reach_the_index(self):
+        self.assertEqual(self.names('sambol'), ['Pol Sambol'])
+        # The callbacks are dropped, as on a rollback
+        with self.captureOnCommitCallbacks():
+            self.pol_sambol.name = 'Zebra'
+            self.pol_sambol.save()
+            LocalFoodDatabase.objects.filter(food=self.kiribath).first().save()
+            FoodCategory.objects.create(name='Zebras')
+        self.assertEqual(self.names('zebra'), [])
+        self.assertEqual([food_id for food_id, _ in food_search_index.search('sambol')], [self.pol_sambol.pk])
+    
+    def test_api_search_is_ordered_by_rank(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('food-list'), {'search': 'ric flour'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([food['name'] for food in response.data], ['Rice Flour'])
+
+
+class BarcodeTests(TestCase):
+    """Barcodes resolve from any spelling and import in upserting chunks"""
+    
+    def setUp(self):
+        self.user = User.objects.create(username='scanner')
+        self.biscuit = Food.objects.create(name='Marie Biscuit', calories=440, barcode='0 36000 29145 2')
+    
+    def test_spellings_share_one_key(self):
+        self.assertEqual(self.biscuit.barcode, '0036000291452')
+        self.assertEqual(normalize_barcode('00036000291452'), '0036000291452')
+        self.assertEqual(normalize_barcode('96385074'), '96385074')
+        self.assertEqual(normalize_barcode('04252614'), '0042100005264')
+        for invalid in ('12345', '0036000291453', '12ab5678'):
+            with self.assertRaises(ValidationError):
+                normalize_barcode(invalid)
+        self.assertIsNone(Food.objects.create(name='Loose Rice', calories=130, barcode='').barcode)
+    
+    def test_lookup_endpoint_uses_one_query(self):
+        self.client.force_login(self.user)
+        url = reverse('food-barcode', args=['036000291452'])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'Marie Biscuit')
+        self.assertEqual(len([query for query in context.captured_queries if 'nutrition_food' in query['sql']]), 1)
+        
+        self.assertEqual(self.client.get(reverse('food-barcode', args=['96385074'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('food-barcode', args=['123'])).status_code, 400)
+    
+    def test_api_normalizes_and_rejects_duplicates(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('food-list'), {'name': 'Cream Cracker', 'calories': 430,
+                                                           'barcode': '9638-5074'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['barcode'], '96385074')
+        response = self.client.post(reverse('food-list'), {'name': 'Copy', 'calories': 1,
+                                                           'barcode': '00036000291452'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('barcode', response.data)
+        for name in ('Plain', 'Also plain'):
+            response = self.client.post(reverse('food-list'), {'name': name, 'calories': 1, 'barcode': ''})
+            self.assertEqual(response.status_code, 201)
+            self.assertIsNone(response.data['barcode'])
+    
+    def test_import_upserts_in_chunks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'foods.jsonl')
+            with open(path, 'w') as handle:
+                handle.write(json.dumps({'code': '036000291452', 'product_name': 'Marie Biscuit Lite',
+                                         'energy-kcal_100g': 400, 'sodium_100g': 0.5}) + '\n')
+                handle.write(json.dumps({'barcode': '96385074', 'name': 'Cream Cracker', 'calories': 430,
+                                         'category': 'Biscuits', 'is_vegan': 'yes'}) + '\n')
+                handle.write(json.dumps({'barcode': '123', 'name': 'Broken', 'calories': 1}) + '\n')
+                handle.write('{"barcode": "5012345678900", \n')
+                handle.write('["5012345678900", "Tea"]\n')
+                handle.write(json.dumps({'barcode': '5012345678900', 'name': 'Tea', 'calories': 1}) + '\n')
+            importer = FoodImporter(chunk_size=2)
+            counts = importer.run(read_records(path))
+        
+        self.assertEqual(counts, {'created': 2, 'updated': 1, 'skipped': 3})
+        self.assertEqual(importer.errors[0][0], 3)
+        self.assertEqual(importer.errors[1:], [(4, 'Line 4 is not valid JSON'), (5, 'Line 5 is not a JSON object')])
+        self.biscuit.refresh_from_db()
+        self.assertEqual((self.biscuit.name, self.biscuit.calories, self.biscuit.sodium_mg),
+                         ('Marie Biscuit Lite', 400, 500))
+        cracker = Food.objects.get(barcode='96385074')
+        self.assertEqual((cracker.category.name, cracker.is_vegan, cracker.origin), ('Biscuits', True, 'processed'))
+        self.assertAlmostEqual(nutrient_matrix.totals([cracker.pk], [1])['calories'], 430)
+
+
+class BulkMealLogTests(TestCase):
+    """A whole day of meals is logged in one request with a fixed query count"""
+    
+    def setUp(self):
+        nutrient_matrix.invalidate()
+        self.user = User.objects.create(username='syncer')
+        self.rice = Food.objects.create(name='Rice', calories=130, protein_g=2.5)
+        self.dhal = Food.objects.create(name='Dhal', calories=116, protein_g=9)
+        self.day = date(2026, 3, 2)
+        self.client.force_login(self.user)
+    
+    def post(self, payload):
+        return self.client.post(reverse('meal-log-bulk'), payload, content_type='application/json')
+    
+    def test_creates_logs_summaries_and_totals(self):
+        self.post({'log_date': str(self.day), 'meal_type': 'lunch', 'items': [
+            {'food': self.rice.pk, 'quantity': 1},
+        ]})
+        items = [
+            {'food': self.rice.pk, 'quantity': 2},
+            {'food': self.dhal.pk, 'quantity': 1},
+            {'food': self.rice.pk, 'quantity': 1, 'meal_type': 'dinner'},
+            {'food': self.dhal.pk, 'quantity': 0.5, 'meal_type': 'breakfast',
+             'log_date': str(self.day + timedelta(days=1))},
+        ]
+        with CaptureQueriesContext(connection) as context:
+            response = self.post({'log_date': str(self.day), 'meal_type': 'lunch', 'items': items})
+        self.assertEqual(response.status_code, 201)
+        # One food check, one insert, then a fixed number of queries per (date, meal type) row
+        writes = [query for query in context.captured_queries if 'nutrition_' in query['sql']]
+        self.assertLessEqual(len(writes), 2 + 5 * 3)
+        
+        self.assertEqual(len(response.data['ids']), 4)
+        self.assertAlmostEqual(response.data['totals']['calories'], 564)
+        lunch = response.data['meals'][0]
+        self.assertEqual((lunch['meal_type'], lunch['count'], lunch['calories']), ('lunch', 2, 376))
+        self.assertEqual(MealLog.objects.filter(user=self.user).count(), 5)
+        
+        incremental = list(DailyNutritionSummary.objects.order_by('log_date', 'meal_type').values_list(
+            'log_date', 'meal_type', 'meal_count', 'calories'
+        ))
+        rebuild_summaries()
+        self.assertEqual(incremental, list(DailyNutritionSummary.objects.order_by('log_date', 'meal_type').values_list(
+            'log_date', 'meal_type', 'meal_count', 'calories'
+        )))
+    
+    def test_rejects_the_whole_batch_on_any_bad_item(self):
+        response = self.post({'items': [
+            {'food': self.rice.pk, 'quantity': 1, 'meal_type': 'lunch'},
+            {'food': 999999, 'quantity': 1, 'meal_type': 'lunch'},
+            {'food': self.rice.pk, 'quantity': 1},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data['items']), {1, 2})
+        self.assertFalse(MealLog.objects.exists())
+        self.assertEqual(self.post({'meal_type': 'lunch', 'items': []}).status_code, 400)
+
+
+class MealLogFieldsetTests(TestCase):
+    """Meal log lists embed a compact food and load only the requested columns"""
+    
+    def setUp(self):
+        self.user = User.objects.create(username='reader')
+        for index in range(3):
+            food = Food.objects.create(name=f'Food {index}', calories=100 + index, cooking_instructions='Boil')
+            MealLog.objects.create(user=self.user, food=food, quantity=1, meal_type='lunch', log_date=date(2026, 3, 2))
+        self.client.force_login(self.user)
+    
+    def get(self, params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('meal-log-list'), params)
+        self.assertEqual(response.status_code, 200)
+        queries = [query['sql'] for query in context.captured_queries if 'nutrition_' in query['sql']]
+        return response.data['results'], queries
+    
+    def test_default_rows_are_compact_and_joined(self):
+        results, queries = self.get({'pagination': 'cursor'})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('cooking_instructions', results[0]['food_detail'])
+        self.assertNotIn('cooking_instructions', queries[0])
+    
+    def test_fields_and_expand(self):
+        results, queries = self.get({'pagination': 'cursor', 'fields': 'id,quantity'})
+        self.assertEqual(set(results[0]), {'id', 'quantity'})
+        self.assertNotIn('nutrition_food', queries[0])
+        
+        results, queries = self.get({'pagination': 'cursor', 'fields': 'id', 'expand': 'food_detail'})
+        self.assertEqual(set(results[0]), {'id', 'food_detail'})
+        self.assertEqual(results[0]['food_detail']['cooking_instructions'], 'Boil')
+        self.assertEqual(len(queries), 1)
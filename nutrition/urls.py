@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import FoodViewSet, MealLogViewSet
+from .views import FoodViewSet, MealLogViewSet, bulk_log_meals, food_by_barcode, food_matches, nutrition_summary
 
 
 router = DefaultRouter()
@@ -9,6 +9,11 @@ router.register(r'meal-logs', MealLogViewSet, basename='meal-log')
 
 
 urlpatterns = [
+    path('summary/', nutrition_summary, name='nutrition-summary'),
+    path('foods/match/', food_matches, name='food-matches'),
+    path('foods/barcode/<str:barcode>/', food_by_barcode, name='food-barcode'),
+    # Ahead of the router so 'bulk' is not taken for a meal log id
+    path('meal-logs/bulk/', bulk_log_meals, name='meal-log-bulk'),
     path('', include(router.urls)),
 ]
 
@@ -1,24 +1,142 @@
-from rest_framework import viewsets, permissions, filters
+from collections import Counter
+from datetime import timedelta
+from rest_framework import viewsets, permissions, filters, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.core.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
+from common.pagination import HybridPagination
+from common.views import SparseFieldsetViewMixin
+from .barcodes import resolve_barcode
+from .matrix import nutrient_matrix
 from .models import Food, MealLog
-from .serializers import FoodSerializer, MealLogSerializer
+from .search import FoodSearchFilter
+from .serializers import BulkMealLogSerializer, FoodSerializer, MealLogSerializer
+from .summaries import NUTRIENT_FIELDS, daily_totals
 
+SUMMARY_PERIODS = {'day': 1, 'week': 7, 'month': 30}
+MAX_SUMMARY_RANGE_DAYS = 366
+MAX_MATCH_RESULTS = 50
 
-class FoodViewSet(viewsets.ModelViewSet):
+
+class FoodViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Food.objects.all().order_by('name')
     serializer_class = FoodSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['name', 'localized_name_si', 'localized_name_ta']
+    filter_backends = [DjangoFilterBackend, FoodSearchFilter, filters.OrderingFilter]
+    search_fields = ['name', 'name_si', 'name_ta']
     ordering_fields = ['name', 'calories']
 
 
-class MealLogViewSet(viewsets.ModelViewSet):
+class MealLogViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     serializer_class = MealLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = HybridPagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['log_date', 'meal_type']
 
     def get_queryset(self):
-        return MealLog.objects.filter(user=self.request.user)
+        return MealLog.objects.filter(user=self.request.user).select_related('food')
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def nutrition_summary(request):
+    """Daily nutrient totals for a period ending on ?date=, or for ?date_from=&date_to="""
+    params = request.query_params
+    if 'date_from' in params or 'date_to' in params:
+        date_from = parse_date(params.get('date_from', ''))
+        date_to = parse_date(params.get('date_to', ''))
+    else:
+        period = params.get('period', 'week')
+        if period not in SUMMARY_PERIODS:
+            return Response({'error': f"period must be one of {', '.join(SUMMARY_PERIODS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        date_to = parse_date(params['date']) if 'date' in params else timezone.localdate()
+        date_from = date_to - timedelta(days=SUMMARY_PERIODS[period] - 1) if date_to else None
+    if not date_from or not date_to or date_from > date_to:
+        return Response({'error': 'Invalid date range'}, status=status.HTTP_400_BAD_REQUEST)
+    if (date_to - date_from).days >= MAX_SUMMARY_RANGE_DAYS:
+        return Response({'error': f'Date range cannot exceed {MAX_SUMMARY_RANGE_DAYS} days'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    days = daily_totals(request.user, date_from, date_to)
+    totals = {field: sum(day[field] for day in days.values()) for field in NUTRIENT_FIELDS}
+    logged_days = sum(1 for day in days.values() if day['meal_count'])
+    return Response({
+        'date_from': date_from,
+        'date_to': date_to,
+        'days': [dict(day, date=log_date) for log_date, day in days.items()],
+        'totals': totals,
+        # Averaged over days with at least one meal logged
+        'daily_averages': {
+            field: (value / logged_days if logged_days else 0) for field, value in totals.items()
+        },
+    })
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def food_matches(request):
+    """Foods nearest a macro target given per 100g, e.g. ?calories=150&protein_g=20&limit=5"""
+    try:
+        target = {field: float(request.query_params[field]) for field in NUTRIENT_FIELDS if field in request.query_params}
+        limit = int(request.query_params.get('limit', 10))
+    except ValueError:
+        return Response({'error': 'Targets and limit must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+    if not target:
+        return Response({'error': f"Give at least one of {', '.join(NUTRIENT_FIELDS)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    matches = nutrient_matrix.closest(target, limit=max(1, min(limit, MAX_MATCH_RESULTS)))
+    foods = Food.objects.in_bulk([food_id for food_id, _ in matches])
+    return Response({
+        'target': target,
+        'results': [
+            dict(FoodSerializer(foods[food_id]).data, distance=round(distance, 4))
+            for food_id, distance in matches if food_id in foods
+        ],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def food_by_barcode(request, barcode):
+    """The food for a scanned EAN-8, EAN-13, UPC-A, UPC-E or GTIN-14 code"""
+    try:
+        food = resolve_barcode(barcode)
+    except ValidationError as error:
+        return Response({'error': error.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+    if food is None:
+        return Response({'error': 'No food with this barcode'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(FoodSerializer(food).data)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def bulk_log_meals(request):
+    """Log many foods at once, e.g. a whole day synced after offline use; returns compact totals"""
+    serializer = BulkMealLogSerializer(data=request.data, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    meal_logs = serializer.save()
+
+    food_ids = [meal_log.food_id for meal_log in meal_logs]
+    quantities = [meal_log.quantity for meal_log in meal_logs]
+    keys = [(meal_log.log_date, meal_log.meal_type) for meal_log in meal_logs]
+    counts = Counter(keys)
+    meals = nutrient_matrix.grouped_totals(keys, food_ids, quantities)
+    return Response({
+        # Empty on databases that don't return bulk-inserted ids (MySQL)
+        'ids': [meal_log.pk for meal_log in meal_logs if meal_log.pk is not None],
+        'meals': [
+            dict(rounded(amounts), log_date=log_date, meal_type=meal_type, count=counts[(log_date, meal_type)])
+            for (log_date, meal_type), amounts in meals.items()
+        ],
+        'totals': rounded(nutrient_matrix.totals(food_ids, quantities)),
+    }, status=status.HTTP_201_CREATED)
+
 
+def rounded(amounts):
+    return {field: round(value, 2) for field, value in amounts.items()}
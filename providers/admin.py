@@ -1,13 +1,15 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Provider, ProviderService, ProviderMedia
+from search.indexes import invalidate_provider_indexes
+from .models import Provider, ProviderService, ProviderMedia, ProviderReview
 
 @admin.register(Provider)
 class ProviderAdmin(admin.ModelAdmin):
     list_display = ('business_name', 'category', 'district', 'status', 'is_verified', 'average_rating', 'total_bookings', 'created_at')
     list_filter = ('category', 'district', 'status', 'is_verified', 'accepts_online_bookings')
     search_fields = ('business_name', 'business_name_si', 'business_name_ta', 'email', 'phone', 'address')
-    readonly_fields = ('slug', 'total_bookings', 'total_reviews', 'average_rating', 'created_at', 'updated_at')
+    readonly_fields = ('slug', 'total_bookings', 'total_reviews', 'average_rating', 'rating_count_1', 'rating_count_2',
+                       'rating_count_3', 'rating_count_4', 'rating_count_5', 'created_at', 'updated_at')
     
     fieldsets = (
         ('Basic Information', {
@@ -26,7 +28,8 @@ class ProviderAdmin(admin.ModelAdmin):
             'fields': ('is_verified', 'verification_documents')
         }),
         ('Performance Metrics', {
-            'fields': ('total_bookings', 'total_reviews', 'average_rating'),
+            'fields': ('total_bookings', 'total_reviews', 'average_rating', 'rating_count_1', 'rating_count_2',
+                       'rating_count_3', 'rating_count_4', 'rating_count_5'),
             'classes': ('collapse',)
         }),
         ('Business Settings', {
@@ -46,16 +49,20 @@ class ProviderAdmin(admin.ModelAdmin):
     
     def approve_providers(self, request, queryset):
         queryset.update(status='approved')
+        invalidate_provider_indexes()
         self.message_user(request, f"Successfully approved {queryset.count()} providers.")
     approve_providers.short_description = "Approve selected providers"
     
     def verify_providers(self, request, queryset):
         queryset.update(is_verified=True)
+        Provider.refresh_search_scores(queryset)
+        invalidate_provider_indexes()
         self.message_user(request, f"Successfully verified {queryset.count()} providers.")
     verify_providers.short_description = "Verify selected providers"
     
     def suspend_providers(self, request, queryset):
         queryset.update(status='suspended')
+        invalidate_provider_indexes()
         self.message_user(request, f"Successfully suspended {queryset.count()} providers.")
     suspend_providers.short_description = "Suspend selected providers"
 
@@ -93,4 +100,31 @@ class ProviderMediaAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html('<img src="{}" style="width: 100px; height: 60px; object-fit: cover;" />', obj.image.url)
         return "No image"
-    image_preview.short_description = "Preview"
\ No newline at end of file
+    image_preview.short_description = "Preview"
+
+@admin.register(ProviderReview)
+class ProviderReviewAdmin(admin.ModelAdmin):
+    list_display = ('provider', 'user', 'rating', 'instructor', 'is_published', 'created_at')
+    list_filter = ('rating', 'is_published', 'created_at')
+    search_fields = ('provider__business_name', 'user__username', 'comment')
+    raw_id_fields = ('provider', 'instructor', 'user')
+    readonly_fields = ('created_at', 'updated_at')
+    
+    actions = ['publish_reviews', 'hide_reviews']
+    
+    def publish_reviews(self, request, queryset):
+        # Saved one by one so the rating counters follow
+        reviews = list(queryset.filter(is_published=False))
+        for review in reviews:
+            review.is_published = True
+            review.save(update_fields=['is_published', 'updated_at'])
+        self.message_user(request, f"Successfully published {len(reviews)} reviews.")
+    publish_reviews.short_description = "Publish selected reviews"
+    
+    def hide_reviews(self, request, queryset):
+        reviews = list(queryset.filter(is_published=True))
+        for review in reviews:
+            review.is_published = False
+            review.save(update_fields=['is_published', 'updated_at'])
+        self.message_user(request, f"Successfully hid {len(reviews)} reviews.")
+    hide_reviews.short_description = "Hide selected reviews"
@@ -0,0 +1,197 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Value, When
+from django.db.models.functions import Cast, Greatest, Round
+from django.db.models.lookups import GreaterThan
+
+from .models import FitnessInstructor, Provider, ProviderReview
+
+RATING_COUNT_FIELDS = {star: f'rating_count_{star}' for star in range(1, 6)}
+PROVIDER_COUNTER_FIELDS = ['total_bookings', 'total_reviews', 'average_rating', *RATING_COUNT_FIELDS.values()]
+INSTRUCTOR_COUNTER_FIELDS = ['total_reviews', 'average_rating']
+
+
+def _average(weighted, total):
+    """weighted / total rounded to two places, 0 when there is nothing to average"""
+    return Case(
+        When(GreaterThan(total, 0), then=Round(Cast(weighted, FloatField()) / Cast(total, FloatField()), 2)),
+        default=Value(0.0),
+        output_field=FloatField()
+    )
+
+
+def apply_review_change(before, after):
+    """Move one review's contribution between counters with single-row UPDATEs.
+
+    before and after are ProviderReview.counted_state() values, None for a
+    review that did not exist. Must run inside the review's transaction.
+    """
+    provider_changes = defaultdict(lambda: defaultdict(int))
+    instructor_changes = defaultdict(lambda: defaultdict(int))
+    for state, delta in ((before, -1), (after, 1)):
+        if state is None or not state['is_published']:
+            continue
+        provider_changes[state['provider_id']][state['rating']] += delta
+        if state['instructor_id']:
+            instructor_changes[state['instructor_id']][state['rating']] += delta
+
+    for provider_id, changes in provider_changes.items():
+        update_provider_ratings(provider_id, changes)
+    for instructor_id, changes in instructor_changes.items():
+        update_instructor_ratings(instructor_id, changes)
+
+
+def update_provider_ratings(provider_id, changes):
+    """Apply {star: delta} to a provider's histogram, total_reviews and average_rating atomically"""
+    changes = {star: delta for star, delta in changes.items() if delta}
+    if not changes:
+        return
+    # Every column is computed from the row's current values, so concurrent reviews never lose an update
+    counts = {
+        star: Greatest(F(field) + changes.get(star, 0), 0) if star in changes else F(field)
+        for star, field in RATING_COUNT_FIELDS.items()
+    }
+    total = sum(counts.values(), Value(0))
+    weighted = sum((count * star for star, count in counts.items()), Value(0))
+    providers = Provider.objects.filter(pk=provider_id)
+    providers.update(
+        total_reviews=total,
+        average_rating=_average(weighted, total),
+        **{RATING_COUNT_FIELDS[star]: counts[star] for star in changes}
+    )
+    _after_rating_change(providers)
+
+
+def update_instructor_ratings(instructor_id, changes):
+    """Apply {star: delta} to an instructor's total_reviews and average_rating atomically
+
+    Instructors have no histogram, so the average is rebuilt from the rounded
+    stored one; reconcile_counters corrects the rounding drift.
+    """
+    count_delta = sum(changes.values())
+    rating_delta = sum(star * delta for star, delta in changes.items())
+    if not count_delta and not rating_delta:
+        return
+    total = Greatest(F('total_reviews') + count_delta, 0)
+    weighted = Cast('average_rating', FloatField()) * F('total_reviews') + rating_delta
+    FitnessInstructor.objects.filter(pk=instructor_id).update(
+        total_reviews=total,
+        average_rating=_average(weighted, total)
+    )
+
+
+def increment_bookings(provider_id, by=1):
+    """Count new bookings with an atomic increment; reschedules are not new bookings"""
+    providers = Provider.objects.filter(pk=provider_id)
+    providers.update(total_bookings=F('total_bookings') + by)
+    Provider.refresh_search_scores(providers)
+
+
+def _after_rating_change(providers):
+    from search.services import ProviderFacetService
+
+    Provider.refresh_search_scores(providers)
+    # Rating buckets are part of the cached facets
+    transaction.on_commit(ProviderFacetService.invalidate)
+
+
+def rating_distribution(provider):
+    """Share of published reviews per star as whole percentages, keyed '5' to '1'"""
+    counts = {star: getattr(provider, field) for star, field in RATING_COUNT_FIELDS.items()}
+    total = sum(counts.values())
+    return {
+        str(star): round(100 * counts[star] / total) if total else 0
+        for star in sorted(counts, reverse=True)
+    }
+
+
+def _average_of(histogram):
+    total = sum(histogram.values())
+    if not total:
+        return Decimal('0.00')
+    return (Decimal(sum(star * count for star, count in histogram.items())) / total).quantize(Decimal('0.01'))
+
+
+def _histograms(reviews, key):
+    histograms = defaultdict(dict)
+    rows = reviews.filter(is_published=True).values_list(key, 'rating').annotate(count=Count('id')).order_by()
+    for owner_id, rating, count in rows:
+        histograms[owner_id][rating] = count
+    return histograms
+
+
+def _reconcile(model, fields, actual_values, batch_size, fix, report, name):
+    """Compare stored counters with actual_values(ids) batch by batch, fixing drift if asked"""
+    last_id = 0
+    while True:
+        ids = list(model.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return
+        last_id = ids[-1]
+        with transaction.atomic():
+            # Lock before reading the source tables so concurrent increments land after the fix
+            rows = list(model.objects.select_for_update().filter(id__in=ids).only('id', *fields))
+            actual = actual_values(ids)
+            drifted = []
+            for row in rows:
+                changed = False
+                for field, value in actual[row.id].items():
+                    stored = getattr(row, field)
+                    if stored != value:
+                        report['drift'].append((name, row.id, field, stored, value))
+                        setattr(row, field, value)
+                        changed = True
+                if changed:
+                    drifted.append(row)
+            report[name]['checked'] += len(rows)
+            report[name]['drifted'] += len(drifted)
+            if fix and drifted:
+                model.objects.bulk_update(drifted, fields)
+                if model is Provider:
+                    _after_rating_change(Provider.objects.filter(id__in=[row.id for row in drifted]))
+
+
+def reconcile_counters(batch_size=500, fix=True):
+    """Recompute provider and instructor counters from reviews and bookings.
+
+    Returns {'provider': {'checked', 'drifted'}, 'instructor': {...}, 'drift':
+    [(kind, id, field, stored, actual), ...]}. With fix=False nothing is written.
+    """
+    from bookings.models import Booking
+
+    report = {'provider': {'checked': 0, 'drifted': 0}, 'instructor': {'checked': 0, 'drifted': 0}, 'drift': []}
+
+    def provider_values(ids):
+        histograms = _histograms(ProviderReview.objects.filter(provider_id__in=ids), 'provider_id')
+        # Rescheduling creates a replacement row but is not a new booking, matching increment_bookings
+        bookings = dict(
+            Booking.objects.filter(provider_id__in=ids, reschedule_count=0).values_list('provider_id').annotate(
+                count=Count('id')
+            ).order_by()
+        )
+        values = {}
+        for provider_id in ids:
+            histogram = histograms[provider_id]
+            values[provider_id] = {
+                'total_bookings': bookings.get(provider_id, 0),
+                'total_reviews': sum(histogram.values()),
+                'average_rating': _average_of(histogram),
+                **{field: histogram.get(star, 0) for star, field in RATING_COUNT_FIELDS.items()},
+            }
+        return values
+
+    def instructor_values(ids):
+        histograms = _histograms(ProviderReview.objects.filter(instructor_id__in=ids), 'instructor_id')
+        return {
+            instructor_id: {
+                'total_reviews': sum(histograms[instructor_id].values()),
+                'average_rating': _average_of(histograms[instructor_id]),
+            }
+            for instructor_id in ids
+        }
+
+    _reconcile(Provider, PROVIDER_COUNTER_FIELDS, provider_values, batch_size, fix, report, 'provider')
+    _reconcile(FitnessInstructor, INSTRUCTOR_COUNTER_FIELDS, instructor_values, batch_size, fix, report, 'instructor')
+    return report
@@ -1,11 +1,11 @@
 from rest_framework import generics, status, filters
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 from django.db.models import Q, Count, Avg
 from decimal import Decimal
 import math
 
+from common.pagination import HybridPagination
 from .models import (
     Provider, FitnessCenter, FitnessInstructor, 
     FitnessClassSchedule, FitnessMembership
@@ -16,7 +16,7 @@ from .fitness_serializers import (
     FitnessMembershipSerializer, FitnessSearchSerializer
 )
 
-class FitnessCenterPagination(PageNumberPagination):
+class FitnessCenterPagination(HybridPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
@@ -153,9 +153,15 @@ class UserFitnessMembershipsView(generics.ListCreateAPIView):
     
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return FitnessMembership.objects.select_related(
+            queryset = FitnessMembership.objects.select_related(
                 'fitness_center', 'fitness_center__provider'
             ).filter(user=self.request.user).order_by('-created_at')
+            
+            # Expiry is stored by the sweep_bookings job, so status can be filtered in SQL
+            membership_status = self.request.query_params.get('status')
+            if membership_status:
+                queryset = queryset.filter(status=membership_status)
+            return queryset
         return FitnessMembership.objects.none()
     
     def perform_create(self, serializer):
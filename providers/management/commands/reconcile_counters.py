@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from providers.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute provider and instructor rating and booking counters from reviews and bookings, reporting drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drift without correcting it')
+        parser.add_argument('--show', type=int, default=20,
+                            help='Drifted fields to list (default 20)')
+
+    def handle(self, *args, **options):
+        report = reconcile_counters(batch_size=options['batch_size'], fix=not options['dry_run'])
+        for kind, object_id, field, stored, actual in report['drift'][:options['show']]:
+            self.stdout.write(f'{kind} {object_id} {field}: stored {stored}, actual {actual}')
+        verb = 'need fixing' if options['dry_run'] else 'fixed'
+        for kind in ('provider', 'instructor'):
+            counts = report[kind]
+            self.stdout.write(self.style.SUCCESS(
+                f"{kind}s: checked {counts['checked']}, {counts['drifted']} {verb}"
+            ))
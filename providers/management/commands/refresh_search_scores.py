@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from providers.models import Provider
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized provider search_score used by default search ordering'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.stdout.write('Refreshing provider search scores...')
+        updated = Provider.refresh_search_scores(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} providers'))
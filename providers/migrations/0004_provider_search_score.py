@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:57
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Cast, Least
+
+
+def populate_search_score(apps, schema_editor):
+    # Frozen copy of Provider.search_score_expression()
+    Provider = apps.get_model('providers', 'Provider')
+    Provider.objects.update(search_score=models.ExpressionWrapper(
+        models.Case(
+            models.When(is_verified=True, then=models.Value(2.0)),
+            default=models.Value(1.0),
+            output_field=models.FloatField()
+        ) * Cast('average_rating', models.FloatField())
+        + Least('total_reviews', models.Value(100)) * models.Value(0.25 / 100)
+        + Least('total_bookings', models.Value(500)) * models.Value(0.25 / 500),
+        output_field=models.FloatField()
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0003_add_fitness_models'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='provider',
+            name='search_score',
+            field=models.FloatField(default=0, editable=False, help_text='Denormalized default search ranking, see compute_search_score'),
+        ),
+        migrations.RunPython(populate_search_score, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='provider',
+            index=models.Index(fields=['status', 'category', 'district', '-search_score'], name='provider_filtered_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='provider',
+            index=models.Index(fields=['status', '-search_score'], name='provider_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0004_provider_search_score'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fitnessmembership',
+            index=models.Index(fields=['status', 'end_date'], name='providers_f_status_e6f811_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0006_provider_reviews'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='provider',
+            index=models.Index(fields=['status', '-average_rating', '-total_reviews', '-id'], name='provider_rating_keyset_idx'),
+        ),
+    ]
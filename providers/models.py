@@ -1,11 +1,31 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import Cast, Least
 from django.urls import reverse
 import uuid
 
 User = get_user_model()
 
+class ProviderQuerySet(models.QuerySet):
+    """Query helpers shared by provider list and search endpoints"""
+    
+    def with_card_data(self):
+        """Prefetch featured media and annotate the lowest active service price"""
+        cheapest_service = ProviderService.objects.filter(
+            provider=models.OuterRef('pk'),
+            is_active=True
+        ).order_by('price').values('price')[:1]
+        
+        return self.prefetch_related(
+            models.Prefetch(
+                'media',
+                queryset=ProviderMedia.objects.filter(is_featured=True),
+                to_attr='featured_media'
+            )
+        ).annotate(starting_price=models.Subquery(cheapest_service))
+
+
 class Provider(models.Model):
     """Main provider model for wellness marketplace"""
     
@@ -99,6 +119,14 @@ class Provider(models.Model):
     total_reviews = models.PositiveIntegerField(default=0)
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.0,
                                         validators=[MinValueValidator(0), MaxValueValidator(5)])
+    # Published review histogram, kept by providers.counters
+    rating_count_1 = models.PositiveIntegerField(default=0)
+    rating_count_2 = models.PositiveIntegerField(default=0)
+    rating_count_3 = models.PositiveIntegerField(default=0)
+    rating_count_4 = models.PositiveIntegerField(default=0)
+    rating_count_5 = models.PositiveIntegerField(default=0)
+    search_score = models.FloatField(default=0, editable=False,
+                                     help_text="Denormalized default search ranking, see compute_search_score")
     
     # Business Settings
     accepts_online_bookings = models.BooleanField(default=True)
@@ -111,14 +139,25 @@ class Provider(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProviderQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['category', 'district']),
             models.Index(fields=['status', 'is_verified']),
             models.Index(fields=['latitude', 'longitude']),
+            models.Index(fields=['status', 'category', 'district', '-search_score'], name='provider_filtered_rank_idx'),
+            models.Index(fields=['status', '-average_rating', '-total_reviews', '-id'], name='provider_rating_keyset_idx'),
+            models.Index(fields=['status', '-search_score'], name='provider_rank_idx'),
         ]
     
+    # Inputs of search_score; saving any of them recomputes it
+    SEARCH_SCORE_FIELDS = {'is_verified', 'average_rating', 'total_reviews', 'total_bookings'}
+    # Popularity bonuses are capped so they only break ties between similar ratings
+    REVIEWS_BONUS, REVIEWS_CAP = 0.25, 100
+    BOOKINGS_BONUS, BOOKINGS_CAP = 0.25, 500
+    
     def __str__(self):
         return self.business_name
     
@@ -132,8 +171,49 @@ class Provider(models.Model):
                 slug = f"{base_slug}-{counter}"
                 counter += 1
             self.slug = slug
+        
+        self.search_score = self.compute_search_score()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and self.SEARCH_SCORE_FIELDS.intersection(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'search_score'}
         super().save(*args, **kwargs)
     
+    def compute_search_score(self):
+        """Default search ranking: rating doubled for verified providers plus small popularity bonuses"""
+        score = (2.0 if self.is_verified else 1.0) * float(self.average_rating or 0)
+        score += self.REVIEWS_BONUS * min(self.total_reviews, self.REVIEWS_CAP) / self.REVIEWS_CAP
+        score += self.BOOKINGS_BONUS * min(self.total_bookings, self.BOOKINGS_CAP) / self.BOOKINGS_CAP
+        return score
+    
+    @classmethod
+    def search_score_expression(cls):
+        """compute_search_score as a database expression, for batch updates"""
+        return (
+            models.Case(
+                models.When(is_verified=True, then=models.Value(2.0)),
+                default=models.Value(1.0),
+                output_field=models.FloatField()
+            ) * Cast('average_rating', models.FloatField())
+            + Least('total_reviews', models.Value(cls.REVIEWS_CAP)) * models.Value(cls.REVIEWS_BONUS / cls.REVIEWS_CAP)
+            + Least('total_bookings', models.Value(cls.BOOKINGS_CAP)) * models.Value(cls.BOOKINGS_BONUS / cls.BOOKINGS_CAP)
+        )
+    
+    @classmethod
+    def refresh_search_scores(cls, queryset=None, batch_size=1000):
+        """Recompute search_score in id batches; returns the number of providers updated"""
+        queryset = (queryset if queryset is not None else cls.objects.all()).order_by('id')
+        expression = cls.search_score_expression()
+        updated = 0
+        last_id = 0
+        while True:
+            ids = list(queryset.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return updated
+            updated += cls.objects.filter(id__in=ids).update(
+                search_score=models.ExpressionWrapper(expression, output_field=models.FloatField())
+            )
+            last_id = ids[-1]
+    
     def get_localized_name(self, language='en'):
         """Get business name in specified language"""
         if language == 'si' and self.business_name_si:
@@ -141,6 +221,27 @@ class Provider(models.Model):
         elif language == 'ta' and self.business_name_ta:
             return self.business_name_ta
         return self.business_name
+    
+    def get_localized_description(self, language='en'):
+        """Get description in specified language"""
+        if language == 'si' and self.description_si:
+            return self.description_si
+        elif language == 'ta' and self.description_ta:
+            return self.description_ta
+        return self.description
+    
+    def get_featured_media(self):
+        """Featured media item, read from the with_card_data() prefetch when present"""
+        if hasattr(self, 'featured_media'):
+            return self.featured_media[0] if self.featured_media else None
+        return self.media.filter(is_featured=True).first()
+    
+    def get_starting_price(self):
+        """Lowest active service price, read from the with_card_data() annotation when present"""
+        if hasattr(self, 'starting_price'):
+            return self.starting_price
+        cheapest_service = self.services.filter(is_active=True).order_by('price').first()
+        return cheapest_service.price if cheapest_service else None
 
 
 class ProviderService(models.Model):
@@ -181,6 +282,14 @@ class ProviderService(models.Model):
     
     def __str__(self):
         return f"{self.provider.business_name} - {self.name}"
+    
+    def get_localized_name(self, language='en'):
+        """Get service name in specified language"""
+        if language == 'si' and self.name_si:
+            return self.name_si
+        elif language == 'ta' and self.name_ta:
+            return self.name_ta
+        return self.name
 
 
 class ProviderMedia(models.Model):
@@ -435,6 +544,9 @@ class FitnessMembership(models.Model):
     class Meta:
         unique_together = ['user', 'fitness_center']
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'end_date']),
+        ]
         
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.fitness_center.provider.business_name}"
@@ -449,4 +561,52 @@ class FitnessMembership(models.Model):
         from django.utils import timezone
         if self.end_date >= timezone.now().date():
             return (self.end_date - timezone.now().date()).days
-        return 0
\ No newline at end of file
+        return 0
+
+
+class ProviderReview(models.Model):
+    """Customer rating of a provider, optionally for one of its instructors"""
+    
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='reviews')
+    instructor = models.ForeignKey(FitnessInstructor, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='reviews')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='provider_reviews')
+    
+    rating = models.PositiveSmallIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
+    comment = models.TextField(blank=True)
+    is_published = models.BooleanField(default=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['provider', 'user']
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['provider', 'is_published', 'rating']),
+            models.Index(fields=['instructor', 'is_published', 'rating']),
+        ]
+    
+    def __str__(self):
+        return f"{self.rating}/5 for {self.provider.business_name}"
+    
+    def save(self, *args, **kwargs):
+        from .counters import apply_review_change
+        
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = type(self).objects.select_for_update().filter(pk=self.pk).values(
+                    'provider_id', 'instructor_id', 'rating', 'is_published'
+                ).first()
+            super().save(*args, **kwargs)
+            apply_review_change(previous, self.counted_state())
+    
+    def counted_state(self):
+        """The fields the rating counters depend on"""
+        return {
+            'provider_id': self.provider_id,
+            'instructor_id': self.instructor_id,
+            'rating': self.rating,
+            'is_published': self.is_published,
+        }
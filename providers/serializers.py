@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from common.serializers import SparseFieldsetMixin
+from .counters import rating_distribution
 from .models import Provider, ProviderService, ProviderMedia
 
 User = get_user_model()
@@ -9,8 +11,9 @@ class ProviderMediaSerializer(serializers.ModelSerializer):
         model = ProviderMedia
         fields = ['id', 'title', 'image', 'is_featured', 'uploaded_at']
 
-class ProviderServiceSerializer(serializers.ModelSerializer):
+class ProviderServiceSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     localized_name = serializers.SerializerMethodField()
+    field_dependencies = {'localized_name': ['name', 'name_si', 'name_ta']}
     
     class Meta:
         model = ProviderService
@@ -55,7 +58,7 @@ class ProviderListSerializer(serializers.ModelSerializer):
         return description[:200] + '...' if len(description) > 200 else description
     
     def get_featured_image(self, obj):
-        featured_media = obj.media.filter(is_featured=True).first()
+        featured_media = obj.get_featured_media()
         if featured_media and featured_media.image:
             request = self.context.get('request')
             if request:
@@ -97,15 +100,7 @@ class ProviderDetailSerializer(serializers.ModelSerializer):
         return obj.get_localized_description(language)
     
     def get_rating_distribution(self, obj):
-        # This would calculate actual rating distribution
-        # For now, return a sample distribution
-        return {
-            '5': 60,
-            '4': 25,
-            '3': 10,
-            '2': 3,
-            '1': 2
-        }
+        return rating_distribution(obj)
 
 class ProviderRegistrationSerializer(serializers.ModelSerializer):
     """Serializer for provider registration"""
@@ -191,7 +186,7 @@ class ProviderSearchSerializer(serializers.ModelSerializer):
         return obj.get_localized_name(language)
     
     def get_featured_image(self, obj):
-        featured_media = obj.media.filter(is_featured=True).first()
+        featured_media = obj.get_featured_media()
         if featured_media and featured_media.image:
             request = self.context.get('request')
             if request:
@@ -199,8 +194,7 @@ class ProviderSearchSerializer(serializers.ModelSerializer):
         return None
     
     def get_starting_price(self, obj):
-        min_price_service = obj.services.filter(is_active=True).order_by('price').first()
-        return min_price_service.price if min_price_service else None
+        return obj.get_starting_price()
 
 
 
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .counters import apply_review_change
+from .models import ProviderReview
+
+
+@receiver(post_delete, sender=ProviderReview)
+def uncount_review(sender, instance, **kwargs):
+    """Take a deleted review out of the rating counters, for queryset and cascade deletes too"""
+    # Runs inside the delete's transaction
+    apply_review_change(instance.counted_state(), None)
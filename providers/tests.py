@@ -1,3 +1,186 @@
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .counters import reconcile_counters
+from .models import FitnessCenter, FitnessInstructor, Provider, ProviderService, ProviderMedia, ProviderReview
 
-# Create your tests here.
+User = get_user_model()
+
+
+def create_provider(name, **overrides):
+    """Create an approved provider with one featured image and two services"""
+    user = User.objects.create(username=name)
+    data = {
+        'user': user,
+        'business_name': name,
+        'category': 'gym',
+        'email': f'{name}@example.com',
+        'phone': '0771234567',
+        'address': '1 Galle Road',
+        'city': 'Colombo',
+        'district': 'colombo',
+        'description': f'{name} fitness studio',
+        'status': 'approved',
+        'is_verified': True,
+        'latitude': Decimal('6.900000'),
+        'longitude': Decimal('79.850000'),
+    }
+    data.update(overrides)
+    provider = Provider.objects.create(**data)
+    ProviderMedia.objects.create(provider=provider, image='provider_images/cover.jpg', is_featured=True)
+    ProviderMedia.objects.create(provider=provider, image='provider_images/inside.jpg')
+    for price in (Decimal('1500.00'), Decimal('900.00')):
+        ProviderService.objects.create(
+            provider=provider, name=f'Session {price}', service_type='session',
+            description='Session', price=price, duration_minutes=60
+        )
+    return provider
+
+
+class ProviderListQueryCountTests(TestCase):
+    """List endpoints must run a constant number of queries per page"""
+    
+    def count_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(context), response
+    
+    def assert_constant_queries(self, url, params=None):
+        create_provider('first')
+        create_provider('second')
+        baseline, _ = self.count_queries(url, params)
+        for index in range(5):
+            create_provider(f'extra{index}')
+        queries, response = self.count_queries(url, params)
+        self.assertEqual(queries, baseline)
+        return response
+    
+    def test_provider_list(self):
+        response = self.assert_constant_queries(reverse('providers:list'))
+        result = response.json()['results'][0]
+        self.assertTrue(result['featured_image'].endswith('provider_images/cover.jpg'))
+    
+    def test_featured_providers(self):
+        response = self.assert_constant_queries(reverse('providers:featured'))
+        self.assertEqual(len(response.json()['featured_providers']), 6)
+    
+    def test_card_data_matches_per_row_lookups(self):
+        provider = create_provider('solo')
+        annotated = Provider.objects.with_card_data().get(pk=provider.pk)
+        self.assertEqual(annotated.get_starting_price(), Decimal('900.00'))
+        self.assertEqual(annotated.get_featured_media().image.name, 'provider_images/cover.jpg')
+        plain = Provider.objects.get(pk=provider.pk)
+        self.assertEqual(plain.get_starting_price(), Decimal('900.00'))
+        self.assertEqual(plain.get_featured_media().image.name, 'provider_images/cover.jpg')
+
+
+class ProviderSearchScoreTests(TestCase):
+    """search_score stays in step with its inputs"""
+    
+    def test_save_and_batch_refresh_agree(self):
+        provider = create_provider('scored', average_rating=Decimal('4.20'), total_reviews=40)
+        expected = provider.compute_search_score()
+        self.assertAlmostEqual(Provider.objects.get(pk=provider.pk).search_score, expected)
+        
+        Provider.objects.filter(pk=provider.pk).update(search_score=0)
+        Provider.refresh_search_scores(batch_size=1)
+        self.assertAlmostEqual(Provider.objects.get(pk=provider.pk).search_score, expected)
+    
+    def test_update_fields_include_score(self):
+        provider = create_provider('busy', is_verified=False, average_rating=Decimal('4.00'))
+        provider.total_bookings = 500
+        provider.save(update_fields=['total_bookings'])
+        self.assertAlmostEqual(Provider.objects.get(pk=provider.pk).search_score, 4.25)
+
+
+class ProviderCounterTests(TestCase):
+    """Rating counters follow reviews and reconciliation repairs drift"""
+    
+    def setUp(self):
+        self.provider = create_provider('rated')
+        center = FitnessCenter.objects.create(provider=self.provider, fitness_type='gym')
+        self.instructor = FitnessInstructor.objects.create(fitness_center=center, name='Coach')
+    
+    def review(self, username, rating, **fields):
+        user = User.objects.create(username=username)
+        return ProviderReview.objects.create(provider=self.provider, user=user, rating=rating, **fields)
+    
+    def test_reviews_update_histogram_and_average(self):
+        self.review('a', 5, instructor=self.instructor)
+        self.review('b', 4, instructor=self.instructor)
+        hidden = self.review('c', 1)
+        hidden.is_published = False
+        hidden.save()
+        changed = self.review('d', 2)
+        changed.rating = 3
+        changed.save()
+        
+        provider = Provider.objects.get(pk=self.provider.pk)
+        self.assertEqual(provider.total_reviews, 3)
+        self.assertEqual(provider.average_rating, Decimal('4.00'))
+        self.assertEqual(
+            [provider.rating_count_5, provider.rating_count_4, provider.rating_count_3, provider.rating_count_1],
+            [1, 1, 1, 0]
+        )
+        self.assertAlmostEqual(provider.search_score, provider.compute_search_score())
+        instructor = FitnessInstructor.objects.get(pk=self.instructor.pk)
+        self.assertEqual((instructor.total_reviews, instructor.average_rating), (2, Decimal('4.50')))
+        
+        changed.delete()
+        provider.refresh_from_db()
+        self.assertEqual((provider.total_reviews, provider.average_rating), (2, Decimal('4.50')))
+        
+        response = self.client.get(reverse('providers:detail', args=[provider.slug]))
+        self.assertEqual(response.data['rating_distribution'], {'5': 50, '4': 50, '3': 0, '2': 0, '1': 0})
+    
+    def test_queryset_and_cascade_deletes_uncount_reviews(self):
+        self.review('a', 5, instructor=self.instructor)
+        self.review('b', 3)
+        self.review('c', 4)
+        ProviderReview.objects.filter(rating=3).delete()
+        User.objects.get(username='a').delete()
+        
+        provider = Provider.objects.get(pk=self.provider.pk)
+        self.assertEqual(
+            (provider.total_reviews, provider.average_rating, provider.rating_count_5), (1, Decimal('4.00'), 0)
+        )
+        self.assertEqual(FitnessInstructor.objects.get(pk=self.instructor.pk).total_reviews, 0)
+        self.assertEqual(reconcile_counters(fix=False)['drift'], [])
+    
+    def test_reconcile_reports_and_fixes_drift(self):
+        self.review('a', 5, instructor=self.instructor)
+        self.review('b', 3)
+        Provider.objects.filter(pk=self.provider.pk).update(total_reviews=9, rating_count_3=0, total_bookings=7)
+        FitnessInstructor.objects.filter(pk=self.instructor.pk).update(average_rating=Decimal('2.00'))
+        
+        report = reconcile_counters(fix=False)
+        self.assertEqual((report['provider']['drifted'], report['instructor']['drifted']), (1, 1))
+        self.assertEqual(Provider.objects.get(pk=self.provider.pk).total_reviews, 9)
+        
+        report = reconcile_counters(batch_size=1)
+        self.assertIn(('provider', self.provider.pk, 'total_bookings', 7, 0), report['drift'])
+        provider = Provider.objects.get(pk=self.provider.pk)
+        self.assertEqual((provider.total_reviews, provider.rating_count_3, provider.total_bookings), (2, 1, 0))
+        self.assertEqual(FitnessInstructor.objects.get(pk=self.instructor.pk).average_rating, Decimal('5.00'))
+        self.assertEqual(reconcile_counters()['drift'], [])
+
+
+class ProviderListCursorTests(TestCase):
+    """Keyset pages follow the list ordering across tied ratings"""
+    
+    def test_tied_ratings_are_not_skipped(self):
+        for index, rating in enumerate(['4.50', '4.50', '4.50', '3.00', '5.00']):
+            create_provider(f'tied{index}', average_rating=Decimal(rating), total_reviews=10)
+        expected = list(Provider.objects.order_by('-average_rating', '-total_reviews', '-id').values_list('id', flat=True))
+        
+        seen = []
+        url = reverse('providers:list') + '?pagination=cursor&page_size=2'
+        while url:
+            response = self.client.get(url)
+            seen += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, expected)
@@ -2,18 +2,19 @@ from rest_framework import generics, status, filters
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
 from django.db.models import Q, Avg, Count
 from django_filters.rest_framework import DjangoFilterBackend
+from common.pagination import HybridPagination
 from .models import Provider, ProviderService, ProviderMedia
 from .serializers import (
     ProviderListSerializer, ProviderDetailSerializer, ProviderRegistrationSerializer,
     ProviderUpdateSerializer, ProviderServiceSerializer, ProviderServiceCreateSerializer,
     ProviderSearchSerializer
 )
+from search.services import ProviderFacetService
 
-class StandardResultsSetPagination(PageNumberPagination):
+class StandardResultsSetPagination(HybridPagination):
     page_size = 12
     page_size_query_param = 'page_size'
     max_page_size = 50
@@ -29,7 +30,7 @@ class ProviderListView(generics.ListAPIView):
     ordering = ['-average_rating', '-total_reviews']
     
     def get_queryset(self):
-        return Provider.objects.filter(status='approved').select_related('user').prefetch_related('media')
+        return Provider.objects.filter(status='approved').select_related('user').with_card_data()
 
 class ProviderDetailView(generics.RetrieveAPIView):
     """Get detailed provider information"""
@@ -115,39 +116,34 @@ class ProviderServiceDetailView(generics.RetrieveUpdateDestroyAPIView):
 @api_view(['GET'])
 def provider_categories(request):
     """Get all provider categories with counts"""
-    categories = Provider.objects.filter(status='approved').values('category').annotate(
-        count=Count('id'),
-        avg_rating=Avg('average_rating')
-    ).order_by('category')
+    facets = ProviderFacetService().facets()
     
     category_data = []
-    for cat in categories:
+    for category, facet in sorted(facets['category'].items()):
         category_info = {
-            'value': cat['category'],
-            'label': dict(Provider.CATEGORY_CHOICES).get(cat['category'], cat['category']),
-            'count': cat['count'],
-            'average_rating': round(cat['avg_rating'] or 0, 1)
+            'value': category,
+            'label': dict(Provider.CATEGORY_CHOICES).get(category, category),
+            'count': facet['count'],
+            'average_rating': round(facet['rating_sum'] / facet['count'], 1) if facet['count'] else 0
         }
         category_data.append(category_info)
     
     return Response({
         'categories': category_data,
-        'total_providers': Provider.objects.filter(status='approved').count()
+        'total_providers': facets['total']
     })
 
 @api_view(['GET'])
 def provider_districts(request):
     """Get all districts with provider counts"""
-    districts = Provider.objects.filter(status='approved').values('district').annotate(
-        count=Count('id')
-    ).order_by('district')
+    facets = ProviderFacetService().facets()
     
     district_data = []
-    for dist in districts:
+    for district, facet in sorted(facets['district'].items()):
         district_info = {
-            'value': dist['district'],
-            'label': dict(Provider.DISTRICT_CHOICES).get(dist['district'], dist['district']),
-            'count': dist['count']
+            'value': district,
+            'label': dict(Provider.DISTRICT_CHOICES).get(district, district),
+            'count': facet['count']
         }
         district_data.append(district_info)
     
@@ -210,7 +206,7 @@ def featured_providers(request):
     featured = Provider.objects.filter(
         status='approved',
         is_verified=True
-    ).order_by('-average_rating', '-total_reviews')[:6]
+    ).with_card_data().order_by('-average_rating', '-total_reviews')[:6]
     
     serializer = ProviderListSerializer(featured, many=True, context={'request': request})
     return Response({
@@ -220,26 +216,23 @@ def featured_providers(request):
 @api_view(['GET'])
 def provider_stats(request):
     """Get provider statistics for dashboard"""
+    facets = ProviderFacetService().facets()
     stats = {
-        'total_providers': Provider.objects.filter(status='approved').count(),
-        'verified_providers': Provider.objects.filter(status='approved', is_verified=True).count(),
-        'categories': Provider.objects.filter(status='approved').values_list('category', flat=True).distinct().count(),
-        'average_rating': Provider.objects.filter(status='approved').aggregate(
-            avg=Avg('average_rating')
-        )['avg'] or 0
+        'total_providers': facets['total'],
+        'verified_providers': facets['verified'],
+        'categories': len(facets['category']),
+        'average_rating': facets['rating_sum'] / facets['total'] if facets['total'] else 0
     }
     
     # Category breakdown
-    category_breakdown = Provider.objects.filter(status='approved').values('category').annotate(
-        count=Count('id')
-    ).order_by('-count')
+    category_breakdown = sorted(facets['category'].items(), key=lambda item: -item[1]['count'])
     
     stats['category_breakdown'] = [
         {
-            'category': dict(Provider.CATEGORY_CHOICES).get(item['category'], item['category']),
-            'count': item['count']
+            'category': dict(Provider.CATEGORY_CHOICES).get(category, category),
+            'count': facet['count']
         }
-        for item in category_breakdown
+        for category, facet in category_breakdown
     ]
     
     return Response(stats)
\ No newline at end of file
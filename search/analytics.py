@@ -0,0 +1,165 @@
+import atexit
+import logging
+import threading
+from collections import Counter, deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import Lower, Trim
+from django.utils import timezone
+
+from .indexes import suggestion_index
+from .models import SearchQuery, PopularSearch
+
+logger = logging.getLogger(__name__)
+
+MAX_TERM_LENGTH = 200
+MAX_QUERY_TEXT_LENGTH = SearchQuery._meta.get_field('query_text').max_length
+
+
+class SearchEventBuffer:
+    """Collects search events in memory and writes them with bulk_create off the request path.
+
+    A daemon thread flushes the buffer every flush_interval seconds, or sooner
+    once batch_size events are waiting. Whatever is left is flushed at exit.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, max_pending=None):
+        self.batch_size = batch_size or getattr(settings, 'SEARCH_EVENT_BATCH_SIZE', 50)
+        self.flush_interval = flush_interval or getattr(settings, 'SEARCH_EVENT_FLUSH_SECONDS', 5)
+        self.max_pending = max_pending or getattr(settings, 'SEARCH_EVENT_MAX_PENDING', 10000)
+        # Bounded: if the database is not keeping up, the oldest events are shed rather than memory
+        self._events = deque(maxlen=self.max_pending)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def record(self, **fields):
+        """Queue one SearchQuery row; never touches the database"""
+        # One oversized query would otherwise fail the bulk insert of its whole batch
+        if 'query_text' in fields:
+            fields['query_text'] = fields['query_text'][:MAX_QUERY_TEXT_LENGTH]
+        with self._lock:
+            self._events.append(SearchQuery(**fields))
+            pending = len(self._events)
+        self._start()
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def flush(self):
+        """Write all queued events; returns the number written"""
+        with self._lock:
+            events, self._events = list(self._events), deque(maxlen=self.max_pending)
+        if not events:
+            return 0
+        try:
+            SearchQuery.objects.bulk_create(events, batch_size=self.batch_size)
+        except Exception:
+            logger.exception('Dropped %d search events', len(events))
+            return 0
+        return len(events)
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='search-events', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+            # The flusher thread owns its connection; don't hold it between batches
+            connection.close()
+
+
+search_events = SearchEventBuffer()
+
+
+def _normalize_term(term):
+    return ' '.join(term.split())[:MAX_TERM_LENGTH]
+
+
+def _term_counts(queryset):
+    """Search counts grouped by case-folded query text"""
+    counts = Counter()
+    rows = queryset.annotate(
+        term=Lower(Trim('query_text'))
+    ).values('term').annotate(count=Count('id'))
+    for row in rows:
+        term = _normalize_term(row['term'])
+        if term:
+            counts[term] += row['count']
+    return counts
+
+
+def roll_up_search_queries(chunk_size=1000):
+    """Add unaggregated SearchQuery rows to PopularSearch.search_count; returns rows processed"""
+    processed = 0
+    while True:
+        ids = list(
+            SearchQuery.objects.filter(is_aggregated=False).order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return processed
+
+        chunk = SearchQuery.objects.filter(id__in=ids)
+        counts = _term_counts(chunk)
+        with transaction.atomic():
+            # Counted terms are lowercased, stored ones may not be; the oldest row of a term takes the count
+            existing = {}
+            matches = PopularSearch.objects.select_for_update().annotate(
+                key=Lower('term')
+            ).filter(key__in=list(counts)).order_by('id')
+            for popular in matches:
+                existing.setdefault(popular.key, popular)
+            now = timezone.now()
+            for term, popular in existing.items():
+                popular.search_count += counts[term]
+                popular.updated_at = now
+            PopularSearch.objects.bulk_update(existing.values(), ['search_count', 'updated_at'])
+            PopularSearch.objects.bulk_create([
+                PopularSearch(term=term, search_count=count)
+                for term, count in counts.items() if term not in existing
+            ])
+            chunk.update(is_aggregated=True)
+        processed += len(ids)
+
+
+def update_trending(window_hours=24, baseline_days=7, min_searches=5, growth=2.0):
+    """Flag terms searched far more in the last window than over the preceding baseline"""
+    now = timezone.now()
+    window_start = now - timedelta(hours=window_hours)
+    baseline_start = window_start - timedelta(days=baseline_days)
+
+    recent = _term_counts(SearchQuery.objects.filter(created_at__gte=window_start))
+    baseline = _term_counts(SearchQuery.objects.filter(
+        created_at__gte=baseline_start, created_at__lt=window_start
+    ))
+
+    windows_in_baseline = (baseline_days * 24) / window_hours
+    trending = [
+        term for term, count in recent.items()
+        if count >= min_searches and count >= growth * (baseline[term] / windows_in_baseline)
+    ]
+
+    popular = PopularSearch.objects.annotate(key=Lower('term'))
+    with transaction.atomic():
+        popular.filter(is_trending=True).exclude(key__in=trending).update(is_trending=False)
+        popular.filter(key__in=trending, is_trending=False).update(is_trending=True)
+    return trending
+
+
+def aggregate_search_stats(**trending_options):
+    """Periodic job: roll up new searches, then recompute trending flags"""
+    processed = roll_up_search_queries()
+    trending = update_trending(**trending_options)
+    # bulk updates skip signals, so reload the suggestion index explicitly
+    suggestion_index.invalidate()
+    return processed, trending
@@ -0,0 +1,406 @@
+from bisect import bisect_left
+from collections import defaultdict
+from functools import reduce
+from math import radians, cos, sin, asin, sqrt, floor
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q, Sum, Max, Case, When, Value, IntegerField, OuterRef, Subquery
+
+from common.indexes import VersionedIndex, tokenize
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = 111.0
+
+MAX_QUERY_TERMS = 8
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres"""
+    lat1, lng1, lat2, lng2 = map(radians, [lat1, lng1, lat2, lng2])
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlng / 2) ** 2
+    return 2 * asin(sqrt(a)) * EARTH_RADIUS_KM
+
+
+class ProviderGeoIndex(VersionedIndex):
+    """Uniform lat/lng grid over approved providers that have coordinates"""
+
+    version_key = 'search:geo-index:version'
+    cell_degrees = 0.05  # roughly 5.5 km per cell
+    provider_fields = ['status', 'latitude', 'longitude']
+
+    def __init__(self):
+        super().__init__()
+        self._cells = defaultdict(dict)
+        self._points = {}
+
+    def _cell(self, lat, lng):
+        return (floor(lat / self.cell_degrees), floor(lng / self.cell_degrees))
+
+    def load(self):
+        from providers.models import Provider
+
+        self._cells = defaultdict(dict)
+        self._points = {}
+        rows = Provider.objects.filter(
+            status='approved',
+            latitude__isnull=False,
+            longitude__isnull=False
+        ).values_list('id', 'latitude', 'longitude')
+        for provider_id, lat, lng in rows:
+            self._add(provider_id, float(lat), float(lng))
+
+    def _add(self, provider_id, lat, lng):
+        cell = self._cell(lat, lng)
+        self._cells[cell][provider_id] = (lat, lng)
+        self._points[provider_id] = cell
+
+    def _discard(self, provider_id):
+        cell = self._points.pop(provider_id, None)
+        if cell is not None:
+            bucket = self._cells.get(cell)
+            if bucket is not None:
+                bucket.pop(provider_id, None)
+                if not bucket:
+                    del self._cells[cell]
+
+    def update(self, provider):
+        """Insert, move or drop a provider after it was saved"""
+        with self._lock:
+            if self._loaded:
+                self._discard(provider.pk)
+                if (provider.status == 'approved' and provider.latitude is not None
+                        and provider.longitude is not None):
+                    self._add(provider.pk, float(provider.latitude), float(provider.longitude))
+        self.changed()
+
+    def remove(self, provider_id):
+        """Drop a deleted provider"""
+        with self._lock:
+            if self._loaded:
+                self._discard(provider_id)
+        self.changed()
+
+    def within(self, lat, lng, radius_km, limit=None):
+        """Providers within radius_km of a point as (id, distance_km), nearest first"""
+        self.ensure_fresh()
+        lat, lng = float(lat), float(lng)
+        lat_range = radius_km / KM_PER_DEGREE
+        # A degree of longitude is shortest at the edge of the circle farthest from the equator
+        widest_lat = min(abs(lat) + lat_range, 89.0)
+        lng_range = radius_km / (KM_PER_DEGREE * max(cos(radians(widest_lat)), 0.01))
+        min_row, min_col = self._cell(lat - lat_range, lng - lng_range)
+        max_row, max_col = self._cell(lat + lat_range, lng + lng_range)
+
+        hits = []
+        with self._lock:
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    bucket = self._cells.get((row, col))
+                    if not bucket:
+                        continue
+                    for provider_id, (p_lat, p_lng) in bucket.items():
+                        distance = haversine_km(lat, lng, p_lat, p_lng)
+                        if distance <= radius_km:
+                            hits.append((provider_id, round(distance, 2)))
+
+        hits.sort(key=lambda hit: (hit[1], hit[0]))
+        if limit is not None:
+            hits = hits[:limit]
+        return hits
+
+
+class ProviderTextIndex:
+    """Database-backed inverted index over provider names, descriptions and services"""
+
+    field_weights = {
+        'name': 3.0,
+        'service': 2.0,
+        'description': 1.0,
+    }
+    provider_fields = [
+        'business_name', 'business_name_si', 'business_name_ta',
+        'description', 'description_si', 'description_ta',
+    ]
+
+    def _terms(self, provider_id, field, texts, service_id=None):
+        from .models import ProviderSearchTerm
+
+        seen = set()
+        for text in texts:
+            for term in tokenize(text):
+                if term not in seen:
+                    seen.add(term)
+                    yield ProviderSearchTerm(
+                        provider_id=provider_id,
+                        service_id=service_id,
+                        term=term,
+                        field=field,
+                        weight=self.field_weights[field]
+                    )
+
+    def _provider_terms(self, provider):
+        yield from self._terms(provider.pk, 'name', [
+            provider.business_name, provider.business_name_si, provider.business_name_ta
+        ])
+        yield from self._terms(provider.pk, 'description', [
+            provider.description, provider.description_si, provider.description_ta
+        ])
+
+    def _service_terms(self, service):
+        return self._terms(service.provider_id, 'service', [
+            service.name, service.name_si, service.name_ta
+        ], service_id=service.pk)
+
+    def index_provider(self, provider):
+        """Replace the name and description terms of one provider"""
+        from .models import ProviderSearchTerm
+
+        with transaction.atomic():
+            ProviderSearchTerm.objects.filter(provider_id=provider.pk, service__isnull=True).delete()
+            ProviderSearchTerm.objects.bulk_create(self._provider_terms(provider))
+
+    def index_service(self, service):
+        """Replace the terms of one service; deleted services cascade on their own"""
+        from .models import ProviderSearchTerm
+
+        with transaction.atomic():
+            ProviderSearchTerm.objects.filter(service_id=service.pk).delete()
+            ProviderSearchTerm.objects.bulk_create(self._service_terms(service))
+
+    def rebuild(self, batch_size=500):
+        """Rebuild the whole index; returns the number of terms written"""
+        from providers.models import Provider, ProviderService
+        from .models import ProviderSearchTerm
+
+        written = 0
+        with transaction.atomic():
+            ProviderSearchTerm.objects.all().delete()
+            for provider in Provider.objects.all().iterator(chunk_size=batch_size):
+                written += len(ProviderSearchTerm.objects.bulk_create(
+                    self._provider_terms(provider), batch_size=batch_size
+                ))
+            for service in ProviderService.objects.all().iterator(chunk_size=batch_size):
+                written += len(ProviderSearchTerm.objects.bulk_create(
+                    self._service_terms(service), batch_size=batch_size
+                ))
+        return written
+
+    def search(self, queryset, text):
+        """Restrict a provider queryset to text matches and annotate text_rank.
+
+        Every query token must prefix-match at least one indexed term; the rank
+        is the summed weight of the matching terms.
+        """
+        from .models import ProviderSearchTerm
+
+        tokens = list(dict.fromkeys(tokenize(text)))[:MAX_QUERY_TERMS]
+        if not tokens:
+            # Text with no indexable words (only punctuation, say) matches nothing
+            return queryset.none()
+
+        matched_flags = {
+            f'matched_{position}': Max(Case(
+                When(term__startswith=token, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField()
+            ))
+            for position, token in enumerate(tokens)
+        }
+        matches = ProviderSearchTerm.objects.filter(
+            reduce(or_, [Q(term__startswith=token) for token in tokens])
+        ).values('provider').alias(**matched_flags).filter(
+            **{flag: 1 for flag in matched_flags}
+        ).annotate(text_rank=Sum('weight'))
+
+        return queryset.filter(
+            id__in=matches.values('provider')
+        ).annotate(
+            text_rank=Subquery(matches.filter(provider=OuterRef('pk')).values('text_rank')[:1])
+        )
+
+
+class SuggestionIndex(VersionedIndex):
+    """Sorted prefix index for type-ahead over provider names, categories and popular searches.
+
+    Every word position of a name gets its own key, so typing the start of any
+    word matches. Lookups are a bisect into the sorted keys.
+    """
+
+    version_key = 'search:suggestions:version'
+    payload_key = 'search:suggestions:payload'
+    type_order = {'provider': 0, 'category': 1, 'popular': 2}
+    provider_fields = ['status', 'business_name', 'business_name_si', 'business_name_ta']
+    max_providers = 5
+    scan_limit = 200
+
+    def __init__(self):
+        super().__init__()
+        self._keys = []
+        self._entries = []
+        self._owners = {}
+        self._popular = {}
+
+    @staticmethod
+    def _normalize(text):
+        return ' '.join(tokenize(text))
+
+    def _make_entries(self, owner, texts, kind, value=None, weight=0):
+        entries = []
+        for text in dict.fromkeys(t for t in texts if t):
+            words = tokenize(text)
+            for position in range(len(words)):
+                key = ' '.join(words[position:])
+                entries.append((key, self.type_order[kind], -weight, text, kind, value, owner))
+        return entries
+
+    def _insert(self, owner, entries):
+        self._discard(owner)
+        for entry in entries:
+            position = bisect_left(self._entries, entry)
+            self._entries.insert(position, entry)
+            self._keys.insert(position, entry[0])
+        if entries:
+            self._owners[owner] = entries
+
+    def _discard(self, owner):
+        for entry in self._owners.pop(owner, []):
+            position = bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                del self._entries[position]
+                del self._keys[position]
+
+    def _provider_entries(self, provider_id, status, names):
+        if status != 'approved':
+            return []
+        return self._make_entries(('provider', provider_id), names, 'provider')
+
+    def _popular_entries(self, popular_id, term, search_count):
+        return self._make_entries(('popular', popular_id), [term], 'popular', value=search_count,
+                                  weight=search_count)
+
+    def load(self):
+        from providers.models import Provider
+        from .models import PopularSearch
+
+        self._keys, self._entries, self._owners, self._popular = [], [], {}, {}
+        entries = []
+        for value, label in Provider.CATEGORY_CHOICES:
+            owner = ('category', value)
+            self._owners[owner] = self._make_entries(owner, [label], 'category', value=value)
+            entries.extend(self._owners[owner])
+        providers = Provider.objects.filter(status='approved').values_list(
+            'id', 'business_name', 'business_name_si', 'business_name_ta'
+        )
+        for provider_id, *names in providers:
+            owner = ('provider', provider_id)
+            self._owners[owner] = self._provider_entries(provider_id, 'approved', names)
+            entries.extend(self._owners[owner])
+        popular = PopularSearch.objects.values_list('id', 'term', 'search_count', 'is_trending')
+        for popular_id, term, search_count, is_trending in popular:
+            owner = ('popular', popular_id)
+            self._owners[owner] = self._popular_entries(popular_id, term, search_count)
+            entries.extend(self._owners[owner])
+            self._popular[popular_id] = (term, search_count, is_trending)
+
+        entries.sort()
+        self._entries = entries
+        self._keys = [entry[0] for entry in entries]
+
+    def export(self):
+        return {'entries': self._entries, 'popular': self._popular}
+
+    def restore(self, payload):
+        self._entries = list(payload['entries'])
+        self._keys = [entry[0] for entry in self._entries]
+        self._popular = dict(payload['popular'])
+        self._owners = {}
+        for entry in self._entries:
+            self._owners.setdefault(entry[6], []).append(entry)
+
+    def update_provider(self, provider):
+        """Re-index one provider's names after it was saved"""
+        with self._lock:
+            if self._loaded:
+                self._insert(('provider', provider.pk), self._provider_entries(provider.pk, provider.status, [
+                    provider.business_name, provider.business_name_si, provider.business_name_ta
+                ]))
+        self.changed()
+
+    def update_popular(self, popular):
+        """Re-index one popular search term after it was saved"""
+        with self._lock:
+            if self._loaded:
+                self._insert(('popular', popular.pk),
+                             self._popular_entries(popular.pk, popular.term, popular.search_count))
+                self._popular[popular.pk] = (popular.term, popular.search_count, popular.is_trending)
+        self.changed()
+
+    def remove(self, kind, object_id):
+        """Drop a deleted provider or popular search"""
+        with self._lock:
+            if self._loaded:
+                self._discard((kind, object_id))
+                if kind == 'popular':
+                    self._popular.pop(object_id, None)
+        self.changed()
+
+    def suggest(self, query, limit=10):
+        """Suggestions whose words start with the query, providers first"""
+        self.ensure_fresh()
+        prefix = self._normalize(query)
+        if not prefix:
+            return []
+
+        matches = []
+        with self._lock:
+            position = bisect_left(self._keys, prefix)
+            while (position < len(self._keys) and len(matches) < self.scan_limit
+                   and self._keys[position].startswith(prefix)):
+                matches.append(self._entries[position])
+                position += 1
+
+        suggestions = []
+        seen = set()
+        providers = 0
+        for _, _, _, text, kind, value, owner in sorted(matches, key=lambda entry: entry[1:4]):
+            if owner in seen:
+                continue
+            if kind == 'provider':
+                if providers >= self.max_providers:
+                    continue
+                providers += 1
+            seen.add(owner)
+            suggestion = {'text': text, 'type': kind}
+            if kind == 'category':
+                suggestion['value'] = value
+            elif kind == 'popular':
+                suggestion['count'] = value
+            suggestions.append(suggestion)
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+
+    def trending(self, limit=10):
+        """Trending popular searches, most searched first"""
+        self.ensure_fresh()
+        with self._lock:
+            trending = [(term, count) for term, count, is_trending in self._popular.values() if is_trending]
+        trending.sort(key=lambda item: (-item[1], item[0]))
+        return [{'text': term, 'type': 'popular', 'count': count} for term, count in trending[:limit]]
+
+
+provider_geo_index = ProviderGeoIndex()
+provider_text_index = ProviderTextIndex()
+suggestion_index = SuggestionIndex()
+
+
+def invalidate_provider_indexes():
+    """Reload in-memory provider indexes and cached facets after bulk updates that skip signals"""
+    from .services import ProviderFacetService
+
+    provider_geo_index.invalidate()
+    suggestion_index.invalidate()
+    ProviderFacetService.invalidate()
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from search.analytics import aggregate_search_stats
+
+
+class Command(BaseCommand):
+    help = 'Roll search queries into popular search counts and refresh trending terms'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window-hours', type=int, default=24,
+                            help='Recent window compared against the baseline')
+        parser.add_argument('--baseline-days', type=int, default=7,
+                            help='History preceding the window used as the baseline')
+        parser.add_argument('--min-searches', type=int, default=5,
+                            help='Minimum searches in the window to count as trending')
+
+    def handle(self, *args, **options):
+        processed, trending = aggregate_search_stats(
+            window_hours=options['window_hours'],
+            baseline_days=options['baseline_days'],
+            min_searches=options['min_searches'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Aggregated {processed} search queries; {len(trending)} trending terms'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from search.indexes import provider_text_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the provider full-text search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding provider search index...')
+        written = provider_text_index.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {written} search terms'))
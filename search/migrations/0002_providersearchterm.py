@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0003_add_fitness_models'),
+        ('search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100)),
+                ('field', models.CharField(choices=[('name', 'Business Name'), ('description', 'Description'), ('service', 'Service Name')], max_length=20)),
+                ('weight', models.FloatField(default=1.0)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='providers.provider')),
+                ('service', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='providers.providerservice')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'provider'], name='search_prov_term_73328b_idx')],
+            },
+        ),
+    ]
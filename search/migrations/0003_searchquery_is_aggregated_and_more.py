@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0002_providersearchterm'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchquery',
+            name='is_aggregated',
+            field=models.BooleanField(default=False, help_text='Rolled into PopularSearch counts'),
+        ),
+        migrations.AddIndex(
+            model_name='searchquery',
+            index=models.Index(fields=['is_aggregated', 'id'], name='search_sear_is_aggr_4ec796_idx'),
+        ),
+    ]
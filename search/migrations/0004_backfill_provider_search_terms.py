@@ -0,0 +1,65 @@
+import unicodedata
+
+from django.db import migrations
+
+ZERO_WIDTH_CHARACTERS = {'\u200c', '\u200d'}
+MAX_TERM_LENGTH = 100
+FIELD_WEIGHTS = {'name': 3.0, 'service': 2.0, 'description': 1.0}
+
+
+def tokenize(text):
+    # Frozen copy of common.indexes.tokenize()
+    tokens = []
+    current = []
+    for char in unicodedata.normalize('NFC', text or '').casefold():
+        if char in ZERO_WIDTH_CHARACTERS:
+            continue
+        if unicodedata.category(char)[0] in 'LMN':
+            current.append(char)
+        elif current:
+            tokens.append(''.join(current)[:MAX_TERM_LENGTH])
+            current = []
+    if current:
+        tokens.append(''.join(current)[:MAX_TERM_LENGTH])
+    return tokens
+
+
+def populate_search_terms(apps, schema_editor):
+    # Frozen copy of search.indexes.ProviderTextIndex.rebuild()
+    Provider = apps.get_model('providers', 'Provider')
+    ProviderService = apps.get_model('providers', 'ProviderService')
+    ProviderSearchTerm = apps.get_model('search', 'ProviderSearchTerm')
+
+    def terms(provider_id, field, texts, service_id=None):
+        seen = set()
+        for text in texts:
+            for term in tokenize(text):
+                if term not in seen:
+                    seen.add(term)
+                    yield ProviderSearchTerm(provider_id=provider_id, service_id=service_id, term=term,
+                                             field=field, weight=FIELD_WEIGHTS[field])
+
+    ProviderSearchTerm.objects.all().delete()
+    for provider in Provider.objects.all().iterator(chunk_size=500):
+        ProviderSearchTerm.objects.bulk_create(terms(provider.pk, 'name', [
+            provider.business_name, provider.business_name_si, provider.business_name_ta
+        ]), batch_size=500)
+        ProviderSearchTerm.objects.bulk_create(terms(provider.pk, 'description', [
+            provider.description, provider.description_si, provider.description_ta
+        ]), batch_size=500)
+    for service in ProviderService.objects.all().iterator(chunk_size=500):
+        ProviderSearchTerm.objects.bulk_create(terms(service.provider_id, 'service', [
+            service.name, service.name_si, service.name_ta
+        ], service_id=service.pk), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0007_keyset_indexes'),
+        ('search', '0003_searchquery_is_aggregated_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_search_terms, migrations.RunPython.noop),
+    ]
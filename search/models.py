@@ -12,6 +12,7 @@ class SearchQuery(models.Model):
     results_count = models.PositiveIntegerField(default=0)
     location_lat = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     location_lng = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    is_aggregated = models.BooleanField(default=False, help_text="Rolled into PopularSearch counts")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -19,6 +20,7 @@ class SearchQuery(models.Model):
         indexes = [
             models.Index(fields=['query_text']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['is_aggregated', 'id']),
         ]
     
     def __str__(self):
@@ -42,4 +44,28 @@ class PopularSearch(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.term} ({self.search_count} searches)"
\ No newline at end of file
+        return f"{self.term} ({self.search_count} searches)"
+
+class ProviderSearchTerm(models.Model):
+    """Inverted index entry: one normalized token from a provider's searchable text"""
+    
+    FIELD_CHOICES = [
+        ('name', 'Business Name'),
+        ('description', 'Description'),
+        ('service', 'Service Name'),
+    ]
+    
+    provider = models.ForeignKey('providers.Provider', on_delete=models.CASCADE, related_name='search_terms')
+    service = models.ForeignKey('providers.ProviderService', on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='search_terms')
+    term = models.CharField(max_length=100)
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES)
+    weight = models.FloatField(default=1.0)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'provider']),
+        ]
+    
+    def __str__(self):
+        return f"{self.term} -> {self.provider_id} ({self.field})"
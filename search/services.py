@@ -1,6 +1,37 @@
-from django.db.models import Q, F, Case, When, Value, FloatField, Count
+import hashlib
+import json
+import time
+from django.core.cache import cache
+from django.db.models import Case, When, Value, IntegerField, Count, Sum
 from math import radians, cos, sin, asin, sqrt
 from providers.models import Provider
+from .indexes import provider_geo_index, provider_text_index
+
+class ProviderSearchResults:
+    """Sliceable search results so pagination runs before any row is serialized"""
+    
+    def __init__(self, queryset, ranked=None):
+        self.queryset = queryset
+        self.ranked = ranked  # [(provider_id, distance)] when ordered by distance
+    
+    def count(self):
+        if self.ranked is not None:
+            return len(self.ranked)
+        return self.queryset.count()
+    
+    def __len__(self):
+        return self.count()
+    
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if self.ranked is None:
+            return list(self.queryset[index])
+        
+        # Only the requested slice of the distance ranking is loaded
+        page = self.ranked[index]
+        providers = self.queryset.in_bulk([provider_id for provider_id, _ in page])
+        return [providers[provider_id] for provider_id, _ in page if provider_id in providers]
 
 class ProviderSearchService:
     """Advanced search service for providers"""
@@ -8,7 +39,8 @@ class ProviderSearchService:
     def __init__(self):
         self.base_queryset = Provider.objects.filter(
             status='approved'
-        ).select_related('user').prefetch_related('media', 'services')
+        ).select_related('user').with_card_data()
+        self.distances = {}
     
     def search_providers(self, query_params, user_lat=None, user_lng=None):
         """Advanced provider search with multiple filters"""
@@ -17,13 +49,7 @@ class ProviderSearchService:
         # Text search
         search_query = query_params.get('q', '').strip()
         if search_query:
-            queryset = queryset.filter(
-                Q(business_name__icontains=search_query) |
-                Q(business_name_si__icontains=search_query) |
-                Q(business_name_ta__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(services__name__icontains=search_query)
-            ).distinct()
+            queryset = provider_text_index.search(queryset, search_query)
         
         # Category filter
         category = query_params.get('category')
@@ -67,28 +93,39 @@ class ProviderSearchService:
             queryset = queryset.order_by('-total_reviews', '-average_rating')
         elif sort_by == 'newest':
             queryset = queryset.order_by('-created_at')
-        else:  # relevance (default)
-            queryset = queryset.annotate(
-                relevance_score=Case(
-                    When(is_verified=True, then=Value(2.0)),
-                    default=Value(1.0),
-                    output_field=FloatField()
-                ) * F('average_rating')
-            ).order_by('-relevance_score', '-total_reviews')
+        else:  # relevance (default), text matches ranked by the index first
+            ordering = ['-search_score', '-id']
+            if 'text_rank' in queryset.query.annotations:
+                ordering.insert(0, '-text_rank')
+            queryset = queryset.order_by(*ordering)
         
         return queryset
     
+    def execute(self, query_params, user_lat=None, user_lng=None):
+        """Run a search and return lazily paged results"""
+        queryset = self.search_providers(query_params, user_lat, user_lng)
+        
+        if query_params.get('sort_by') == 'distance' and user_lat and user_lng:
+            return ProviderSearchResults(queryset, ranked=self.rank_by_distance(queryset))
+        return ProviderSearchResults(queryset)
+    
     def _filter_by_distance(self, queryset, user_lat, user_lng, radius_km):
-        """Filter providers within specified radius"""
-        lat_range = radius_km / 111.0  # Rough km per degree latitude
-        lng_range = radius_km / (111.0 * cos(radians(user_lat)))
-        
-        return queryset.filter(
-            latitude__isnull=False,
-            longitude__isnull=False,
-            latitude__range=[user_lat - lat_range, user_lat + lat_range],
-            longitude__range=[user_lng - lng_range, user_lng + lng_range]
-        )
+        """Filter providers within specified radius using the in-memory geo index"""
+        hits = provider_geo_index.within(user_lat, user_lng, radius_km)
+        self.distances = dict(hits)
+        return queryset.filter(id__in=list(self.distances))
+    
+    def rank_by_distance(self, queryset, limit=None):
+        """Order the providers matched by a radius search nearest first"""
+        matching = set(queryset.order_by().values_list('id', flat=True))
+        ranked = [
+            (provider_id, distance)
+            for provider_id, distance in sorted(self.distances.items(), key=lambda hit: (hit[1], hit[0]))
+            if provider_id in matching
+        ]
+        if limit is not None:
+            ranked = ranked[:limit]
+        return ranked
     
     def calculate_distance(self, provider_lat, provider_lng, user_lat, user_lng):
         """Calculate distance using Haversine formula"""
@@ -105,5 +142,141 @@ class ProviderSearchService:
         
         return round(c * 6371, 2)  # Earth's radius in km
 
-
-
+class ProviderFacetService:
+    """Facet counts for approved providers from one grouped query, cached per provider version.
+    
+    Providers are counted once per (category, district, is_verified, rating
+    bucket) cell; every facet is summed from those cells in Python. Filters on
+    the cube dimensions are applied disjunctively: a facet's counts honour every
+    active filter except its own, so the other options of a facet stay visible.
+    Any other search filter narrows the providers the cube is built from.
+    """
+    
+    version_key = 'search:facets:version'
+    cache_timeout = 60 * 60
+    # Rating thresholds offered as filters, in tenths of a star
+    rating_buckets = (45, 40, 35, 30)
+    cube_params = ('category', 'district', 'verified_only', 'min_rating')
+    narrowing_params = ('q', 'city', 'lat', 'lng', 'radius', 'online_booking', 'min_rating')
+    
+    def facets(self, query_params=None):
+        """Facet counts conditioned on the search filters in query_params"""
+        query_params = query_params or {}
+        selected, narrowing = self._split_filters(query_params)
+        cells = self._cells(narrowing)
+        # Options are listed from the unfiltered cube so they don't vanish when a filter excludes them
+        all_cells = cells if not narrowing else self._cells({})
+        
+        matching = [cell for cell in cells if self._matches(cell, selected)]
+        facets = {
+            'total': sum(cell['count'] for cell in matching),
+            'verified': sum(
+                cell['count'] for cell in cells
+                if cell['is_verified'] and self._matches(cell, selected, skip='verified_only')
+            ),
+            'rating_sum': sum(cell['rating_sum'] for cell in matching),
+        }
+        for field in ('category', 'district'):
+            counts = {cell[field]: {'count': 0, 'rating_sum': 0.0} for cell in all_cells}
+            for cell in cells:
+                if self._matches(cell, selected, skip=field):
+                    counts[cell[field]]['count'] += cell['count']
+                    counts[cell[field]]['rating_sum'] += cell['rating_sum']
+            facets[field] = counts
+        
+        rating_cells = [cell for cell in cells if self._matches(cell, selected, skip='min_rating')]
+        facets['rating'] = {
+            bucket / 10: sum(cell['count'] for cell in rating_cells if cell['rating_bucket'] >= bucket)
+            for bucket in self.rating_buckets
+        }
+        return facets
+    
+    def _split_filters(self, query_params):
+        """Separate filters answered from the cube from those that narrow the base queryset"""
+        selected = {}
+        narrowing = {}
+        for key in query_params:
+            value = query_params.get(key)
+            if not value or key not in self.cube_params + self.narrowing_params:
+                continue
+            if key == 'min_rating':
+                try:
+                    bucket = round(float(value) * 10)
+                except ValueError:
+                    continue
+                if bucket in self.rating_buckets:
+                    selected[key] = bucket
+                    continue
+            elif key == 'verified_only':
+                if value.lower() == 'true':
+                    selected[key] = True
+                continue
+            elif key in self.cube_params:
+                selected[key] = value
+                continue
+            narrowing[key] = value
+        return selected, narrowing
+    
+    def _matches(self, cell, selected, skip=None):
+        for key, value in selected.items():
+            if key == skip:
+                continue
+            if key == 'verified_only':
+                if not cell['is_verified']:
+                    return False
+            elif key == 'min_rating':
+                if cell['rating_bucket'] < value:
+                    return False
+            elif cell[key] != value:
+                return False
+        return True
+    
+    def _cells(self, narrowing):
+        key = self._cache_key(narrowing)
+        cells = cache.get(key)
+        if cells is None:
+            cells = self._compute_cells(narrowing)
+            cache.set(key, cells, self.cache_timeout)
+        return cells
+    
+    def _compute_cells(self, narrowing):
+        """The single GROUP BY query behind every facet"""
+        if narrowing:
+            try:
+                user_lat = float(narrowing['lat']) if 'lat' in narrowing else None
+                user_lng = float(narrowing['lng']) if 'lng' in narrowing else None
+            except ValueError:
+                user_lat = user_lng = None
+            matches = ProviderSearchService().search_providers(narrowing, user_lat, user_lng)
+            queryset = Provider.objects.filter(id__in=matches.order_by().values('id'))
+        else:
+            queryset = Provider.objects.filter(status='approved')
+        
+        rating_bucket = Case(
+            *[When(average_rating__gte=bucket / 10, then=Value(bucket)) for bucket in self.rating_buckets],
+            default=Value(0),
+            output_field=IntegerField()
+        )
+        rows = queryset.annotate(rating_bucket=rating_bucket).values(
+            'category', 'district', 'is_verified', 'rating_bucket'
+        ).annotate(
+            count=Count('id'),
+            rating_sum=Sum('average_rating')
+        ).order_by()
+        return [dict(row, rating_sum=float(row['rating_sum'] or 0)) for row in rows]
+    
+    def _cache_key(self, narrowing):
+        cache.add(self.version_key, 0, timeout=None)
+        version = cache.get(self.version_key)
+        digest = hashlib.md5(json.dumps(narrowing, sort_keys=True).encode()).hexdigest()
+        return f'search:facets:{version}:{digest}'
+    
+    @classmethod
+    def invalidate(cls):
+        """Drop cached facets for every filter combination"""
+        cache.add(cls.version_key, 0, timeout=None)
+        try:
+            cache.incr(cls.version_key)
+        except ValueError:
+            # Version evicted between add() and incr(); restart from a value old keys never used
+            cache.set(cls.version_key, time.time_ns(), timeout=None)
@@ -0,0 +1,80 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from providers.models import Provider, ProviderService
+from .indexes import provider_geo_index, provider_text_index, suggestion_index
+from .models import PopularSearch
+from .services import ProviderFacetService
+
+
+@receiver(pre_save, sender=Provider)
+def remember_indexed_fields(sender, instance, **kwargs):
+    """Keep the stored values of indexed fields, so post_save can skip indexes a save didn't affect"""
+    stored = None
+    if instance.pk is not None:
+        stored = Provider.objects.filter(pk=instance.pk).values(*dict.fromkeys([
+            *provider_text_index.provider_fields, *provider_geo_index.provider_fields,
+            *suggestion_index.provider_fields,
+        ])).first()
+    instance._stored_indexed_fields = stored
+
+
+def fields_changed(instance, fields):
+    stored = getattr(instance, '_stored_indexed_fields', None)
+    return stored is None or any(stored[field] != getattr(instance, field) for field in fields)
+
+
+@receiver(post_save, sender=Provider)
+def index_provider(sender, instance, created, **kwargs):
+    """Keep search indexes in step with provider changes.
+
+    The term rows commit or roll back with the provider; in-memory indexes and
+    cached facets change only once it commits, so a rollback never leaves
+    them (or other workers) seeing a provider that was never saved.
+    """
+    if created or fields_changed(instance, provider_geo_index.provider_fields):
+        # Each update bumps the shared version and makes every worker reload the grid
+        transaction.on_commit(partial(provider_geo_index.update, instance))
+    if created or fields_changed(instance, provider_text_index.provider_fields):
+        provider_text_index.index_provider(instance)
+    if created or fields_changed(instance, suggestion_index.provider_fields):
+        # Counter and score saves leave names and status alone; republishing the payload is not free
+        transaction.on_commit(partial(suggestion_index.update_provider, instance))
+    transaction.on_commit(ProviderFacetService.invalidate)
+
+
+@receiver(post_delete, sender=Provider)
+def unindex_provider(sender, instance, **kwargs):
+    """Remove a deleted provider from in-memory search indexes"""
+    # The collector clears instance.pk once the delete is done
+    transaction.on_commit(partial(provider_geo_index.remove, instance.pk))
+    transaction.on_commit(partial(suggestion_index.remove, 'provider', instance.pk))
+    transaction.on_commit(ProviderFacetService.invalidate)
+
+
+@receiver(post_save, sender=ProviderService)
+def index_provider_service(sender, instance, **kwargs):
+    """Refresh the text index terms of a saved service"""
+    provider_text_index.index_service(instance)
+    # Facets narrowed by a search query count providers through their service terms
+    transaction.on_commit(ProviderFacetService.invalidate)
+
+
+@receiver(post_delete, sender=ProviderService)
+def unindex_provider_service(sender, instance, **kwargs):
+    """A deleted service's terms cascade away; cached facets may still count its provider"""
+    transaction.on_commit(ProviderFacetService.invalidate)
+
+
+@receiver(post_save, sender=PopularSearch)
+def index_popular_search(sender, instance, **kwargs):
+    """Keep type-ahead suggestions in step with popular search terms"""
+    transaction.on_commit(lambda: suggestion_index.update_popular(instance))
+
+
+@receiver(post_delete, sender=PopularSearch)
+def unindex_popular_search(sender, instance, **kwargs):
+    """Remove a deleted popular search from type-ahead suggestions"""
+    transaction.on_commit(partial(suggestion_index.remove, 'popular', instance.pk))
@@ -1,3 +1,358 @@
+import re
+from datetime import timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from common.indexes import tokenize
+from providers.models import Provider
+from providers.tests import create_provider
+from .analytics import SearchEventBuffer, roll_up_search_queries, update_trending
+from .indexes import provider_geo_index, provider_text_index, suggestion_index, invalidate_provider_indexes
+from .models import PopularSearch, ProviderSearchTerm, SearchQuery
+from .services import ProviderFacetService, ProviderSearchService
 
-# Create your tests here.
+
+class ProviderSearchQueryCountTests(TestCase):
+    """Search must run a constant number of queries per page"""
+    
+    def setUp(self):
+        provider_geo_index.invalidate()
+    
+    def count_queries(self, params):
+        provider_geo_index.ensure_fresh()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('search:provider-search'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(context), response
+    
+    def assert_constant_queries(self, params):
+        create_provider('first')
+        create_provider('second')
+        baseline, _ = self.count_queries(params)
+        for index in range(5):
+            create_provider(f'extra{index}')
+        queries, response = self.count_queries(params)
+        self.assertEqual(queries, baseline)
+        return response
+    
+    def test_default_search(self):
+        response = self.assert_constant_queries({})
+        self.assertEqual(response.json()['count'], 7)
+        self.assertEqual(response.json()['results'][0]['starting_price'], 900.0)
+    
+    def test_distance_search(self):
+        response = self.assert_constant_queries({'lat': 6.9, 'lng': 79.85, 'sort_by': 'distance'})
+        self.assertEqual(response.json()['results'][0]['distance'], 0.0)
+
+
+class ProviderSearchPagingTests(TestCase):
+    """Distance-sorted pages load only their own providers, however deep the page"""
+    
+    def setUp(self):
+        # p0 sits at the search point and each next provider about 1.1 km further north
+        self.providers = [
+            create_provider(f'p{index}', latitude=Decimal('6.900000') + Decimal('0.010000') * index)
+            for index in range(7)
+        ]
+        provider_geo_index.invalidate()
+        provider_geo_index.ensure_fresh()
+    
+    def test_slices_load_only_the_requested_providers(self):
+        results = ProviderSearchService().execute({'sort_by': 'distance'}, 6.9, 79.85)
+        self.assertEqual(results.count(), 7)
+        with CaptureQueriesContext(connection) as context:
+            page = results[2:4]
+        self.assertEqual([provider.business_name for provider in page], ['p2', 'p3'])
+        # The last id filter on the provider query is the page itself
+        id_filters = re.findall(r'"providers_provider"\."id" IN \(([\d, ]+)\)', context.captured_queries[0]['sql'])
+        loaded = id_filters[-1]
+        self.assertEqual({int(provider_id) for provider_id in loaded.split(',')}, {page[0].pk, page[1].pk})
+    
+    def test_query_count_does_not_grow_with_the_page_number(self):
+        url = reverse('search:provider-search')
+        params = {'lat': 6.9, 'lng': 79.85, 'sort_by': 'distance', 'page_size': 2}
+        counts = []
+        for page in (1, 2, 3, 4):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, dict(params, page=page))
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(context))
+            names = [provider['business_name'] for provider in response.json()['results']]
+            self.assertEqual(names, [f'p{index}' for index in range(2 * page - 2, min(2 * page, 7))])
+        self.assertEqual(len(set(counts)), 1)
+
+
+class ProviderGeoIndexTests(TestCase):
+    """Radius lookups over the grid, and the signals that keep it current"""
+    
+    def setUp(self):
+        # One provider on each side of the cell boundary at longitude 79.85
+        self.west = create_provider('west', latitude=Decimal('6.920000'), longitude=Decimal('79.849900'))
+        self.east = create_provider('east', latitude=Decimal('6.920000'), longitude=Decimal('79.850100'))
+        # 9.996 km and 10.018 km north of the west provider
+        create_provider('inside', latitude=Decimal('7.009900'), longitude=Decimal('79.849900'))
+        create_provider('outside', latitude=Decimal('7.010100'), longitude=Decimal('79.849900'))
+        create_provider('unlisted', latitude=Decimal('6.920000'), longitude=Decimal('79.849900'), status='pending')
+        create_provider('unmapped', latitude=None, longitude=None)
+        provider_geo_index.invalidate()
+    
+    def names(self, hits):
+        return [Provider.objects.get(pk=provider_id).business_name for provider_id, _ in hits]
+    
+    def test_neighbouring_cells_are_searched(self):
+        self.assertNotEqual(provider_geo_index._cell(6.92, 79.8499), provider_geo_index._cell(6.92, 79.8501))
+        self.assertEqual(self.names(provider_geo_index.within(6.92, 79.8499, 0.05)), ['west', 'east'])
+        self.assertEqual(self.names(provider_geo_index.within(6.92, 79.8501, 0.05)), ['east', 'west'])
+    
+    def test_radius_boundary_is_inclusive_and_exact(self):
+        hits = provider_geo_index.within(6.92, 79.8499, 10)
+        self.assertEqual(self.names(hits), ['west', 'east', 'inside'])
+        self.assertEqual(hits[2][1], 10.0)
+        self.assertEqual(len(provider_geo_index.within(6.92, 79.8499, 11)), 4)
+        self.assertEqual(self.names(provider_geo_index.within(6.92, 79.8499, 11, limit=1)), ['west'])
+    
+    def test_removal_applies_on_commit(self):
+        provider_geo_index.ensure_fresh()
+        self.east.status = 'suspended'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.east.save()
+        self.assertEqual(self.names(provider_geo_index.within(6.92, 79.8499, 1)), ['west'])
+        
+        with self.captureOnCommitCallbacks() as callbacks:
+            west_id = self.west.pk
+            self.west.delete()
+        self.assertEqual([provider_id for provider_id, _ in provider_geo_index.within(6.92, 79.8499, 1)], [west_id])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(provider_geo_index.within(6.92, 79.8499, 1), [])
+    
+    def test_unrelated_changes_keep_the_version(self):
+        provider_geo_index.ensure_fresh()
+        version = cache.get(provider_geo_index.version_key)
+        self.west.average_rating = Decimal('4.5')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.west.save()
+        self.assertEqual(cache.get(provider_geo_index.version_key), version)
+        
+        self.west.latitude = Decimal('6.930000')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.west.save()
+        self.assertNotEqual(cache.get(provider_geo_index.version_key), version)
+        self.assertEqual(provider_geo_index.within(6.93, 79.8499, 0.01)[0][0], self.west.pk)
+
+
+class ProviderTextIndexTests(TestCase):
+    """Text search goes through the inverted term index in every language"""
+    
+    def setUp(self):
+        self.yoga = create_provider(
+            'yoga_colombo', business_name_si='යෝගා මධ්\u200dයස්ථානය', business_name_ta='யோகா மையம்'
+        )
+        self.gym = create_provider('iron_gym', description='iron gym with yoga classes')
+    
+    def search(self, text):
+        queryset = provider_text_index.search(Provider.objects.all(), text)
+        return {provider.business_name: provider.text_rank for provider in queryset}
+    
+    def test_tokenize_keeps_vowel_signs_and_drops_joiners(self):
+        self.assertEqual(tokenize('යෝගා පන්තිය'), ['යෝගා', 'පන්තිය'])
+        self.assertEqual(tokenize('யோகா, வகுப்பு!'), ['யோகா', 'வகுப்பு'])
+        self.assertEqual(tokenize('ශ්\u200dරී ලංකා'), ['ශ්රී', 'ලංකා'])
+        self.assertEqual(tokenize('Yoga_Colombo'), ['yoga', 'colombo'])
+    
+    def test_prefixes_match_in_every_language(self):
+        self.assertEqual(set(self.search('යෝග')), {'yoga_colombo'})
+        self.assertEqual(set(self.search('மைய')), {'yoga_colombo'})
+        self.assertEqual(set(self.search('මධ්යස්ථ')), {'yoga_colombo'})
+    
+    def test_every_token_must_match(self):
+        self.assertEqual(set(self.search('yoga')), {'yoga_colombo', 'iron_gym'})
+        self.assertEqual(set(self.search('yoga iron')), {'iron_gym'})
+        self.assertEqual(self.search('yoga kandy'), {})
+    
+    def test_name_matches_outrank_description_matches(self):
+        ranks = self.search('yoga')
+        self.assertGreater(ranks['yoga_colombo'], ranks['iron_gym'])
+    
+    def test_text_without_words_matches_nothing(self):
+        self.assertEqual(self.search('?!  --'), {})
+    
+    def test_saving_without_text_changes_keeps_terms(self):
+        terms = set(ProviderSearchTerm.objects.filter(provider=self.gym).values_list('pk', flat=True))
+        self.gym.average_rating = Decimal('4.5')
+        self.gym.save()
+        self.assertEqual(set(ProviderSearchTerm.objects.filter(provider=self.gym).values_list('pk', flat=True)), terms)
+        self.gym.description = 'iron gym with pilates classes'
+        self.gym.save()
+        self.assertEqual(set(self.search('pilates')), {'iron_gym'})
+        self.assertEqual(set(self.search('yoga')), {'yoga_colombo'})
+
+
+class SuggestionIndexTests(TestCase):
+    """Type-ahead comes from the in-memory prefix index and changes only on commit"""
+    
+    def setUp(self):
+        self.lotus = create_provider('Lotus Yoga House')
+        create_provider('Kandy Yoga Hall', status='pending')
+        PopularSearch.objects.create(term='yoga classes', search_count=12, is_trending=True)
+        PopularSearch.objects.create(term='yoga mats', search_count=3)
+        suggestion_index.invalidate()
+    
+    def test_any_word_prefix_matches_in_type_order(self):
+        self.assertEqual(suggestion_index.suggest('YOG'), [
+            {'text': 'Lotus Yoga House', 'type': 'provider'},
+            {'text': 'Yoga Studios', 'type': 'category', 'value': 'yoga'},
+            {'text': 'yoga classes', 'type': 'popular', 'count': 12},
+            {'text': 'yoga mats', 'type': 'popular', 'count': 3},
+        ])
+        self.assertEqual(suggestion_index.suggest('hou'), [{'text': 'Lotus Yoga House', 'type': 'provider'}])
+        self.assertEqual(suggestion_index.suggest('  '), [])
+    
+    def test_changes_apply_on_commit(self):
+        suggestion_index.ensure_fresh()
+        self.lotus.business_name = 'Lotus Pilates House'
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.lotus.save()
+        self.assertEqual(suggestion_index.suggest('pil'), [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(suggestion_index.suggest('pil'), [{'text': 'Lotus Pilates House', 'type': 'provider'}])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lotus.delete()
+            PopularSearch.objects.filter(term='yoga mats').delete()
+        self.assertEqual(suggestion_index.suggest('pil'), [])
+        self.assertEqual([item['text'] for item in suggestion_index.suggest('yoga')], ['Yoga Studios', 'yoga classes'])
+    
+    def test_saves_that_keep_names_and_status_keep_the_version(self):
+        suggestion_index.ensure_fresh()
+        version = cache.get(suggestion_index.version_key)
+        self.lotus.average_rating = Decimal('4.8')
+        self.lotus.search_score = 9.5
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lotus.save()
+        self.assertEqual(cache.get(suggestion_index.version_key), version)
+        
+        self.lotus.status = 'suspended'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lotus.save()
+        self.assertNotEqual(cache.get(suggestion_index.version_key), version)
+        self.assertEqual(suggestion_index.suggest('lotus'), [])
+    
+    def test_endpoint_serves_from_memory(self):
+        url = reverse('search:search-suggestions')
+        self.client.get(url, {'q': 'yo'})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'q': 'yo'})
+        self.assertEqual(len(context), 0)
+        self.assertEqual(len(response.data['suggestions']), 4)
+        self.assertEqual(response.data['popular_searches'], [{'text': 'yoga classes', 'type': 'popular', 'count': 12}])
+        self.assertEqual(self.client.get(url).data['suggestions'], [])
+
+
+class ProviderFacetTests(TestCase):
+    """Facet counts come from one cached query and honour the other filters"""
+    
+    def setUp(self):
+        ProviderFacetService.invalidate()
+        create_provider('gym_colombo', average_rating=Decimal('4.6'))
+        create_provider('gym_kandy', district='kandy', average_rating=Decimal('3.2'))
+        create_provider('spa_colombo', category='spa', is_verified=False, average_rating=Decimal('4.1'))
+    
+    def test_facets_are_cached(self):
+        url = reverse('search:search-filters')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(len(context), 0)
+        categories = {item['value']: item['count'] for item in response.json()['categories']}
+        self.assertEqual(categories, {'gym': 2, 'spa': 1})
+    
+    def test_facets_are_disjunctive(self):
+        facets = ProviderFacetService().facets({'category': 'gym', 'district': 'colombo'})
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual(facets['category']['gym']['count'], 1)
+        self.assertEqual(facets['category']['spa']['count'], 1)
+        self.assertEqual(facets['district']['kandy']['count'], 1)
+        self.assertEqual(facets['rating'][4.5], 1)
+    
+    def test_search_filters_narrow_the_cube(self):
+        facets = ProviderFacetService().facets({'q': 'kandy', 'min_rating': '3.2'})
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual(facets['category']['spa']['count'], 0)
+    
+    def test_status_change_invalidates(self):
+        self.assertEqual(ProviderFacetService().facets()['total'], 3)
+        Provider.objects.filter(business_name='spa_colombo').update(status='suspended')
+        self.assertEqual(ProviderFacetService().facets()['total'], 3)
+        invalidate_provider_indexes()
+        self.assertEqual(ProviderFacetService().facets()['total'], 2)
+    
+    def test_service_changes_invalidate(self):
+        service = Provider.objects.get(business_name='gym_colombo').services.first()
+        self.assertEqual(ProviderFacetService().facets({'q': 'pilates'})['total'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            service.name = 'Pilates'
+            service.save()
+        self.assertEqual(ProviderFacetService().facets({'q': 'pilates'})['total'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            service.delete()
+        self.assertEqual(ProviderFacetService().facets({'q': 'pilates'})['total'], 0)
+
+
+class SearchAnalyticsTests(TestCase):
+    """Search events are buffered, rolled up case-insensitively and flagged as trending"""
+    
+    def search(self, text, count=1, hours_ago=0):
+        events = SearchQuery.objects.bulk_create([SearchQuery(query_text=text) for _ in range(count)])
+        if hours_ago:
+            SearchQuery.objects.filter(pk__in=[event.pk for event in events]).update(
+                created_at=timezone.now() - timedelta(hours=hours_ago)
+            )
+    
+    def test_buffer_writes_in_batches_and_sheds_the_oldest(self):
+        buffer = SearchEventBuffer(batch_size=100, flush_interval=3600, max_pending=3)
+        with CaptureQueriesContext(connection) as context:
+            for index in range(5):
+                buffer.record(query_text=f'term {index}')
+        self.assertEqual(len(context), 0)
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(
+            sorted(SearchQuery.objects.values_list('query_text', flat=True)), ['term 2', 'term 3', 'term 4']
+        )
+        self.assertEqual(buffer.flush(), 0)
+    
+    def test_oversized_queries_are_truncated(self):
+        buffer = SearchEventBuffer(batch_size=100, flush_interval=3600)
+        buffer.record(query_text='yoga')
+        buffer.record(query_text='x' * 600)
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(
+            sorted(len(text) for text in SearchQuery.objects.values_list('query_text', flat=True)), [4, 500]
+        )
+    
+    def test_rollup_merges_case_and_whitespace_variants(self):
+        PopularSearch.objects.create(term='Yoga', search_count=1)
+        self.search('yoga ')
+        self.search('YOGA')
+        self.search('  Pilates', count=2)
+        self.assertEqual(roll_up_search_queries(chunk_size=2), 4)
+        self.assertEqual(
+            sorted(PopularSearch.objects.values_list('term', 'search_count')), [('Yoga', 3), ('pilates', 2)]
+        )
+        self.assertEqual(roll_up_search_queries(), 0)
+    
+    def test_trending_compares_the_window_with_the_baseline(self):
+        PopularSearch.objects.create(term='Yoga', search_count=10)
+        PopularSearch.objects.create(term='gym', search_count=10, is_trending=True)
+        self.search('yoga', count=6)
+        self.search('gym', count=6)
+        self.search('gym', count=70, hours_ago=48)
+        self.assertEqual(update_trending(min_searches=5), ['yoga'])
+        self.assertEqual(
+            list(PopularSearch.objects.filter(is_trending=True).values_list('term', flat=True)), ['Yoga']
+        )
@@ -3,11 +3,11 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
-from django.db.models import Count
 from providers.models import Provider
 from providers.serializers import ProviderSearchSerializer
-from .models import SearchQuery, PopularSearch
-from .services import ProviderSearchService
+from .analytics import search_events
+from .services import ProviderSearchService, ProviderFacetService
+from .indexes import suggestion_index
 
 class SearchResultsPagination(PageNumberPagination):
     page_size = 20
@@ -27,48 +27,34 @@ def provider_search(request):
         if user_lng:
             user_lng = float(user_lng)
         
-        # Perform search
+        # Perform search; filtering, ordering and paging all happen before serialization
         search_service = ProviderSearchService()
-        queryset = search_service.search_providers(request.GET, user_lat, user_lng)
-        
-        # Calculate distances and serialize
-        providers = []
-        for provider in queryset:
-            provider_data = ProviderSearchSerializer(provider, context={'request': request}).data
-            
-            if user_lat and user_lng and provider.latitude and provider.longitude:
-                distance = search_service.calculate_distance(
-                    provider.latitude, provider.longitude, user_lat, user_lng
-                )
-                provider_data['distance'] = distance
-            
-            providers.append(provider_data)
+        results = search_service.execute(request.GET, user_lat, user_lng)
         
-        # Sort by distance if requested
-        sort_by = request.GET.get('sort_by')
-        if sort_by == 'distance' and user_lat and user_lng:
-            providers = sorted(providers, key=lambda x: x.get('distance') or float('inf'))
-        
-        # Pagination
         paginator = SearchResultsPagination()
-        page = paginator.paginate_queryset(providers, request)
+        page = paginator.paginate_queryset(results, request)
+        
+        providers = ProviderSearchSerializer(page, many=True, context={'request': request}).data
+        for provider, provider_data in zip(page, providers):
+            if provider.id in search_service.distances:
+                provider_data['distance'] = search_service.distances[provider.id]
         
-        # Log search query
+        # Log search query; buffered and written in batches off the request path
         if request.GET.get('q'):
-            SearchQuery.objects.create(
-                user=request.user if request.user.is_authenticated else None,
+            search_events.record(
+                user_id=request.user.id if request.user.is_authenticated else None,
                 query_text=request.GET.get('q', ''),
                 filters_applied={
                     'category': request.GET.get('category'),
                     'district': request.GET.get('district'),
                     'min_rating': request.GET.get('min_rating'),
                 },
-                results_count=len(providers),
+                results_count=paginator.page.paginator.count,
                 location_lat=user_lat,
                 location_lng=user_lng
             )
         
-        return paginator.get_paginated_response(page)
+        return paginator.get_paginated_response(providers)
     
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -77,17 +63,30 @@ def provider_search(request):
 def provider_map_view(request):
     """Get providers for map display"""
     try:
+        user_lat = request.GET.get('lat')
+        user_lng = request.GET.get('lng')
+        if user_lat:
+            user_lat = float(user_lat)
+        if user_lng:
+            user_lng = float(user_lng)
+        
         search_service = ProviderSearchService()
-        queryset = search_service.search_providers(request.GET)
+        queryset = search_service.search_providers(request.GET, user_lat, user_lng)
         
-        queryset = queryset.filter(
-            latitude__isnull=False,
-            longitude__isnull=False
-        )[:100]
+        if user_lat and user_lng:
+            # Nearest 100 straight from the geo index
+            ranked = search_service.rank_by_distance(queryset, limit=100)
+            providers_by_id = queryset.in_bulk([provider_id for provider_id, _ in ranked])
+            queryset = [providers_by_id[provider_id] for provider_id, _ in ranked]
+        else:
+            queryset = queryset.filter(
+                latitude__isnull=False,
+                longitude__isnull=False
+            )[:100]
         
         map_data = []
         for provider in queryset:
-            featured_media = provider.media.filter(is_featured=True).first()
+            featured_media = provider.get_featured_media()
             map_data.append({
                 'id': provider.id,
                 'slug': provider.slug,
@@ -98,7 +97,8 @@ def provider_map_view(request):
                 'rating': float(provider.average_rating),
                 'reviews': provider.total_reviews,
                 'verified': provider.is_verified,
-                'image': featured_media.image.url if featured_media else None
+                'image': featured_media.image.url if featured_media and featured_media.image else None,
+                'distance': search_service.distances.get(provider.id)
             })
         
         return Response({
@@ -113,36 +113,10 @@ def provider_map_view(request):
 def search_suggestions(request):
     """Get search suggestions"""
     query = request.GET.get('q', '').strip()
-    suggestions = []
     
-    if query:
-        # Provider name suggestions
-        provider_suggestions = Provider.objects.filter(
-            status='approved',
-            business_name__icontains=query
-        ).values_list('business_name', flat=True)[:5]
-        
-        suggestions.extend([
-            {'text': name, 'type': 'provider'} 
-            for name in provider_suggestions
-        ])
-        
-        # Category suggestions
-        category_matches = [
-            (value, label) for value, label in Provider.CATEGORY_CHOICES 
-            if query.lower() in label.lower()
-        ]
-        suggestions.extend([
-            {'text': label, 'type': 'category', 'value': value}
-            for value, label in category_matches
-        ])
-    
-    # Popular searches
-    popular = PopularSearch.objects.filter(is_trending=True)[:10]
-    popular_searches = [
-        {'text': p.term, 'type': 'popular', 'count': p.search_count}
-        for p in popular
-    ]
+    # Served from the in-memory prefix index; no database work per keystroke
+    suggestions = suggestion_index.suggest(query, limit=10) if query else []
+    popular_searches = suggestion_index.trending(limit=10)
     
     return Response({
         'suggestions': suggestions[:10],
@@ -151,42 +125,34 @@ def search_suggestions(request):
 
 @api_view(['GET'])
 def search_filters(request):
-    """Get available search filters"""
-    # Categories with counts
-    categories = Provider.objects.filter(status='approved').values('category').annotate(
-        count=Count('id')
-    ).order_by('category')
+    """Get available search filters, with counts conditioned on the current filters"""
+    facets = ProviderFacetService().facets(request.GET)
     
     category_filters = [
         {
-            'value': cat['category'],
-            'label': dict(Provider.CATEGORY_CHOICES).get(cat['category'], cat['category']),
-            'count': cat['count']
+            'value': category,
+            'label': dict(Provider.CATEGORY_CHOICES).get(category, category),
+            'count': facet['count']
         }
-        for cat in categories
+        for category, facet in sorted(facets['category'].items())
     ]
     
-    # Districts with counts
-    districts = Provider.objects.filter(status='approved').values('district').annotate(
-        count=Count('id')
-    ).order_by('district')
-    
     district_filters = [
         {
-            'value': dist['district'],
-            'label': dict(Provider.DISTRICT_CHOICES).get(dist['district'], dist['district']),
-            'count': dist['count']
+            'value': district,
+            'label': dict(Provider.DISTRICT_CHOICES).get(district, district),
+            'count': facet['count']
         }
-        for dist in districts
+        for district, facet in sorted(facets['district'].items())
     ]
     
     return Response({
         'categories': category_filters,
         'districts': district_filters,
         'rating_options': [
-            {'value': 4.5, 'label': '4.5+ Stars'},
-            {'value': 4.0, 'label': '4.0+ Stars'},
-            {'value': 3.5, 'label': '3.5+ Stars'},
-            {'value': 3.0, 'label': '3.0+ Stars'},
-        ]
+            {'value': rating, 'label': f'{rating}+ Stars', 'count': count}
+            for rating, count in facets['rating'].items()
+        ],
+        'verified_count': facets['verified'],
+        'total_count': facets['total']
     })
@@ -6,6 +6,7 @@ from django.urls import reverse_lazy
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
+from django.utils.dateparse import parse_date
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.forms import AuthenticationForm
@@ -13,6 +14,8 @@ from django.views.generic import FormView
 import json
 from datetime import datetime, date
 from nutrition.models import Food, MealLog, FoodCategory, LocalFoodDatabase
+from nutrition.matrix import COLUMNS, nutrient_matrix
+from nutrition.summaries import daily_totals
 from activity.models import ActivityLog
 from providers.models import Provider, ProviderService, FitnessCenter
 from personalization.models import UserProfile, RecommendationEngine
@@ -67,8 +70,8 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         total_providers = Provider.objects.filter(status='approved').count()
         available_services = ProviderService.objects.count()
         
-        # Calculate totals
-        total_calories = sum(meal.food.calories * meal.quantity for meal in today_meals)
+        # Calculate totals; calories come from the maintained daily summary
+        total_calories = daily_totals(user, today, today)[today]['calories']
         total_activity_minutes = sum(activity.duration_minutes for activity in today_activities)
         
         # Calculate calories for each meal for template display
@@ -113,21 +116,21 @@ class NutritionView(LoginRequiredMixin, TemplateView):
             log_date=selected_date
         ).select_related('food').order_by('meal_type', 'logged_at')
         
-        # Calculate totals for template
-        total_calories = 0
-        total_protein = 0
-        total_carbs = 0
-        total_fat = 0
-        
-        for meal in meals:
-            meal.total_calories = meal.food.calories * meal.quantity
-            meal.total_protein = meal.food.protein_g * meal.quantity
-            meal.total_carbs = meal.food.carbs_g * meal.quantity
-            meal.total_fat = meal.food.fat_g * meal.quantity
-            total_calories += meal.total_calories
-            total_protein += meal.total_protein
-            total_carbs += meal.total_carbs
-            total_fat += meal.total_fat
+        # Per-meal values for the list; day totals come from the maintained daily summary
+        meals = list(meals)
+        entries = nutrient_matrix.per_entry([meal.food_id for meal in meals], [meal.quantity for meal in meals])
+        for meal, row in zip(meals, entries.tolist()):
+            meal.total_calories = row[COLUMNS['calories']]
+            meal.total_protein = row[COLUMNS['protein_g']]
+            meal.total_carbs = row[COLUMNS['carbs_g']]
+            meal.total_fat = row[COLUMNS['fat_g']]
+        
+        day = parse_date(selected_date) or date.today()
+        day_totals = daily_totals(self.request.user, day, day)[day]
+        total_calories = day_totals['calories']
+        total_protein = day_totals['protein_g']
+        total_carbs = day_totals['carbs_g']
+        total_fat = day_totals['fat_g']
         
         # Get food categories and Sri Lankan foods
         food_categories = FoodCategory.objects.all()